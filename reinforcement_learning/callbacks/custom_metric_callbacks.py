@@ -103,6 +103,24 @@ class CustomMetricCallbacks(DefaultCallbacks):
         episode.custom_metrics["game_history"] = episode.user_data["game_history"][0]
         episode.hist_data["game_histories"] = episode.user_data["game_history"]
 
+        env = base_env.get_sub_environments()[episode.env_id]
+
+        # phase of the episode and state of the curriculum of its environment (cf. environments/curriculum.py)
+        episode.custom_metrics["phase"] = env.phase
+        curriculum = getattr(env, "curriculum", None)
+        if curriculum is not None:
+            episode.custom_metrics.update(curriculum.metrics())
+
+        # counters and timers of the environment of the episode (cf. environments/instrumentation.py)
+        stats = getattr(env, "stats", None)
+        if stats is not None:
+            values = stats.pop()
+            for name in ("executor_calls", "executor_seconds", "reset_sampling_seconds", "observation_seconds"):
+                episode.custom_metrics[f"env_{name}"] = values.get(name, 0.0)
+            lookups = values.get("truth_table_hits", 0.0) + values.get("truth_table_misses", 0.0)
+            if lookups:
+                episode.custom_metrics["env_truth_table_hit_rate"] = values.get("truth_table_hits", 0.0) / lookups
+
     def on_train_result(
             self,
             *,
@@ -118,6 +136,22 @@ class CustomMetricCallbacks(DefaultCallbacks):
         :param kwargs: other arguments
         :return: None
         """
+        # share of the rollout time (summed over the rollout workers) the environments spent in the instrumented hot path
+        custom_metrics = result["custom_metrics"]
+        if "env_executor_seconds_mean" in custom_metrics and result.get("time_this_iter_s"):
+            env_seconds = result["episodes_this_iter"] * sum(
+                custom_metrics[f"env_{name}_mean"]
+                for name in ("executor_seconds", "reset_sampling_seconds", "observation_seconds")
+            )
+            custom_metrics["env_seconds_per_iteration"] = env_seconds
+            custom_metrics["env_overhead_share"] = env_seconds / (
+                result["time_this_iter_s"] * max(1, trainer.config["num_workers"])
+            )
+
+        # with the adaptive curriculum, every environment chooses its phases itself
+        if trainer.config["env_config"].get("curriculum") is not None:
+            return
+
         if result["custom_metrics"]["game_history_mean"] > 0.85:
             print("incrementing phase")
             trainer.workers.foreach_worker(
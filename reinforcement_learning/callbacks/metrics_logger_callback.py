@@ -0,0 +1,59 @@
+"""
+Ray Tune logger callback that writes the results of all trials into a local metrics file (cf. utilities/metrics.py),
+as an offline alternative to the WandbLoggerCallback.
+"""
+
+# standard library imports
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+# 3rd party imports
+from ray.tune.logger import LoggerCallback
+
+# local imports (i.e. our own code)
+from utilities.metrics import LocalMetricsSink, default_metrics_path
+
+if TYPE_CHECKING:
+    from ray.tune.trial import Trial
+
+
+class LocalMetricsLoggerCallback(LoggerCallback):
+
+    def __init__(self, project: str, file_format: Optional[str] = "jsonl", path: Optional[str] = None):
+        """
+        :param project: names the metrics file (cf. default_metrics_path)
+        :param file_format: "jsonl" or "sqlite"
+        :param path: path of the metrics file (OPTIONAL)
+        """
+        self.project: str = project
+        self.file_format: str = file_format
+        self.path: Optional[str] = path
+        self._sink: Optional[LocalMetricsSink] = None
+
+    def log_trial_result(self, iteration: int, trial: "Trial", result: Dict) -> None:
+        """
+        Enqueues the result of a trial; the trial id is stored as the run of the entry.
+
+        :param iteration: iteration of the Tune loop
+        :param trial: the trial
+        :param result: result of the trial
+        :return: None
+        """
+        # the sink (and its writer thread) is created with the first result, such that creating the callback is free
+        if self._sink is None:
+            self._sink = LocalMetricsSink(
+                path=self.path or default_metrics_path(self.project, self.file_format),
+                file_format=self.file_format
+            )
+        step = result.get("training_iteration")
+        self._sink.log({key: value for key, value in result.items() if key != "config"}, step=step, run=trial.trial_id)
+
+    def on_experiment_end(self, trials: List["Trial"], **info) -> None:
+        """
+        Writes the pending results and stops the writer thread of the sink.
+
+        :param trials: all trials of the experiment
+        :return: None
+        """
+        if self._sink is not None:
+            self._sink.finish()
+            self._sink = None
@@ -0,0 +1,116 @@
+"""
+This file implements the callbacks that maintain the frozen-opponent pool for Connect Four self-play.
+"""
+
+# standard library imports
+import random
+from typing import TYPE_CHECKING
+
+# 3rd party imports
+from ray.rllib.agents.callbacks import DefaultCallbacks
+
+if TYPE_CHECKING:
+    from ray.rllib.agents.trainer import Trainer
+
+# id of the policy that is trained in self-play
+MAIN_POLICY: str = "main"
+
+
+def frozen_policy_id(index: int) -> str:
+    """
+    Returns the policy id of a slot of the frozen-opponent pool.
+
+    :param index: index of the slot
+    :return: policy id
+    """
+    return f"frozen_{index}"
+
+
+def make_policy_mapping_fn(pool_size: int, selfplay_probability: float):
+    """
+    Returns a policy mapping function for the self-play environment. In every episode, the main policy takes a random
+    seat. The other seat is played by the main policy as well (with probability selfplay_probability) or by a random
+    policy of the frozen-opponent pool. The choice only depends on the episode id and is hence consistent within an
+    episode.
+
+    :param pool_size: number of policies in the frozen-opponent pool
+    :param selfplay_probability: probability that the main policy plays both seats
+    :return: policy_mapping_fn(agent_id, episode, worker, **kwargs) -> policy id
+    """
+
+    def policy_mapping_fn(agent_id, episode, worker=None, **kwargs) -> str:
+        rng = random.Random(episode.episode_id)
+        main_seat = rng.choice(["player_1", "player_2"])
+        if agent_id == main_seat or pool_size == 0 or rng.random() < selfplay_probability:
+            return MAIN_POLICY
+        return frozen_policy_id(rng.randrange(pool_size))
+
+    return policy_mapping_fn
+
+
+class SelfPlayCallbacks(DefaultCallbacks):
+    """
+    Fills the frozen-opponent pool with the initial weights of the main policy and, every snapshot_interval training
+    iterations, overwrites the oldest slot with the current weights of the main policy.
+    """
+
+    # these are set by helpers.get_selfplay_config()
+    pool_size: int = 4
+    snapshot_interval: int = 10
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.next_slot: int = 0
+
+    def on_trainer_init(
+            self,
+            *,
+            trainer: "Trainer",
+            **kwargs,
+    ) -> None:
+        """
+        Initialises all slots of the pool with the weights of the main policy.
+
+        :param trainer: reference to the trainer
+        :param kwargs: other arguments
+        :return: None
+        """
+        self._snapshot(trainer, [frozen_policy_id(i) for i in range(self.pool_size)])
+
+    def on_train_result(
+            self,
+            *,
+            trainer: "Trainer",
+            result: dict,
+            **kwargs
+    ) -> None:
+        """
+        Snapshots the main policy into the pool every snapshot_interval training iterations.
+
+        :param trainer: reference to the trainer
+        :param result: train result
+        :param kwargs: other arguments
+        :return: None
+        """
+        if self.pool_size and result["training_iteration"] % self.snapshot_interval == 0:
+            slot = frozen_policy_id(self.next_slot)
+            self._snapshot(trainer, [slot])
+            self.next_slot = (self.next_slot + 1) % self.pool_size
+            print(f"snapshotted main policy into {slot}")
+        result["custom_metrics"]["frozen_pool_next_slot"] = self.next_slot
+
+    @staticmethod
+    def _snapshot(trainer: "Trainer", policy_ids: list) -> None:
+        """
+        Copies the weights of the main policy to the given policies on the local and all remote workers.
+
+        :param trainer: reference to the trainer
+        :param policy_ids: ids of the frozen policies to overwrite
+        :return: None
+        """
+        if not policy_ids:
+            return
+        weights = trainer.get_policy(MAIN_POLICY).get_weights()
+        local_worker = trainer.workers.local_worker()
+        local_worker.set_weights({policy_id: weights for policy_id in policy_ids})
+        trainer.workers.sync_weights(policies=policy_ids)
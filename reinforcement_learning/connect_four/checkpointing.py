@@ -0,0 +1,224 @@
+"""
+Asynchronous checkpointing for the connect four training loop. AsyncCheckpointer.save() snapshots the state of the
+trainer in memory (the state of the local worker is already serialised by RLlib) and hands it to a background thread,
+which writes it to disk and applies the retention policy, such that the training loop does not wait for the disk.
+
+The checkpoints have the layout of Trainable.save() in RLlib 1.13 (checkpoint_<iteration>/checkpoint-<iteration> plus
+its .tune_metadata), hence they can be restored with PPOTrainer.restore() and are found by
+helpers.get_agent_checkpoints(). A checkpoint is written to a hidden directory first and renamed when it is complete.
+
+Retention: the keep_last most recent checkpoints and the keep_best checkpoints with the highest episode_reward_mean are
+kept, all others are deleted. The reward means are stored in the retention file of the checkpoint directory, such that
+the retention policy survives a restart. The retention policy assumes that all checkpoints in the directory belong to
+one run; archive_checkpoints() moves the checkpoints of a previous run out of the way before a fresh run starts.
+"""
+
+# standard library imports
+import os
+import json
+import queue
+import shutil
+import time
+import pickle
+import threading
+from typing import Any, Dict, Optional, Tuple, TYPE_CHECKING
+
+# 3rd party imports
+import ray
+
+if TYPE_CHECKING:
+    from ray.rllib.agents.trainer import Trainer
+
+RETENTION_FILE_NAME: str = "retention.json"
+ARCHIVE_DIR_NAME: str = "archive"
+
+# a snapshot: iteration, trainer state, tune metadata, episode_reward_mean
+Snapshot = Tuple[int, Dict[str, Any], Dict[str, Any], float]
+
+
+def archive_checkpoints(checkpoint_dir: str) -> Optional[str]:
+    """
+    Moves the checkpoints and the retention file of a previous run into archive/<timestamp> of the checkpoint
+    directory, such that a fresh run neither overwrites them nor ranks its checkpoints against them.
+
+    :param checkpoint_dir: directory of the checkpoints
+    :return: directory of the archived run, None if there was nothing to archive
+    """
+    if not os.path.isdir(checkpoint_dir):
+        return None
+    names = [
+        name for name in os.listdir(checkpoint_dir)
+        if name.startswith("checkpoint_") or name == RETENTION_FILE_NAME
+    ]
+    if not names:
+        return None
+
+    archive_dir = f"{checkpoint_dir}/{ARCHIVE_DIR_NAME}/{time.strftime('%Y-%m-%d_%H-%M-%S')}"
+    os.makedirs(archive_dir)
+    for name in names:
+        os.rename(f"{checkpoint_dir}/{name}", f"{archive_dir}/{name}")
+    return archive_dir
+
+
+class AsyncCheckpointer:
+
+    def __init__(
+            self,
+            checkpoint_dir: str,
+            keep_last: Optional[int] = 3,
+            keep_best: Optional[int] = 1,
+            max_pending: Optional[int] = 2
+    ):
+        """
+        Starts the writer thread.
+
+        :param checkpoint_dir: directory of the checkpoints (created if necessary)
+        :param keep_last: number of most recent checkpoints that are kept
+        :param keep_best: number of checkpoints with the highest episode_reward_mean that are kept
+        :param max_pending: maximum number of snapshots waiting for the writer; save() blocks if the writer falls
+        further behind (bounds the memory of the snapshots)
+        """
+        self.checkpoint_dir: str = checkpoint_dir
+        self.keep_last: int = keep_last
+        self.keep_best: int = keep_best
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+        # iteration -> episode_reward_mean of the checkpoints on disk (written by the writer thread only)
+        self.rewards: Dict[int, float] = self._read_retention_file()
+
+        self._queue: "queue.Queue[Optional[Snapshot]]" = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._closed: bool = False
+        self._thread = threading.Thread(target=self._write_loop, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, agent: "Trainer", result: Optional[dict] = None) -> str:
+        """
+        Snapshots the state of the trainer and enqueues it for writing.
+
+        :param agent: the trainer
+        :param result: result of the last agent.train() call (its episode_reward_mean ranks the checkpoint)
+        :return: path the checkpoint will be written to
+        """
+        self._raise_writer_error()
+        iteration = agent.iteration
+        metadata = {
+            "experiment_id": agent._experiment_id,
+            "iteration": iteration,
+            "timesteps_total": agent._timesteps_total,
+            "time_total": agent._time_total,
+            "episodes_total": agent._episodes_total,
+            "saved_as_dict": False,
+            "ray_version": ray.__version__,
+        }
+        reward_mean = float((result or {}).get("episode_reward_mean", float("nan")))
+        self._queue.put((iteration, agent.__getstate__(), metadata, reward_mean))
+        return self.checkpoint_path(iteration)
+
+    def close(self) -> None:
+        """
+        Writes all pending snapshots and stops the writer thread.
+
+        :return: None
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_writer_error()
+
+    def checkpoint_path(self, iteration: int) -> str:
+        """
+        :param iteration: training iteration of the checkpoint
+        :return: path of the checkpoint (as passed to PPOTrainer.restore())
+        """
+        return f"{self.checkpoint_dir}/checkpoint_{iteration:06d}/checkpoint-{iteration}"
+
+    def _raise_writer_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("writing a checkpoint failed") from self._error
+
+    def _write_loop(self) -> None:
+        """
+        Writes the enqueued snapshots until close() enqueues None.
+
+        :return: None
+        """
+        while True:
+            snapshot = self._queue.get()
+            if snapshot is None:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self._write(*snapshot)
+                self._apply_retention()
+            except BaseException as error:  # surfaced in the training thread by the next save() / close()
+                self._error = error
+
+    def _write(self, iteration: int, state: Dict[str, Any], metadata: Dict[str, Any], reward_mean: float) -> None:
+        """
+        Writes a checkpoint into a hidden directory and renames it when it is complete.
+
+        :param iteration: training iteration
+        :param state: state of the trainer (Trainer.__getstate__())
+        :param metadata: tune metadata of the checkpoint
+        :param reward_mean: episode_reward_mean of the iteration
+        :return: None
+        """
+        directory = f"{self.checkpoint_dir}/checkpoint_{iteration:06d}"
+        temporary_directory = f"{self.checkpoint_dir}/.checkpoint_{iteration:06d}.tmp"
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+        os.makedirs(temporary_directory)
+
+        with open(f"{temporary_directory}/checkpoint-{iteration}", "wb") as f:
+            pickle.dump(state, f)
+        with open(f"{temporary_directory}/checkpoint-{iteration}.tune_metadata", "wb") as f:
+            pickle.dump(metadata, f)
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(temporary_directory, directory)
+        self.rewards[iteration] = reward_mean
+
+    def _apply_retention(self) -> None:
+        """
+        Deletes the checkpoints that are neither among the keep_last most recent nor among the keep_best best ones and
+        updates the retention file.
+
+        :return: None
+        """
+        iterations = sorted(self.rewards)
+        # NaN rewards (no finished episode) rank last
+        ranked = sorted(
+            iterations, key=lambda i: self.rewards[i] if self.rewards[i] == self.rewards[i] else float("-inf"),
+            reverse=True
+        )
+        kept = set(iterations[-self.keep_last:] if self.keep_last > 0 else []) | set(ranked[:self.keep_best])
+
+        for iteration in iterations:
+            if iteration not in kept:
+                shutil.rmtree(f"{self.checkpoint_dir}/checkpoint_{iteration:06d}", ignore_errors=True)
+                del self.rewards[iteration]
+
+        temporary_file = f"{self.checkpoint_dir}/.{RETENTION_FILE_NAME}.tmp"
+        with open(temporary_file, "w") as f:
+            json.dump({str(iteration): reward for iteration, reward in self.rewards.items()}, f)
+        os.replace(temporary_file, f"{self.checkpoint_dir}/{RETENTION_FILE_NAME}")
+
+    def _read_retention_file(self) -> Dict[int, float]:
+        """
+        :return: iteration -> episode_reward_mean of the checkpoints that exist in the checkpoint directory (checkpoints
+        without a known reward mean, e.g. written by agent.save(), rank last)
+        """
+        path = f"{self.checkpoint_dir}/{RETENTION_FILE_NAME}"
+        rewards = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                rewards = {int(iteration): reward for iteration, reward in json.load(f).items()}
+        for name in os.listdir(self.checkpoint_dir):
+            if name.startswith("checkpoint_"):
+                rewards.setdefault(int(name.split("_")[-1]), float("nan"))
+        return {
+            iteration: reward for iteration, reward in rewards.items()
+            if os.path.isdir(f"{self.checkpoint_dir}/checkpoint_{iteration:06d}")
+        }
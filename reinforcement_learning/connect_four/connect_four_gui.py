@@ -38,7 +38,8 @@ class ConnectFourGUI:
             environment: EnvType,
             game_mode: Optional[int] = 1,
             agent1=None,
-            agent2=None
+            agent2=None,
+            opponent: Optional[str] = None
     ):
         """
         Initializes the GUI for the Connect Four game.
@@ -47,11 +48,22 @@ class ConnectFourGUI:
         :param game_mode: the game mode the GUI is started with
         :param agent1: the first agent
         :param agent2: the second agent
+        :param opponent: the built-in opponent ("greedy" or "negamax") used in the modes against the computer
+        (OPTIONAL, default: the opponent the environment is configured with; "negamax" in the game modes 5 and 6)
         """
         self.env = environment
         self.agent1 = agent1
         self.agent2 = agent2
 
+        # the negamax game modes are the greedy game modes with the search-based opponent
+        if game_mode == 5:
+            game_mode, opponent = 0, "negamax"
+        elif game_mode == 6:
+            game_mode, opponent = 3, "negamax"
+        # keep the opponent (and search budget) of the environment config unless another opponent is requested
+        if opponent is not None:
+            self.env.set_opponent(opponent, self.env.search_depth, self.env.search_time_ms)
+
         print(f"game_mode: {game_mode}")
         if game_mode == 2 and not agent1:
             sys.exit("no agent passed")
@@ -81,7 +93,7 @@ class ConnectFourGUI:
 
     def greedy(self):
         """
-        Starts a GUI game against the greedy agent
+        Starts a GUI game against the built-in opponent (greedy or negamax)
 
         :return: None
         """
@@ -106,7 +118,7 @@ class ConnectFourGUI:
                 self._update_layout(window)
                 break
             self.env.state, reward, self.env.done, info = self.env.interactive_step(
-                self.env.get_greedy_action(2), agent_id=2)
+                self.env.get_opponent_action(2), agent_id=2)
             self._update_layout(window)
             if self.env.done:
                 self._update_layout(window)
@@ -196,7 +208,7 @@ class ConnectFourGUI:
 
     def ai_vs_greedy(self):
         """
-        Starts a gui game AI vs greedy.
+        Starts a gui game AI vs the built-in opponent (greedy or negamax).
 
         :return: None
         """
@@ -220,7 +232,7 @@ class ConnectFourGUI:
             else:
                 window.read(timeout=2000)
                 self.env.state, reward, self.env.done, info = self.env.interactive_step(
-                    self.env.get_greedy_action(2), agent_id=2)
+                    self.env.get_opponent_action(2), agent_id=2)
             self._update_layout(window)
             player = not player
             if self.env.done:
@@ -314,6 +326,7 @@ def start_game():
 
     :return: None
     """
+    utilities.configure_warnings()
     ray.init(local_mode=True)
 
     trainer_config = ppo.DEFAULT_CONFIG.copy()
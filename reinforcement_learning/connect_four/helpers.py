@@ -3,7 +3,7 @@ Contains helper functions for the connect four module.
 """
 
 # standard library imports
-from typing import List
+from typing import List, Optional
 import sys
 import os
 
@@ -16,6 +16,9 @@ from ray.rllib.agents.ppo.ppo import PPOTrainer
 import torch
 import ray.rllib.agents.ppo as ppo
 
+# local imports (i.e. our own code)
+from utilities import utilities
+
 
 # functions
 def get_config() -> dict:
@@ -40,6 +43,49 @@ def get_config() -> dict:
     return config
 
 
+def get_selfplay_config(
+        pool_size: Optional[int] = 4,
+        snapshot_interval: Optional[int] = 10,
+        selfplay_probability: Optional[float] = 0.5,
+        num_envs_per_worker: Optional[int] = 8
+) -> dict:
+    """
+    Returns the config for training a PPO agent in self-play on the multi-agent connect four environment.
+    The trained policy ("main") plays against itself or against a pool of frozen snapshots of itself. Both seats are
+    computed by RLlib policies, hence the opponent moves of all environments of a worker are batched in one forward
+    pass.
+
+    :param pool_size: number of frozen snapshots of the main policy
+    :param snapshot_interval: number of training iterations after which the oldest snapshot is replaced
+    :param selfplay_probability: probability that the main policy plays both seats of an episode
+    :param num_envs_per_worker: number of environments per rollout worker, i.e. the size of the inference batches
+    :return: dictionary containing the config
+    """
+    # imported here to keep this module usable without the multi-agent dependencies
+    from ray.rllib.policy.policy import PolicySpec
+    from callbacks.selfplay_callbacks import SelfPlayCallbacks, make_policy_mapping_fn, frozen_policy_id, \
+        MAIN_POLICY
+
+    config = get_config()
+    config["env"] = "connectfour-selfplay-v0"
+    config["num_envs_per_worker"] = num_envs_per_worker
+    config["multiagent"] = {
+        "policies": {
+            MAIN_POLICY: PolicySpec(),
+            **{frozen_policy_id(i): PolicySpec() for i in range(pool_size)}
+        },
+        "policy_mapping_fn": make_policy_mapping_fn(pool_size=pool_size, selfplay_probability=selfplay_probability),
+        "policies_to_train": [MAIN_POLICY],
+    }
+    config["callbacks"] = type(
+        "SelfPlayCallbacks",
+        (SelfPlayCallbacks,),
+        {"pool_size": pool_size, "snapshot_interval": snapshot_interval}
+    )
+
+    return config
+
+
 def return_layout(env_state) -> list:
     """
     Returns the layout of the board.
@@ -99,7 +145,9 @@ def get_game_mode():
         "--humanvsai": 1,
         "--aivsai": 2,
         "--aivsgreedy": 3,
-        "--greedyvsgreedy": 4
+        "--greedyvsgreedy": 4,
+        "--humanvsnegamax": 5,
+        "--aivsnegamax": 6
     }
     args = sys.argv[1:]
     if len(args) < 1:
@@ -169,7 +217,7 @@ def restore_agents(paths, config):
     if paths[0]:
         agent1.restore(paths[0])
     if paths[1]:
-        agent1.restore(paths[1])
+        agent2.restore(paths[1])
     return [agent1, agent2]
 
 
@@ -186,13 +234,30 @@ def preprocess_results(result: dict) -> dict:
     return result
 
 
+def get_agent_checkpoints(checkpoint_dir: Optional[str] = None) -> List[str]:
+    """
+    Gets all checkpoints of the agent, sorted from oldest to latest
+
+    :param checkpoint_dir: directory containing the checkpoints (default: data/agent_checkpoints/connect_four)
+    :return: list of checkpoint paths that can be passed to PPOTrainer.restore()
+    """
+    if checkpoint_dir is None:
+        utilities.ensure_paths()
+        checkpoint_dir = f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/agent_checkpoints/connect_four"
+    agent_checkpoints = [
+        checkpoint for checkpoint in os.listdir(checkpoint_dir) if checkpoint.startswith("checkpoint_")
+    ]
+    agent_checkpoints.sort(key=lambda x: int(x.split("_")[-1].split(".")[0]))
+    return [
+        f"{checkpoint_dir}/{checkpoint}/checkpoint-{checkpoint.split('_')[1].lstrip('0')}"
+        for checkpoint in agent_checkpoints
+    ]
+
+
 def get_latest_agent_checkpoint():
     """
     Gets the latest checkpoint of the agent
 
     :return: latest agent checkpoint from data/agent_checkpoints/connect_four
     """
-    agent_checkpoints = os.listdir(f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/agent_checkpoints/connect_four")
-    agent_checkpoints.sort(key=lambda x: int(x.split("_")[-1].split(".")[0]))
-    return f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/agent_checkpoints/connect_four/{agent_checkpoints[-1]}" \
-           f"/checkpoint-{agent_checkpoints[-1].split('_')[1].lstrip('0')}"
+    return get_agent_checkpoints()[-1]
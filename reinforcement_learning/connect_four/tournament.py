@@ -0,0 +1,380 @@
+"""
+Headless tournament runner for Connect Four agents. Plays N games per pairing of agent checkpoints (and optional
+baseline players) across a process pool and writes Elo ratings as well as win and draw matrices.
+
+Within a worker, all games of a task are played simultaneously on a stack of boards, such that every policy is
+queried once per ply with the observations of all games it is to move in (batched policy inference).
+"""
+
+# standard library imports
+import os
+import json
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+from typing import Dict, List, Optional, Tuple
+
+# 3rd party imports
+import numpy as np
+import pandas as pd
+
+# local imports (i.e. our own code)
+from utilities import utilities
+
+# baseline players that do not need a checkpoint
+BASELINES = ("random", "negamax")
+
+HEIGHT: int = 6
+WIDTH: int = 7
+
+# players restored in a worker process, keyed by their name (checkpoint path or baseline name)
+_worker_players: Dict[str, object] = {}
+
+
+class _RandomPlayer:
+    """
+    Baseline player that takes uniformly random valid moves.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = np.random.default_rng(seed)
+
+    def act(self, boards: np.ndarray) -> np.ndarray:
+        """
+        :param boards: (B, 6, 7) boards from the point of view of the player (own tokens are 1)
+        :return: (B,) columns
+        """
+        scores = self.rng.random(size=(len(boards), WIDTH))
+        scores[boards[:, 0, :] != 0] = -np.inf
+        return np.argmax(scores, axis=1)
+
+
+class _NegamaxPlayer:
+    """
+    Baseline player backed by the search-based Java agent (connectfour.NegamaxSearch).
+    """
+
+    def __init__(self, search_depth: int = 8, search_time_ms: int = 50):
+        # noinspection PyPackageRequirements
+        import jpype
+        utilities.ensure_jvm()
+        self.search = jpype.JClass("connectfour.NegamaxSearch")(search_depth, search_time_ms)
+        self._int_matrix = jpype.JArray(jpype.JInt, 2)
+
+    def act(self, boards: np.ndarray) -> np.ndarray:
+        """
+        :param boards: (B, 6, 7) boards from the point of view of the player (own tokens are 1)
+        :return: (B,) columns
+        """
+        return np.array(
+            [int(self.search.bestMove(self._int_matrix(board.astype(np.int32).tolist()), 1)) for board in boards],
+            dtype=np.int64
+        )
+
+
+class _PolicyPlayer:
+    """
+    Player backed by a restored RLlib policy. The observations of all games are passed to the policy in one batch;
+    invalid moves (full columns) are masked out of the action logits.
+    """
+
+    def __init__(self, checkpoint_path: str):
+        # noinspection PyUnresolvedReferences
+        from utilities import registration
+        from ray.rllib.agents.ppo.ppo import PPOTrainer
+        import connect_four.helpers as helpers
+
+        config = helpers.get_config()
+        config["num_workers"] = 0
+        config["num_gpus"] = 0
+        trainer = PPOTrainer(env="connectfour-v0", config=config)
+        trainer.restore(checkpoint_path)
+        self.policy = trainer.get_policy()
+
+    def act(self, boards: np.ndarray) -> np.ndarray:
+        """
+        :param boards: (B, 6, 7) boards from the point of view of the player (own tokens are 1)
+        :return: (B,) columns
+        """
+        actions, _, extra = self.policy.compute_actions(boards.astype(np.float32), explore=False)
+        logits = extra.get("action_dist_inputs")
+        if logits is None:
+            return np.asarray(actions)
+        logits = np.array(logits, dtype=np.float64)
+        logits[boards[:, 0, :] != 0] = -np.inf
+        return np.argmax(logits, axis=1)
+
+
+def _init_worker():
+    """
+    Initialises a worker process of the tournament (local ray instance for restoring the checkpoints).
+
+    :return: None
+    """
+    import ray
+    utilities.configure_warnings()
+    ray.init(local_mode=True, include_dashboard=False, ignore_reinit_error=True, log_to_driver=False)
+
+
+def _get_player(name: str, search_depth: int, search_time_ms: int, seed: int):
+    """
+    Returns the (cached) player of the current worker process for a checkpoint path or baseline name.
+    """
+    if name not in _worker_players:
+        if name == "random":
+            _worker_players[name] = _RandomPlayer(seed=seed)
+        elif name == "negamax":
+            _worker_players[name] = _NegamaxPlayer(search_depth=search_depth, search_time_ms=search_time_ms)
+        else:
+            _worker_players[name] = _PolicyPlayer(name)
+    return _worker_players[name]
+
+
+def drop_tokens(boards: np.ndarray, columns: np.ndarray, player: int) -> np.ndarray:
+    """
+    Places one token of player in the given column of every board (in place).
+
+    :param boards: (B, 6, 7) boards (row 0 is the top row)
+    :param columns: (B,) columns; the columns must not be full
+    :param player: token to place (1 or 2)
+    :return: (B,) rows the tokens landed in
+    """
+    empty = boards[np.arange(len(boards)), :, columns] == 0
+    # the lowest empty cell is the last empty row of the column
+    rows = HEIGHT - 1 - np.argmax(empty[:, ::-1], axis=1)
+    boards[np.arange(len(boards)), rows, columns] = player
+    return rows
+
+
+def has_won(boards: np.ndarray, player: int) -> np.ndarray:
+    """
+    Checks all boards for four tokens of the player in a row, column or diagonal.
+
+    :param boards: (B, 6, 7) boards
+    :param player: player to check (1 or 2)
+    :return: (B,) boolean array
+    """
+    b = boards == player
+    horizontal = b[:, :, :-3] & b[:, :, 1:-2] & b[:, :, 2:-1] & b[:, :, 3:]
+    vertical = b[:, :-3, :] & b[:, 1:-2, :] & b[:, 2:-1, :] & b[:, 3:, :]
+    diagonal = b[:, :-3, :-3] & b[:, 1:-2, 1:-2] & b[:, 2:-1, 2:-1] & b[:, 3:, 3:]
+    anti_diagonal = b[:, 3:, :-3] & b[:, 2:-1, 1:-2] & b[:, 1:-2, 2:-1] & b[:, :-3, 3:]
+    return (
+            horizontal.any(axis=(1, 2)) | vertical.any(axis=(1, 2))
+            | diagonal.any(axis=(1, 2)) | anti_diagonal.any(axis=(1, 2))
+    )
+
+
+def invert_boards(boards: np.ndarray) -> np.ndarray:
+    """
+    Swaps the tokens of player 1 and player 2 on a stack of boards (cf. helpers.invert_board).
+
+    :param boards: (B, 6, 7) boards
+    :return: inverted copy of the boards
+    """
+    inverted = boards.copy()
+    inverted[boards == 1] = 2
+    inverted[boards == 2] = 1
+    return inverted
+
+
+def play_games(player_a, player_b, n_games: int) -> Tuple[int, int, int]:
+    """
+    Plays n_games games between two players simultaneously. Player a starts half of the games.
+    Both players always observe the board with their own tokens as 1 (like the agent in ConnectFourMVC).
+    An invalid move (which only baselines without masking could make) loses the game.
+
+    :param player_a: first player (object with an act(boards) method)
+    :param player_b: second player (object with an act(boards) method)
+    :param n_games: number of games
+    :return: wins of player a, wins of player b, draws
+    """
+    # tokens of player a are 1, tokens of player b are 2
+    boards = np.zeros(shape=(n_games, HEIGHT, WIDTH), dtype=np.int8)
+    done = np.zeros(shape=(n_games,), dtype=bool)
+    winner = np.zeros(shape=(n_games,), dtype=np.int8)
+    to_move = np.where(np.arange(n_games) % 2 == 0, 1, 2).astype(np.int8)
+
+    while not done.all():
+        for token, player in ((1, player_a), (2, player_b)):
+            games = np.flatnonzero(~done & (to_move == token))
+            if len(games) == 0:
+                continue
+            view = boards[games] if token == 1 else invert_boards(boards[games])
+            columns = np.asarray(player.act(view), dtype=np.int64)
+
+            invalid = (columns < 0) | (columns >= WIDTH)
+            invalid[~invalid] = boards[games[~invalid], 0, columns[~invalid]] != 0
+            if invalid.any():
+                done[games[invalid]] = True
+                winner[games[invalid]] = 3 - token
+
+            valid_games = games[~invalid]
+            if len(valid_games) > 0:
+                sub_boards = boards[valid_games]
+                drop_tokens(sub_boards, columns[~invalid], token)
+                boards[valid_games] = sub_boards
+                won = has_won(sub_boards, token)
+                full = (sub_boards[:, 0, :] != 0).all(axis=1)
+                winner[valid_games[won]] = token
+                done[valid_games[won | full]] = True
+            to_move[games] = 3 - token
+
+    return int(np.sum(winner == 1)), int(np.sum(winner == 2)), int(np.sum(winner == 0))
+
+
+def _play_task(task: dict) -> dict:
+    """
+    Plays one chunk of games of a pairing in a worker process.
+
+    :param task: dict with the keys "a", "b", "n_games", "seed", "search_depth" and "search_time_ms"
+    :return: the task extended by the keys "wins_a", "wins_b" and "draws"
+    """
+    np.random.seed(task["seed"])
+    player_a = _get_player(task["a"], task["search_depth"], task["search_time_ms"], task["seed"])
+    player_b = _get_player(task["b"], task["search_depth"], task["search_time_ms"], task["seed"] + 1)
+    wins_a, wins_b, draws = play_games(player_a, player_b, task["n_games"])
+    return dict(task, wins_a=wins_a, wins_b=wins_b, draws=draws)
+
+
+def compute_elo(score_matrix: np.ndarray, games_matrix: np.ndarray, n_iterations: Optional[int] = 1000,
+                base_rating: Optional[float] = 1500.0) -> np.ndarray:
+    """
+    Computes Elo ratings from a tournament via the maximum likelihood Bradley-Terry model (minorisation-
+    maximisation updates). Unlike sequential Elo updates, the result does not depend on the order of the games.
+
+    :param score_matrix: (P, P) points of player i against player j (win = 1, draw = 0.5)
+    :param games_matrix: (P, P) number of games between player i and player j
+    :param n_iterations: maximum number of MM iterations
+    :param base_rating: average rating of all players
+    :return: (P,) Elo ratings
+    """
+    n_players = len(score_matrix)
+    # a virtual draw against every opponent keeps the ratings finite for undefeated or winless players
+    scores = score_matrix + 0.5 * (games_matrix > 0)
+    games = games_matrix + 1.0 * (games_matrix > 0)
+    strengths = np.ones(shape=(n_players,))
+    for _ in range(n_iterations):
+        denominator = (games / (strengths[:, None] + strengths[None, :])).sum(axis=1)
+        updated = np.where(denominator > 0, scores.sum(axis=1) / np.maximum(denominator, 1e-12), strengths)
+        updated /= np.exp(np.mean(np.log(updated)))
+        if np.allclose(updated, strengths, rtol=1e-9, atol=0):
+            strengths = updated
+            break
+        strengths = updated
+    return base_rating + 400.0 * np.log10(strengths)
+
+
+def run_tournament(
+        agents: Optional[List[str]] = None,
+        baselines: Optional[List[str]] = None,
+        n_games: Optional[int] = 100,
+        games_per_task: Optional[int] = 50,
+        num_workers: Optional[int] = None,
+        search_depth: Optional[int] = 8,
+        search_time_ms: Optional[int] = 50,
+        seed: Optional[int] = 0,
+        output_dir: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Runs a round-robin tournament between Connect Four agents and writes the results to output_dir.
+
+    :param agents: checkpoint paths of the agents (default: all checkpoints in data/agent_checkpoints/connect_four)
+    :param baselines: baseline players to add to the tournament ("random" and/or "negamax")
+    :param n_games: number of games per pairing
+    :param games_per_task: number of games a worker plays at once; pairings are split into tasks of this size, which
+    balances the load across the process pool
+    :param num_workers: size of the process pool (default: number of CPUs)
+    :param search_depth: maximum search depth in plies of the negamax baseline
+    :param search_time_ms: time budget per move in milliseconds of the negamax baseline
+    :param seed: seed of the random baseline and of the task seeds
+    :param output_dir: directory to write the results to (default: data/tournaments/<timestamp>)
+    :return: pd.DataFrame(columns=["player", "elo", "games", "wins", "draws", "losses"]) sorted by Elo
+    """
+    import connect_four.helpers as helpers
+
+    agents = list(agents) if agents is not None else helpers.get_agent_checkpoints()
+    baselines = list(baselines or [])
+    for baseline in baselines:
+        if baseline not in BASELINES:
+            raise ValueError(f"unknown baseline '{baseline}', must be one of {BASELINES}")
+    players = agents + baselines
+    if len(players) < 2:
+        raise ValueError("a tournament needs at least two players")
+
+    if output_dir is None:
+        utilities.ensure_paths()
+        output_dir = f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/tournaments/" \
+                     f"{time.strftime('%Y-%m-%d_%H-%M-%S')}"
+    os.makedirs(output_dir, exist_ok=True)
+
+    tasks = []
+    for i, j in itertools.combinations(range(len(players)), 2):
+        for start in range(0, n_games, games_per_task):
+            tasks.append({
+                "i": i,
+                "j": j,
+                "a": players[i],
+                "b": players[j],
+                "n_games": min(games_per_task, n_games - start),
+                "seed": seed + 2 * len(tasks),
+                "search_depth": search_depth,
+                "search_time_ms": search_time_ms,
+            })
+
+    wins = np.zeros(shape=(len(players), len(players)), dtype=np.int64)
+    draws = np.zeros(shape=(len(players), len(players)), dtype=np.int64)
+
+    start_time = time.time()
+    # the JVM and ray do not survive a fork, hence the workers are spawned
+    with ProcessPoolExecutor(
+            max_workers=num_workers or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+    ) as executor:
+        futures = [executor.submit(_play_task, task) for task in tasks]
+        for future in as_completed(futures):
+            result = future.result()
+            i, j = result["i"], result["j"]
+            wins[i, j] += result["wins_a"]
+            wins[j, i] += result["wins_b"]
+            draws[i, j] += result["draws"]
+            draws[j, i] += result["draws"]
+    duration = time.time() - start_time
+
+    games = wins + wins.T + draws
+    elo = compute_elo(score_matrix=wins + 0.5 * draws, games_matrix=games)
+
+    names = [os.path.basename(os.path.dirname(player)) if player not in BASELINES else player for player in players]
+    ratings = pd.DataFrame({
+        "player": names,
+        "path": players,
+        "elo": elo,
+        "games": games.sum(axis=1),
+        "wins": wins.sum(axis=1),
+        "draws": draws.sum(axis=1),
+        "losses": wins.sum(axis=0),
+    }).sort_values("elo", ascending=False)
+
+    ratings.to_csv(f"{output_dir}/elo_ratings.csv", index=False)
+    pd.DataFrame(wins, index=names, columns=names).to_csv(f"{output_dir}/win_matrix.csv")
+    pd.DataFrame(draws, index=names, columns=names).to_csv(f"{output_dir}/draw_matrix.csv")
+    with open(f"{output_dir}/tournament.json", "w") as f:
+        json.dump({
+            "players": players,
+            "n_games": n_games,
+            "num_tasks": len(tasks),
+            "seconds": duration,
+            "games_per_second": float(games.sum() / 2 / max(duration, 1e-9)),
+        }, f, indent=2)
+
+    print(f"Played {int(games.sum() // 2)} games in {duration:.1f} seconds")
+    print(ratings[["player", "elo", "games", "wins", "draws", "losses"]].to_string(index=False))
+    return ratings
+
+
+# running this file plays all checkpoints in data/agent_checkpoints/connect_four against each other and against the
+# baselines and writes the results to data/tournaments
+if __name__ == "__main__":
+    run_tournament(baselines=["random", "negamax"], n_games=100)
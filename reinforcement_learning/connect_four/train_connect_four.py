@@ -3,55 +3,76 @@ Training file for connect four.
 """
 
 # standard library imports
-import shutil
 import os
+from typing import Optional
 
 # 3rd party imports
 import ray
 import ray.rllib.agents.ppo as ppo
-import wandb
 
 # local imports (i.e. our own code)
-# noinspection PyUnresolvedReferences
 from utilities import utilities
+from utilities.metrics import create_metrics_backend
 # noinspection PyUnresolvedReferences
 from utilities import registration
 import connect_four.helpers as helpers
-
-wandb.login()
-wandb.init(project="connect-four", entity="mtp-ai-board-game-engine")
+from connect_four.checkpointing import AsyncCheckpointer, archive_checkpoints
 
 
-def main():
+def main(
+        selfplay: Optional[bool] = False,
+        metrics_backend: Optional[str] = "wandb",
+        resume: Optional[bool] = True,
+        keep_last: Optional[int] = 3,
+        keep_best: Optional[int] = 1
+):
     """
     Main training function for connect four.
-    
+
+    :param selfplay: if True, the agent is trained in self-play (against itself and a pool of frozen snapshots of
+    itself) on the multi-agent environment instead of against the greedy agent
+    :param metrics_backend: where the training results are logged: "wandb", "jsonl", "sqlite" (local file in
+    data/metrics) or "none" (cf. utilities/metrics.py)
+    :param resume: if True, training continues from the latest checkpoint in data/agent_checkpoints/connect_four,
+    else the checkpoints of the previous run are moved to data/agent_checkpoints/connect_four/archive/<timestamp>
+    :param keep_last: number of most recent checkpoints that are kept
+    :param keep_best: number of checkpoints with the highest episode_reward_mean that are kept
     :return: None
     """
-    # init directory in which to save checkpoints
-    chkpt_root = f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/agent_checkpoints/connect_four"
-    shutil.rmtree(chkpt_root, ignore_errors=True, onerror=None)
+    utilities.ensure_paths()
+    utilities.configure_warnings()
 
-    # init directory in which to log results
-    ray_results = "{}/ray_results/".format(os.getenv("HOME"))
-    shutil.rmtree(ray_results, ignore_errors=True, onerror=None)
+    metrics = create_metrics_backend(metrics_backend, project="connect-four", entity="mtp-ai-board-game-engine")
+
+    # directory in which to save checkpoints; they are written in the background (cf. connect_four/checkpointing.py)
+    chkpt_root = f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/agent_checkpoints/connect_four"
+    os.makedirs(chkpt_root, exist_ok=True)
+    if not resume:
+        archive_dir = archive_checkpoints(chkpt_root)
+        if archive_dir is not None:
+            print(f"Archived the checkpoints of the previous run to {archive_dir}")
+    checkpoints = helpers.get_agent_checkpoints(chkpt_root)
+    checkpointer = AsyncCheckpointer(chkpt_root, keep_last=keep_last, keep_best=keep_best)
 
     # start Ray -- add `local_mode=True` here for debugging
     ray.init()
 
     # configure the environment and create agent
-    config = helpers.get_config()
+    config = helpers.get_selfplay_config() if selfplay else helpers.get_config()
     config["num_gpus"] = 0
     config["num_workers"] = 4
 
-    agent = ppo.PPOTrainer(env="connectfour-v0", config=config)
+    agent = ppo.PPOTrainer(env=config.get("env") or "connectfour-v0", config=config)
+    if resume and checkpoints:
+        agent.restore(checkpoints[-1])
+        print(f"Resuming from {checkpoints[-1]}")
 
     # change the number of iterations to train for in range()
     for n in range(100):
         result = agent.train()
         helpers.preprocess_results(result)
-        wandb.log(result)
-        agent.save(chkpt_root)
+        metrics.log(result)
+        checkpointer.save(agent, result)
 
         print(
             f"ITERATION {n + 1:2d}, "
@@ -61,6 +82,9 @@ def main():
             f"mean length: {result['episode_len_mean']:8.2f} "
         )
 
+    checkpointer.close()
+    metrics.finish()
+
 
 # running this file will train a PPO agent and save the checkpoints in the
 # data/agent_checkpoints/connect_four directory
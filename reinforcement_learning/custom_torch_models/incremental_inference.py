@@ -0,0 +1,127 @@
+"""
+Incremental inference of the policy of FullyConnectedNetwork. Within an episode, the input-output samples of the
+observation never change and every action toggles a single bit of the flattened control flow matrix, hence the
+pre-activation of the first layer changes by one column of its weight matrix per step:
+
+    W · x' + b = (W · x + b) ± W[:, action]
+
+IncrementalPolicy caches the pre-activation of the first layer and updates it per toggle, such that the first layer
+costs O(hidden) instead of O(hidden · observation size) per step. The layers after the first one are evaluated as in
+FullyConnectedNetwork.custom_forward.
+
+For greedy play outs, IncrementalPolicy.greedy_action() detects cycles: if the most probable action leads back to a
+control flow matrix visited in the episode, it falls back to the most probable action leading to an unvisited matrix
+("fallback") or ends the play out ("terminate"), depending on the cycle policy.
+"""
+
+# standard library imports
+from typing import List, Optional, Set, Tuple, TYPE_CHECKING
+
+# 3rd party imports
+import numpy as np
+import torch
+
+# local imports (i.e. our own code)
+from dataset_generators import cf_layout
+
+if TYPE_CHECKING:
+    from custom_torch_models.rl_fully_connected_network import FullyConnectedNetwork
+
+# what greedy_action() does if the most probable action revisits a control flow matrix
+CYCLE_POLICIES = ("none", "fallback", "terminate")
+
+
+class IncrementalPolicy:
+
+    def __init__(self, model: "FullyConnectedNetwork", n_flat: int):
+        """
+        :param model: (pretrained) network; its weights must not change while the policy is used
+        :param n_flat: size of the flattened control flow matrix (the first n_flat elements of the observation)
+        """
+        self.model: "FullyConnectedNetwork" = model
+        self.n_flat: int = n_flat
+
+        hidden_layers = list(model._hidden_layers)
+        first_layer = hidden_layers[0] if hidden_layers else model._logits
+        # SlimFC: linear layer followed by the (optional) activation function
+        self.linear: torch.nn.Linear = first_layer._model[0]
+        self.activation: torch.nn.Module = first_layer._model[1:]
+        self.following_layers: List[torch.nn.Module] = hidden_layers[1:] + (
+            [model._logits] if hidden_layers and model._logits else []
+        )
+
+        # first-layer pre-activation (1, hidden) and control flow matrix (also packed) of the current state
+        self.preactivation: Optional[torch.Tensor] = None
+        self.control_flow: Optional[torch.Tensor] = None
+        self.key: int = 0
+
+    @torch.no_grad()
+    def reset(self, observation: torch.Tensor) -> None:
+        """
+        Starts an episode: computes the first-layer pre-activation of the whole observation once.
+
+        :param observation: (observation size,) flattened control flow matrix followed by the input-output samples
+        :return: None
+        """
+        observation = observation.float().to(self.linear.weight.device)
+        self.preactivation = self.linear(observation[None, :])
+        self.control_flow = observation[:self.n_flat].clone()
+        self.key = int(cf_layout.pack(self.control_flow.cpu().numpy().astype(np.int64)))
+
+    @torch.no_grad()
+    def toggle(self, action: int) -> None:
+        """
+        Toggles an edge of the control flow matrix and updates the first-layer pre-activation with its weight column.
+
+        :param action: index in the flattened control flow matrix
+        :return: None
+        """
+        action = int(action)
+        sign = 1.0 - 2.0 * self.control_flow[action]
+        self.preactivation += sign * self.linear.weight[:, action]
+        self.control_flow[action] = 1.0 - self.control_flow[action]
+        self.key ^= 1 << action
+
+    @torch.no_grad()
+    def following_logits(self, preactivation: torch.Tensor) -> torch.Tensor:
+        """
+        Evaluates the network from the first-layer pre-activations on.
+
+        :param preactivation: (batch, hidden) first-layer pre-activations
+        :return: (batch, num_outputs) logits
+        """
+        features = self.activation(preactivation)
+        for layer in self.following_layers:
+            features = layer(features)
+        if self.model.free_log_std:
+            features = self.model._append_free_log_std(features)
+        return features
+
+    def logits(self) -> torch.Tensor:
+        """
+        :return: (num_outputs,) logits of the current state (like FullyConnectedNetwork.custom_forward)
+        """
+        return self.following_logits(self.preactivation)[0]
+
+    def greedy_action(self, visited: Set[int], cycle_policy: Optional[str] = "fallback") -> Tuple[Optional[int], bool]:
+        """
+        Returns the most probable action, taking the control flow matrices visited in the episode into account.
+
+        :param visited: packed control flow matrices visited in the episode (including the current one)
+        :param cycle_policy: "none" (always the most probable action), "fallback" (the most probable action that leads
+        to an unvisited matrix) or "terminate" (None if the most probable action leads to a visited matrix)
+        :return: action (None to end the play out), whether the most probable action leads to a visited matrix
+        """
+        if cycle_policy not in CYCLE_POLICIES:
+            raise ValueError(f"unknown cycle policy: {cycle_policy}")
+
+        order = torch.argsort(self.logits()[:self.n_flat], descending=True).tolist()
+        if self.key ^ (1 << order[0]) not in visited:
+            return order[0], False
+        if cycle_policy == "none":
+            return order[0], True
+        if cycle_policy == "fallback":
+            for action in order[1:]:
+                if self.key ^ (1 << action) not in visited:
+                    return action, True
+        return None, True
@@ -0,0 +1,200 @@
+"""
+Policy-guided search solver for BugBit specifications. Instead of following the argmax of the policy for a fixed
+number of steps (cf. rl_network_rollout.rollout), the solver expands the top_k actions of every state:
+
+- "best_first": the states with the highest cumulative log-probability of their action sequence are expanded first
+- "beam": the search proceeds level by level and keeps the beam_width most probable states per level
+
+States are packed control flow matrices (cf. dataset_generators/cf_layout.py) and are visited at most once. The
+policy of a batch of states is evaluated at once from first-layer pre-activations, which are derived from the parent
+state with one weight column (cf. IncrementalPolicy). All children of a batch are checked against the samples with one
+call of the NumPy simulator. The search stops at the first program that matches the samples, or when the node or time
+budget is used up.
+"""
+
+# standard library imports
+import heapq
+import itertools
+import time
+from typing import Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+# 3rd party imports
+import numpy as np
+import torch
+
+# local imports (i.e. our own code)
+from custom_torch_models.incremental_inference import IncrementalPolicy
+from dataset_generators import bugbit_simulator as simulator, cf_layout
+
+if TYPE_CHECKING:
+    from custom_torch_models.rl_fully_connected_network import FullyConnectedNetwork
+
+
+class SearchResult:
+
+    def __init__(self, program: Optional[np.ndarray], actions: Tuple[int, ...], nodes: int, seconds: float):
+        """
+        :param program: flattened control flow matrix that matches the samples (None if none was found)
+        :param actions: actions leading from the start state to the program
+        :param nodes: number of states checked against the samples
+        :param seconds: runtime of the search
+        """
+        self.program: Optional[np.ndarray] = program
+        self.actions: Tuple[int, ...] = actions
+        self.nodes: int = nodes
+        self.seconds: float = seconds
+
+    @property
+    def solved(self) -> bool:
+        return self.program is not None
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.seconds if self.seconds > 0 else float("inf")
+
+
+class PolicySearch:
+
+    def __init__(
+            self,
+            model: "FullyConnectedNetwork",
+            n_bugs: int,
+            strategy: Optional[str] = "best_first",
+            top_k: Optional[int] = 3,
+            beam_width: Optional[int] = 32,
+            batch_size: Optional[int] = 32,
+            max_nodes: Optional[int] = 2000,
+            time_limit: Optional[float] = None
+    ):
+        """
+        :param model: (pretrained) network whose policy guides the search
+        :param n_bugs: number of bugs
+        :param strategy: "best_first" or "beam"
+        :param top_k: number of actions expanded per state
+        :param beam_width: number of states kept per level ("beam" only)
+        :param batch_size: number of states expanded at once ("best_first" only)
+        :param max_nodes: maximum number of states checked against the samples
+        :param time_limit: maximum runtime in seconds (OPTIONAL)
+        """
+        if strategy not in ("best_first", "beam"):
+            raise ValueError(f"unknown search strategy: {strategy}")
+        self.model: "FullyConnectedNetwork" = model
+        self.n_bugs: int = n_bugs
+        self.n_flat: int = n_bugs * (n_bugs - 1)
+        self.strategy: str = strategy
+        self.top_k: int = min(top_k, self.n_flat)
+        self.beam_width: int = beam_width
+        self.batch_size: int = batch_size
+        self.max_nodes: int = max_nodes
+        self.time_limit: Optional[float] = time_limit
+
+    def solve(self, ins: np.ndarray, outs: np.ndarray, control_flow: Optional[np.ndarray] = None) -> SearchResult:
+        """
+        Searches a program that produces the sample outputs for the sample inputs.
+
+        :param ins: (m, n) sample inputs
+        :param outs: (m, n) sample outputs
+        :param control_flow: flattened control flow matrix to start from (OPTIONAL, default: empty matrix)
+        :return: search result
+        """
+        start = time.time()
+        ins, outs = np.asarray(ins), np.asarray(outs)
+        flat = np.zeros(shape=(self.n_flat,), dtype=np.int64) if control_flow is None \
+            else np.asarray(control_flow, dtype=np.int64).reshape(-1)
+        in_codes, out_codes = simulator.encode_rows(ins), simulator.encode_rows(outs)
+
+        root = int(cf_layout.pack(flat))
+        nodes = 1
+        if self._consistent([root], in_codes, out_codes)[0]:
+            return SearchResult(program=flat, actions=(), nodes=nodes, seconds=time.time() - start)
+
+        policy = IncrementalPolicy(self.model, n_flat=self.n_flat)
+        policy.reset(torch.from_numpy(np.concatenate([flat, ins.reshape(-1), outs.reshape(-1)])).float())
+
+        # nodes: (negative cumulative log-probability, tie breaker, packed state, first-layer pre-activation, actions)
+        tie_breaker = itertools.count()
+        frontier = [(0.0, next(tie_breaker), root, policy.preactivation[0], ())]
+        visited = {root}
+
+        while frontier and nodes < self.max_nodes:
+            if self.time_limit is not None and time.time() - start > self.time_limit:
+                break
+
+            if self.strategy == "beam":
+                batch, frontier = frontier, []
+            else:
+                batch = [heapq.heappop(frontier) for _ in range(min(self.batch_size, len(frontier)))]
+
+            children = self._expand(batch, policy, visited, tie_breaker)[:self.max_nodes - nodes]
+            if not children:
+                continue
+            nodes += len(children)
+
+            consistent = self._consistent([child[2] for child in children], in_codes, out_codes)
+            if consistent.any():
+                # the most probable consistent child
+                cost, _, key, _, actions = min(child for child, found in zip(children, consistent) if found)
+                return SearchResult(
+                    program=cf_layout.unpack(np.uint64(key), n_bugs=self.n_bugs),
+                    actions=actions,
+                    nodes=nodes,
+                    seconds=time.time() - start
+                )
+
+            if self.strategy == "beam":
+                frontier = sorted(children)[:self.beam_width]
+            else:
+                for child in children:
+                    heapq.heappush(frontier, child)
+
+        return SearchResult(program=None, actions=(), nodes=nodes, seconds=time.time() - start)
+
+    @torch.no_grad()
+    def _expand(
+            self,
+            batch: List[tuple],
+            policy: IncrementalPolicy,
+            visited: set,
+            tie_breaker: Iterator[int]
+    ) -> List[tuple]:
+        """
+        Evaluates the policy of a batch of states and returns their unvisited children along the top_k actions.
+
+        :param batch: nodes to expand
+        :param policy: incremental policy of the search (its first layer and network)
+        :param visited: packed states that were already generated (updated)
+        :param tie_breaker: counter that orders nodes of equal cost
+        :return: child nodes
+        """
+        log_probabilities = policy.following_logits(torch.stack([node[3] for node in batch]))[:, :self.n_flat]
+        top_log_probabilities, top_actions = torch.topk(log_probabilities, self.top_k, dim=1)
+        weights = policy.linear.weight
+
+        children = []
+        for (cost, _, key, preactivation, actions), node_log_probabilities, node_actions in zip(
+                batch, top_log_probabilities.tolist(), top_actions.tolist()
+        ):
+            for log_probability, action in zip(node_log_probabilities, node_actions):
+                child = key ^ (1 << action)
+                if child in visited:
+                    continue
+                visited.add(child)
+                sign = 1.0 - 2.0 * ((key >> action) & 1)
+                children.append((
+                    cost - log_probability,
+                    next(tie_breaker),
+                    child,
+                    preactivation + sign * weights[:, action],
+                    actions + (action,)
+                ))
+        return children
+
+    def _consistent(self, keys: List[int], in_codes: np.ndarray, out_codes: np.ndarray) -> np.ndarray:
+        """
+        :param keys: packed programs
+        :param in_codes: (m,) sample input codes
+        :param out_codes: (m,) sample output codes
+        :return: (len(keys),) True for programs that produce the sample outputs
+        """
+        outputs = simulator.run(np.array(keys, dtype=np.uint64), self.n_bugs, in_codes)
+        return (outputs == out_codes).all(axis=1)
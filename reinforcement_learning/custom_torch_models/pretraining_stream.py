@@ -0,0 +1,179 @@
+"""
+Streaming pretraining dataset. Instead of reading the pickles written by create_pretraining_dataset, the samples
+(specification, modified control flow matrices, labels) are generated on the fly in the DataLoader worker processes,
+hence pretraining runs on fresh data with constant memory and without a disk step.
+
+Specifications are split into train and test by a hash of the function of their program (the full specification, i.e.
+the outputs for all inputs, before generate_sample subsamples the inputs): a function is held out for testing if its
+hash falls below test_percentage of the hash range. The split is deterministic across processes and runs, hence the
+training stream never yields a sample of a test function.
+
+The samples of one specification are generated together; a shuffle buffer spanning several specifications mixes them
+before they are yielded, such that a batch does not consist of the samples of a single specification.
+
+Outputs are computed with the NumPy simulator (cf. dataset_generators/bugbit_simulator.py), such that the worker
+processes do not start a JVM.
+"""
+
+# standard library imports
+import hashlib
+import random
+from typing import Iterator, List, Optional, Tuple
+
+# 3rd party imports
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+
+# local imports (i.e. our own code)
+from dataset_generators.bugbit_simulator import encode_rows
+from dataset_generators.pretraining_dataset_generation import create_training_samples
+from dataset_generators.program_generator import seed_program_generator
+
+
+def specification_hash(ins: np.ndarray, outs: np.ndarray) -> int:
+    """
+    Returns a hash of input-output samples that does not depend on the order of the samples (and, unlike hash(), not
+    on the process).
+
+    :param ins: (m, n) sample inputs
+    :param outs: (m, n) sample outputs
+    :return: 64-bit hash
+    """
+    in_codes = encode_rows(ins)
+    order = np.argsort(in_codes)
+    codes = np.stack([in_codes[order], encode_rows(outs)[order]]).astype(np.int64)
+    return int.from_bytes(hashlib.blake2b(codes.tobytes(), digest_size=8).digest(), "little")
+
+
+def is_held_out(ins: np.ndarray, outs: np.ndarray, test_percentage: float) -> bool:
+    """
+    :param ins: (2^n, n) all inputs
+    :param outs: (2^n, n) outputs of the program for all inputs
+    :param test_percentage: share of the functions that is held out for testing
+    :return: True if the function belongs to the test split
+    """
+    return specification_hash(ins, outs) < test_percentage * 2 ** 64
+
+
+class StreamingPretrainingDataset(IterableDataset):
+
+    def __init__(
+            self,
+            n_bugs: int,
+            multiple_actions: Optional[bool] = False,
+            reduced_modification_percentage: Optional[float] = 0.0,
+            optimal_labels: Optional[bool] = False,
+            test_percentage: Optional[float] = 0.2,
+            samples_per_epoch: Optional[int] = 100000,
+            shuffle_buffer_size: Optional[int] = 5000
+    ):
+        """
+        :param n_bugs: number of bugs
+        :param multiple_actions: if True, the algorithm can take one of multiple delete actions in a single step
+        :param reduced_modification_percentage: percentage of unused control flow matrix modifications
+        :param optimal_labels: if True, the labels follow a shortest path to any consistent program (cf.
+        EditDistanceOracle) instead of the solver
+        :param test_percentage: share of the functions that is held out for testing (cf. test_set())
+        :param samples_per_epoch: number of samples an iteration (i.e. an epoch of the DataLoader) yields
+        :param shuffle_buffer_size: number of samples the shuffle buffer holds (1: no shuffling)
+        """
+        super().__init__()
+        self.n_bugs: int = n_bugs
+        self.multiple_actions: bool = multiple_actions
+        self.reduced_modification_percentage: float = reduced_modification_percentage
+        self.optimal_labels: bool = optimal_labels
+        self.test_percentage: float = test_percentage
+        self.samples_per_epoch: int = samples_per_epoch
+        self.shuffle_buffer_size: int = shuffle_buffer_size
+        # counts the iterations in the main process (num_workers=0), such that every epoch is seeded differently
+        self._iterations: int = 0
+
+    def generate(self, held_out: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Generates the samples of one specification of the given split.
+
+        :param held_out: if True, generate a test specification, else a training specification
+        :return: x_samples, y_samples, sample_types, target programs (empty if the specification was rejected)
+        """
+        return create_training_samples(
+            n_bugs=self.n_bugs,
+            multiple_actions=self.multiple_actions,
+            reduced_modification_percentage=self.reduced_modification_percentage,
+            optimal_labels=self.optimal_labels,
+            accept_specification=lambda ins, outs: is_held_out(ins, outs, self.test_percentage) == held_out,
+            simulated=True
+        )
+
+    def _seed(self) -> int:
+        """
+        Seeds the random generators of the generator. In a DataLoader worker, the seed of the worker is used (it
+        differs between workers and between epochs); in the main process, the seed is derived from torch's generator.
+
+        :return: number of samples this process yields per epoch
+        """
+        worker_info = get_worker_info()
+        if worker_info is None:
+            seed = int(torch.empty((), dtype=torch.int64).random_().item()) + self._iterations
+            self._iterations += 1
+            n_workers, worker_id = 1, 0
+        else:
+            seed, n_workers, worker_id = worker_info.seed, worker_info.num_workers, worker_info.id
+
+        random.seed(seed)
+        np.random.seed(seed % 2 ** 32)
+        seed_program_generator(seed)
+        return self.samples_per_epoch // n_workers + (worker_id < self.samples_per_epoch % n_workers)
+
+    def __iter__(self) -> Iterator[Tuple[torch.Tensor, torch.Tensor]]:
+        """
+        Yields (sample, label) pairs of training specifications in random order: the buffer is refilled with the
+        samples of whole specifications and a random sample of the buffer is yielded.
+
+        :return: iterator over samples_per_epoch (sample, label) pairs (split over the workers)
+        """
+        n_samples = self._seed()
+        n_generated = 0
+        buffer: List[Tuple[np.ndarray, np.ndarray]] = []
+        for _ in range(n_samples):
+            while n_generated < n_samples and len(buffer) < self.shuffle_buffer_size:
+                x_samples, y_samples, _, _ = self.generate(held_out=False)
+                buffer.extend(zip(x_samples, y_samples))
+                n_generated += len(x_samples)
+
+            i = random.randrange(len(buffer))
+            buffer[i], buffer[-1] = buffer[-1], buffer[i]
+            x, y = buffer.pop()
+            # the 0/1 samples are yielded as uint8 (the network casts them in its first layer)
+            yield torch.from_numpy(x.astype(np.uint8)), torch.from_numpy(y).float()
+
+    def test_set(
+            self,
+            n_samples: int,
+            seed: Optional[int] = 0
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Generates a fixed test set from the held-out specifications.
+
+        :param n_samples: number of test samples
+        :param seed: seed of the generation
+        :return: x_test, y_test, target programs of the test samples
+        """
+        random.seed(seed)
+        np.random.seed(seed)
+        seed_program_generator(seed)
+
+        x_test, y_test, t_test = [], [], []
+        n_generated = 0
+        while n_generated < n_samples:
+            x_samples, y_samples, _, targets = self.generate(held_out=True)
+            x_test.append(x_samples)
+            y_test.append(y_samples)
+            t_test.append(targets)
+            n_generated += len(x_samples)
+
+        return (
+            torch.from_numpy(np.concatenate(x_test)[:n_samples]).float(),
+            torch.from_numpy(np.concatenate(y_test)[:n_samples]).float(),
+            torch.from_numpy(np.concatenate(t_test)[:n_samples]).float()
+        )
@@ -27,6 +27,8 @@ from tqdm import tqdm
 
 # local imports
 from dataset_generators.utils import cf_to_lower_triangular_flattened
+from custom_torch_models.incremental_inference import IncrementalPolicy
+from utilities.metrics import MetricsBackend
 from dataset_generators.pretraining_dataset_generation import read_samples, read_programs
 
 np.set_printoptions(threshold=sys.maxsize)
@@ -95,9 +97,13 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
             )
             num_outputs = num_outputs // 2
 
+        # size of the flattened observation: with the preprocessor API disabled, obs_space is the Dict space of the
+        # environment and the observations arrive unflattened (cf. forward)
+        self._obs_size = gym.spaces.flatdim(getattr(obs_space, "original_space", obs_space))
+
         # Create the hidden layers.
         layers = []
-        prev_layer_size = int(np.product(obs_space.shape))
+        prev_layer_size = self._obs_size
         self._logits = None
 
         for size in hiddens[:-1]:
@@ -144,7 +150,7 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
                     activation_fn=torch.nn.LogSoftmax
                 )
             else:
-                self.num_outputs = ([int(np.product(obs_space.shape))] + hiddens[-1:])[
+                self.num_outputs = ([self._obs_size] + hiddens[-1:])[
                     -1
                 ]
 
@@ -157,7 +163,7 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
         self._value_branch_separate = None
         if not self.vf_share_layers:
             # Build a parallel set of hidden layers for the value net.
-            prev_vf_layer_size = int(np.product(obs_space.shape))
+            prev_vf_layer_size = self._obs_size
             vf_layers = []
             for size in hiddens:
                 vf_layers.append(
@@ -179,7 +185,7 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
         )
         # Holds the current "base" output (before logits layer).
         self._features = None
-        # Holds the last input, in case value branch is separate.
+        # Holds the last input (in the dtype of the observation), in case value branch is separate.
         self._last_flat_in = None
 
         if model_config.get("pretraining"):
@@ -201,9 +207,13 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
         :return: The logits produced as a result of the forward pass as well as the state
         """
 
-        obs = input_dict["obs_flat"].float()
+        obs = input_dict["obs_flat"]
+        if isinstance(obs, dict):
+            # with the preprocessor API disabled, the (uint8) observation arrives unflattened: concatenate the
+            # components in the order of the Dict space (sorted keys), i.e. CF matrix, sample inputs, sample outputs
+            obs = torch.cat([obs[key].reshape(obs[key].shape[0], -1) for key in sorted(obs.keys())], dim=1)
         self._last_flat_in = obs.reshape(obs.shape[0], -1)
-        self._features = self._hidden_layers(self._last_flat_in)
+        self._features = self._hidden_layers(self._first_layer_input(self._last_flat_in))
         logits = self._logits(self._features) if self._logits else self._features
         if self.free_log_std:
             logits = self._append_free_log_std(logits)
@@ -219,12 +229,24 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
         :return: The logits produced as a result of the forward pass
         """
         self._last_flat_in = X
-        self._features = self._hidden_layers(self._last_flat_in)
+        self._features = self._hidden_layers(self._first_layer_input(self._last_flat_in))
         logits = self._logits(self._features) if self._logits else self._features
         if self.free_log_std:
             logits = self._append_free_log_std(logits)
         return logits
 
+    def _first_layer_input(self, obs: TensorType) -> TensorType:
+        """
+        Casts a (uint8) observation batch to the dtype of the first layer. The observation is kept in its compact dtype
+        everywhere else (sample batches, _last_flat_in), such that the float copy only exists as the input of the
+        first layer.
+
+        :param obs: (batch, observation size) observations
+        :return: observations in the dtype of the first layer's weights
+        """
+        dtype = next(self.parameters()).dtype
+        return obs if obs.dtype == dtype else obs.to(dtype)
+
     @override(TorchModelV2)
     def value_function(self) -> TensorType:
         """
@@ -236,7 +258,7 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
         assert self._features is not None, "must call forward() first"
         if self._value_branch_separate:
             return self._value_branch(
-                self._value_branch_separate(self._last_flat_in)
+                self._value_branch_separate(self._first_layer_input(self._last_flat_in))
             ).squeeze(1)
         else:
             return self._value_branch(self._features).squeeze(1)
@@ -252,7 +274,10 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
             zero_rollout: Optional[bool] = False,
             num_epochs: Optional[int] = 50,
             learning_rate: Optional[float] = 0.001,
-            batch_size: Optional[int] = 100
+            batch_size: Optional[int] = 100,
+            train_loader: Optional[DataLoader] = None,
+            cycle_policy: Optional[str] = "fallback",
+            metrics: Optional[MetricsBackend] = None
     ):
         """
         Train the network on the given data.
@@ -267,14 +292,22 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
         :param num_epochs: Number of epochs to train for.
         :param learning_rate: Learning rate for the optimiser.
         :param batch_size: Batch size for the optimiser.
+        :param train_loader: Loader of the training batches, e.g. over a StreamingPretrainingDataset (OPTIONAL, default:
+        shuffled batches of x and y)
+        :param cycle_policy: what the play outs do if the most probable action leads back to a visited CF matrix:
+        "none", "fallback" or "terminate" (cf. IncrementalPolicy.greedy_action)
+        :param metrics: backend the epoch metrics are logged to (OPTIONAL, default: the current wandb run, cf.
+        utilities/metrics.py)
         :return: the trained model
         """
+        log_metrics = wandb.log if metrics is None else metrics.log
 
         # use a TensorDataset
-        dataset = torch.utils.data.TensorDataset(x, y)
-        train_loader = torch.utils.data.DataLoader(
-            dataset, batch_size=batch_size, shuffle=True
-        )
+        if train_loader is None:
+            dataset = torch.utils.data.TensorDataset(x, y)
+            train_loader = torch.utils.data.DataLoader(
+                dataset, batch_size=batch_size, shuffle=True
+            )
         losses = []
         test_losses = []
 
@@ -283,6 +316,8 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
         test_accuracy = []
         successful_solves = []
         average_steps_correct = []
+        cycles_detected = []
+        early_terminations = []
 
         # sample 100 test samples for the play out/rollout
         play_out_indices = random.sample(range(len(x_test)), 100)
@@ -303,7 +338,7 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
                     cuda0 = torch.device('cuda:0')
                     input = input.to(cuda0)
                 output = self.custom_forward(input)
-                y_train = (batch[1])
+                y_train = batch[1].to(output.device)
                 loss = kl_div_loss(output, y_train)
 
                 # get the accuracy for the current batch
@@ -341,6 +376,7 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
                     tries = []
                     successes = 0
                     steps_correct = []
+                    cycles, terminations = 0, 0
                     for pi in tqdm(range(len(play_out_indices))):
 
                         index = play_out_indices[pi]
@@ -368,43 +404,46 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
                         # For 50 epochs let the network take actions and break, if the network
                         # found the correct solution
                         actions = 0
-                        for step in range(50):
-                            current_input = torch.from_numpy(current_input).float()
 
-                            if torch.cuda.is_available():
-                                out = self.custom_forward(current_input.cuda())
-                                # take the action which the agent is most confident about
-                                out_choice = torch.argmax(out)
+                        # get the desired solution to evaluate if the current matrix is already correct
+                        target = t_test[index].cpu() if torch.cuda.is_available() else t_test[index]
+                        t2 = torch.from_numpy(cf_to_lower_triangular_flattened(target)).float()
 
-                                # get the desired solution to evaluate if the current matrix is already correct
-                                t1 = current_input[:num_bugs * (num_bugs - 1)]
+                        # the first layer is evaluated once per play out and updated per toggle
+                        policy = IncrementalPolicy(self, n_flat=num_bugs * (num_bugs - 1))
+                        policy.reset(torch.from_numpy(current_input).float())
 
-                                t2 = torch.from_numpy(cf_to_lower_triangular_flattened(t_test[index].cpu())).float()
-                            else:
-                                out = self.custom_forward(current_input)
-                                # take the action which the agent is most confident about
-                                out_choice = torch.argmax(out)
+                        # CF matrices visited in this play out (packed)
+                        visited = {policy.key}
 
-                                # get the desired solution to evaluate if the current matrix is already correct
-                                t1 = current_input[:num_bugs * (num_bugs - 1)]
-
-                                t2 = torch.from_numpy(cf_to_lower_triangular_flattened(t_test[index])).float()
+                        for step in range(50):
+                            t1 = torch.from_numpy(np.asarray(current_matrix, dtype=np.float32))
 
                             if torch.equal(t1, t2):
                                 successes += 1
                                 steps_correct.append(actions)
                                 break
 
+                            # take the action which the agent is most confident about (unless it leads back to a
+                            # visited CF matrix, cf. IncrementalPolicy.greedy_action)
+                            out_choice, revisits = policy.greedy_action(visited, cycle_policy=cycle_policy)
+                            cycles += revisits
+                            if out_choice is None:
+                                terminations += 1
+                                break
+
                             current_matrix[out_choice] = 1 if current_matrix[out_choice] == 0 else 0
+                            policy.toggle(out_choice)
+                            visited.add(policy.key)
                             actions += 1
-                            current_input = np.concatenate((current_matrix, rand_sample))
-
                         tries.append(actions)
 
                     all_tries.append(np.mean(tries))
                     average_steps_correct.append(np.mean(steps_correct))
                     print(f"\nActions needed for solved programs: {steps_correct}")
                     successful_solves.append(successes)
+                    cycles_detected.append(cycles)
+                    early_terminations.append(terminations)
 
             train_accuracy.append(np.mean(train_batch_accuracies))
             test_accuracy.append(np.mean(test_batch_accuracies))
@@ -421,7 +460,7 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
             )
             if epoch % 10 == 0:
                 print("Tries: ", all_tries[-1])
-            wandb.log(
+            log_metrics(
                 {
                     # the average loss of the training batches in each epoch
                     "train_loss": losses[-1],
@@ -442,7 +481,13 @@ class FullyConnectedNetwork(TorchModelV2, nn.Module):
                     "Correct Solutions": successful_solves[-1],
 
                     # average number of steps of the correctly solved challenges in the rollout
-                    "Avg Steps/solution": average_steps_correct[-1]
+                    "Avg Steps/solution": average_steps_correct[-1],
+
+                    # how often the most probable action led back to a visited CF matrix in the rollout
+                    "Cycles detected": cycles_detected[-1],
+
+                    # number of play outs of the rollout that were terminated because of a cycle
+                    "Early terminations": early_terminations[-1]
 
                 }
             )
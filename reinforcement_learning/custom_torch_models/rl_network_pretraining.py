@@ -11,13 +11,15 @@ from typing import Optional
 import numpy as np
 import gym
 import torch
-import wandb
+from torch.utils.data import DataLoader
 
 # local imports
 from reinforcement_learning.custom_torch_models.rl_fully_connected_network import FullyConnectedNetwork
+from reinforcement_learning.custom_torch_models.pretraining_stream import StreamingPretrainingDataset
+from dataset_generators import dataset_cache
 from dataset_generators.pretraining_dataset_generation import read_samples, read_programs
-# noinspection PyUnresolvedReferences
 from utilities import utilities
+from utilities.metrics import create_metrics_backend
 
 
 def pretrain_network(
@@ -29,11 +31,18 @@ def pretrain_network(
         num_epochs: Optional[int] = 50,
         test_percentage: Optional[float] = 0.2,
         lr: Optional[float] = 0.001,
-        batch_size: Optional[float] = 100
+        batch_size: Optional[float] = 100,
+        streaming: Optional[bool] = False,
+        samples_per_epoch: Optional[int] = 100000,
+        n_test_samples: Optional[int] = 2000,
+        num_workers: Optional[int] = 4,
+        metrics_backend: Optional[str] = "wandb",
+        dataset_params: Optional[dict] = None
 ):
     """
     Pretrains the reinforcement learning agent. Before, the **pretraining_dataset_generator** has to be executed
-    to create the training set.
+    to create the training set, unless the samples are streamed (cf. StreamingPretrainingDataset) or taken from the
+    dataset cache (cf. dataset_params).
 
     :param n_bugs: number of bugs
     :param multiple_actions: whether we want to use training samples, where more than one delete action is possible.
@@ -44,8 +53,22 @@ def pretrain_network(
     :param test_percentage: percentage of test data in the entire data
     :param lr: learning rate
     :param batch_size: batch size
+    :param streaming: if True, the training samples are generated on the fly by DataLoader workers instead of being
+    read from the training set files; the test samples come from held-out functions (i.e. the functions are always
+    disjoint)
+    :param samples_per_epoch: number of generated training samples per epoch (streaming only)
+    :param n_test_samples: number of test samples (streaming only)
+    :param num_workers: number of DataLoader worker processes (streaming only)
+    :param metrics_backend: where the epoch metrics are logged: "wandb", "jsonl", "sqlite" (local file in data/metrics)
+    or "none" (cf. utilities/metrics.py)
+    :param dataset_params: parameters of the pretraining dataset besides n_bugs and multiple_actions (e.g.
+    {"reduced_modification_percentage": 0.95, "upper_bound_size": 10000, "seed": 10}); the dataset is taken from the
+    dataset cache and generated if it is not cached yet (cf. dataset_cache.pretraining_dataset). If None, the files
+    last written by the pretraining_dataset_generator are read.
     :return:
     """
+    utilities.ensure_paths()
+
     num_outputs = (2 * n_bugs ** 2) // 2 - n_bugs
 
     if config is None:
@@ -67,33 +90,55 @@ def pretrain_network(
     net = FullyConnectedNetwork(obs_space=observation_space, action_space=action_space, num_outputs=num_outputs,
                                 model_config=config, name="default_model")
 
-    # read data and create test samples
-    x, y = read_samples(n_bugs, multiple_actions=multiple_actions)
-    t = read_programs(n_bugs, multiple_actions=multiple_actions)
-
-    if disjoint_functions:
-        # take last 20% of training set
-        test_indices = range(int(len(x) * (1 - test_percentage)), len(x))
+    train_loader = None
+    if streaming:
+        # generate training samples on the fly and test samples from held-out specifications
+        dataset = StreamingPretrainingDataset(
+            n_bugs=n_bugs,
+            multiple_actions=multiple_actions,
+            test_percentage=test_percentage,
+            samples_per_epoch=samples_per_epoch
+        )
+        x_test, y_test, t_test = dataset.test_set(n_samples=n_test_samples)
+        train_loader = DataLoader(dataset, batch_size=batch_size, num_workers=num_workers)
+        x = y = None
+        disjoint_functions = True
+
+        print(f"Training Samples per Epoch: {samples_per_epoch} (generated)")
     else:
-        test_indices = random.sample(range(0, len(x)), int(len(x) * test_percentage))
-    x_test = np.take(x, test_indices, axis=0)
-    y_test = np.take(y, test_indices, axis=0)
-    t_test = np.take(t, test_indices, axis=0)
-
-    x = np.delete(x, test_indices, axis=0)
-    y = np.delete(y, test_indices, axis=0)
-    t = np.delete(t, test_indices, axis=0)
-    x = torch.from_numpy(x).float()
-    y = torch.from_numpy(y).float()
-    x_test = torch.from_numpy(x_test).float()
-    y_test = torch.from_numpy(y_test).float()
-    t_test = torch.from_numpy(t_test).float()
+        # read data and create test samples
+        directory = None
+        if dataset_params is not None:
+            directory = dataset_cache.pretraining_dataset(
+                num_bugs=n_bugs, multiple_actions=multiple_actions, **dataset_params
+            )
+        x, y = read_samples(n_bugs, multiple_actions=multiple_actions, directory=directory)
+        t = read_programs(n_bugs, multiple_actions=multiple_actions, directory=directory)
+
+        if disjoint_functions:
+            # take last 20% of training set
+            test_indices = range(int(len(x) * (1 - test_percentage)), len(x))
+        else:
+            test_indices = random.sample(range(0, len(x)), int(len(x) * test_percentage))
+        x_test = np.take(x, test_indices, axis=0)
+        y_test = np.take(y, test_indices, axis=0)
+        t_test = np.take(t, test_indices, axis=0)
+
+        x = np.delete(x, test_indices, axis=0)
+        y = np.delete(y, test_indices, axis=0)
+        t = np.delete(t, test_indices, axis=0)
+        x = torch.from_numpy(x).float()
+        y = torch.from_numpy(y).float()
+        x_test = torch.from_numpy(x_test).float()
+        y_test = torch.from_numpy(y_test).float()
+        t_test = torch.from_numpy(t_test).float()
+
+        print(f"Training Samples: {len(x)}")
 
     print((x_test[0]))
     print(y_test[0])
 
-    print(f"Training Samples: {len(x)}")
-    print("Testing Samples: {len(X_test)}")
+    print(f"Testing Samples: {len(x_test)}")
 
     # prepare the training
     name = f"RL_Pretraining_Model_KL_DIV_Training_{str(n_bugs)}-Bugs--lr={str(lr)}--batch_size={str(batch_size)}--Multiple_Actions=" \
@@ -105,13 +150,15 @@ def pretrain_network(
     path = os.getenv('REINFORCEMENT_LEARNING_DIR') + "/data/model_weights/" + name
     print(path)
 
-    wandb.login()
-    wandb.init(project="Pretraining", entity="mtp-ai-board-game-engine", name=name)
+    metrics = create_metrics_backend(
+        metrics_backend, project="Pretraining", entity="mtp-ai-board-game-engine", name=name
+    )
 
     if torch.cuda.is_available():
         cuda0 = torch.device('cuda:0')
-        x = x.to(cuda0)
-        y = y.to(cuda0)
+        if not streaming:
+            x = x.to(cuda0)
+            y = y.to(cuda0)
         x_test = x_test.to(cuda0)
         y_test = y_test.to(cuda0)
         t_test = t_test.to(cuda0)
@@ -120,12 +167,16 @@ def pretrain_network(
     if torch.cuda.is_available():
         net = net.cuda()
     net.sample_train(x, y, x_test, y_test, t_test, zero_rollout=zero_rollout, num_bugs=n_bugs,
-                     num_epochs=num_epochs)
+                     num_epochs=num_epochs, train_loader=train_loader, metrics=metrics)
 
     # save pretrained model
     torch.save(net.state_dict(), path)
-    wandb.finish()
+    metrics.finish()
 
 
 if __name__ == "__main__":
-    pretrain_network(n_bugs=3, multiple_actions=True)
+    pretrain_network(
+        n_bugs=3,
+        multiple_actions=True,
+        dataset_params={"reduced_modification_percentage": 0.95, "upper_bound_size": 10000, "seed": 10}
+    )
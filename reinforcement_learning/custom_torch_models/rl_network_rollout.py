@@ -20,6 +20,9 @@ import torch
 from dataset_generators.utils import cf_to_lower_triangular_flattened, flattened_repr_to_control_flow_matrix
 from dataset_generators.pretraining_dataset_generation import read_samples, read_programs
 from custom_torch_models.rl_fully_connected_network import FullyConnectedNetwork
+from custom_torch_models.incremental_inference import IncrementalPolicy
+from custom_torch_models.policy_search import PolicySearch
+from utilities import utilities
 
 warnings.filterwarnings("ignore", category=UserWarning)
 torch.set_printoptions(threshold=sys.maxsize)
@@ -31,7 +34,8 @@ def rollout(
         t_test: torch.Tensor,
         num_bugs: int,
         play_out_indices: List[int],
-        zero_rollout: Optional[bool] = False
+        zero_rollout: Optional[bool] = False,
+        cycle_policy: Optional[str] = "fallback"
 ):
     """
     This method performs a rollout on the given model. The network is given a set of test samples for which it has 50
@@ -43,9 +47,13 @@ def rollout(
     :param num_bugs: Number of bugs
     :param play_out_indices: Indices defining which test data to roll out
     :param zero_rollout: True, if you want to start with an empty CF matrix.
+    :param cycle_policy: what to do if the most probable action leads back to a visited CF matrix: "none", "fallback"
+    (take the most probable action leading to an unvisited matrix) or "terminate" (cf. IncrementalPolicy.greedy_action)
     :return: None
     """
     successes = 0
+    # how often the most probable action led back to a visited CF matrix, and how many play outs were terminated
+    cycles, terminations = 0, 0
     for pi in range(len(play_out_indices)):
 
         index = play_out_indices[pi]
@@ -84,40 +92,81 @@ def rollout(
             t2 = torch.from_numpy(cf_to_lower_triangular_flattened(t_test[index])).float()
             print(t_test[index])
 
+        # the first layer is evaluated once per challenge and updated per toggle (cf. IncrementalPolicy)
+        policy = IncrementalPolicy(model, n_flat=num_bugs * (num_bugs - 1))
+        policy.reset(torch.from_numpy(current_input).float())
+        # CF matrices visited in this play out (packed, cf. IncrementalPolicy.greedy_action)
+        visited = {policy.key}
+
         for step in range(50):
             print("\n")
             print(f"Input-Matrix at Step {step}:")
             print(flattened_repr_to_control_flow_matrix(current_matrix, num_bugs))
 
-            current_input = torch.from_numpy(current_input).float()
-
-            if torch.cuda.is_available():
-                out = model.custom_forward(current_input.cuda())
-                out_choice = torch.argmax(out)
-                # if epoch == 0:
-
-                t1 = current_input[:num_bugs * (num_bugs - 1)]
-
-            else:
-                out = model.custom_forward(current_input)
-                out_choice = torch.argmax(out)
-                t1 = current_input[:num_bugs * (num_bugs - 1)]
-
-                t2 = torch.from_numpy(cf_to_lower_triangular_flattened(t_test[index])).float()
-
-            print(f"Action chosen: {out_choice.item()}\n\n")
+            t1 = torch.from_numpy(np.asarray(current_matrix, dtype=np.float32))
             if torch.equal(t1, t2):
                 successes += 1
                 # steps_correct.append(actions)
                 break
 
+            out_choice, revisits = policy.greedy_action(visited, cycle_policy=cycle_policy)
+            cycles += revisits
+            if out_choice is None:
+                terminations += 1
+                print("The most probable action leads back to a visited CF matrix, the play out is terminated.")
+                break
+            print(f"Action chosen: {out_choice}{' (cycle avoided)' if revisits else ''}\n\n")
+
             current_matrix[out_choice] = 1 if current_matrix[out_choice] == 0 else 0
+            policy.toggle(out_choice)
+            visited.add(policy.key)
             actions += 1
-            current_input = np.concatenate((current_matrix, rand_sample))
 
         print("----------------------")
         print("----------------------")
     print(f"Solved {successes}/{len(play_out_indices)} Challenges.")
+    print(f"Cycles detected: {cycles} (cycle policy '{cycle_policy}'), play outs terminated early: {terminations}.")
+
+
+def search_rollout(
+        model: torch.nn.Module,
+        x_test: torch.Tensor,
+        num_bugs: int,
+        play_out_indices: List[int],
+        zero_rollout: Optional[bool] = False,
+        search_config: Optional[dict] = None
+):
+    """
+    Solves the given test samples with the policy-guided search (cf. PolicySearch) instead of greedy play outs and
+    prints the solve rate and the search speed.
+
+    :param model: The pretrained pytorch network
+    :param x_test: Testing data (CF-Matrix, Input-Output samples)
+    :param num_bugs: Number of bugs
+    :param play_out_indices: Indices defining which test data to roll out
+    :param zero_rollout: True, if you want to start with an empty CF matrix.
+    :param search_config: keyword arguments of PolicySearch (e.g. strategy, top_k, max_nodes)
+    :return: None
+    """
+    search = PolicySearch(model, n_bugs=num_bugs, **(search_config or {}))
+    n_flat = num_bugs * (num_bugs - 1)
+
+    successes, nodes, seconds = 0, 0, 0.0
+    for index in play_out_indices:
+        sample = x_test[index].cpu().numpy()
+        io_size = len(sample) - n_flat
+        inputs = np.reshape(sample[n_flat:n_flat + io_size // 2], newshape=(-1, num_bugs)).astype(np.int64)
+        outputs = np.reshape(sample[n_flat + io_size // 2:], newshape=(-1, num_bugs)).astype(np.int64)
+
+        result = search.solve(inputs, outputs, control_flow=None if zero_rollout else sample[:n_flat])
+        successes += result.solved
+        nodes += result.nodes
+        seconds += result.seconds
+        print(f"Challenge {index}: {'solved' if result.solved else 'not solved'} after {result.nodes} nodes "
+              f"(actions {list(result.actions)})")
+
+    print(f"Solved {successes}/{len(play_out_indices)} Challenges "
+          f"({nodes} nodes in {seconds:.2f}s, {nodes / max(seconds, 1e-9):.0f} nodes/s).")
 
 
 def start_rollout(
@@ -126,7 +175,9 @@ def start_rollout(
         model_path: str,
         n_rollouts: Optional[int] = 10,
         zero_rollout: Optional[bool] = False,
-        config: Optional[dict] = None
+        config: Optional[dict] = None,
+        search_config: Optional[dict] = None,
+        cycle_policy: Optional[str] = "fallback"
 ):
     """
     This method starts a rollout on the given model.
@@ -137,6 +188,9 @@ def start_rollout(
     :param n_rollouts: Number of rollouts
     :param zero_rollout: if true, start each rollout with an empty CF matrix
     :param config: config dictionary for the custom_torch_fcnn
+    :param search_config: if given, the challenges are solved with the policy-guided search with these keyword
+    arguments (cf. PolicySearch) instead of greedy play outs
+    :param cycle_policy: cycle policy of the greedy play outs (cf. rollout)
     :return: None
     """
     random.seed(10)
@@ -182,10 +236,16 @@ def start_rollout(
     net.load_state_dict(torch.load(model_path))
 
     play_out_indices = random.sample(range(len(x_test)), n_rollouts)
-    rollout(net, x_test, t_test, num_bugs=n_bugs, play_out_indices=play_out_indices, zero_rollout=zero_rollout)
+    if search_config is not None:
+        search_rollout(net, x_test, num_bugs=n_bugs, play_out_indices=play_out_indices, zero_rollout=zero_rollout,
+                       search_config=search_config)
+    else:
+        rollout(net, x_test, t_test, num_bugs=n_bugs, play_out_indices=play_out_indices, zero_rollout=zero_rollout,
+                cycle_policy=cycle_policy)
 
 
 if __name__ == "__main__":
+    utilities.ensure_paths()
     random.seed(10)
 
     model_file_name: str = "RL_Pretraining_Model_KL_DIV_Training_3-Bugs--lr=0.001--batch_size=100" \
@@ -0,0 +1,115 @@
+"""
+Vectorised NumPy simulator of BugBit programs with the semantics of CF_Translated.execute, used where the JVM is too
+slow (e.g. for evaluating every program of the program space):
+
+- execution starts at bug 0
+- a bug flips its internal state and leaves through control pin 0 if its new state is 0, else through control pin 1
+- entry [i, j] of the (n, 2n) control flow matrix connects control pin j % 2 of bug j // 2 to bug i; if several
+  entries of a column are set, the last one (i.e. the highest row) wins
+- an unconnected control pin terminates the program, the outputs are the internal states of all bugs
+
+Under the waterfall principle a bug only passes control to bugs with a higher index, hence every bug runs at most
+once and a program terminates after at most n_bugs steps.
+
+Programs are given as packed keys: bit i of the key is element i of the flattened lower-triangular representation
+(cf. cf_layout.py). Inputs and outputs are given as codes: bug 0 is the most significant
+bit (cf. utils.generate_ins, i.e. input code x is row x of generate_ins).
+"""
+
+# 3rd party imports
+import numpy as np
+
+# local imports (i.e. our own code)
+from dataset_generators.cf_layout import flat_coordinates
+
+# number of programs simulated at once (bounds the memory of the (programs, inputs) working arrays)
+CHUNK_SIZE: int = 1 << 16
+
+
+def encode_rows(bits: np.ndarray) -> np.ndarray:
+    """
+    Converts rows of bug states to codes (bug 0 is the most significant bit).
+
+    :param bits: (..., n) array of 0/1
+    :return: (...) array of codes
+    """
+    bits = np.asarray(bits, dtype=np.int64)
+    weights = 1 << np.arange(bits.shape[-1] - 1, -1, -1, dtype=np.int64)
+    return bits @ weights
+
+
+def decode_codes(codes: np.ndarray, n_bugs: int) -> np.ndarray:
+    """
+    Converts codes to rows of bug states (inverse of encode_rows).
+
+    :param codes: (...) array of codes
+    :param n_bugs: number of bugs
+    :return: (..., n) array of 0/1
+    """
+    shifts = np.arange(n_bugs - 1, -1, -1, dtype=np.int64)
+    return ((np.asarray(codes, dtype=np.int64)[..., None] >> shifts) & 1).astype(np.int64)
+
+
+def flow_targets(keys: np.ndarray, n_bugs: int) -> np.ndarray:
+    """
+    Returns the bug every control pin passes control to.
+
+    :param keys: (P,) packed programs
+    :param n_bugs: number of bugs
+    :return: (P, 2n) array; entry [p, 2 * b + pin] is the target of control pin pin of bug b, -1 if unconnected
+    """
+    keys = np.asarray(keys, dtype=np.uint64)
+    targets = np.full(shape=(len(keys), 2 * n_bugs), fill_value=-1, dtype=np.int64)
+    rows, cols = flat_coordinates(n_bugs)
+    # the coordinates are sorted by row, hence later rows overwrite earlier ones
+    for bit, (row, col) in enumerate(zip(rows, cols)):
+        is_set = ((keys >> np.uint64(bit)) & np.uint64(1)).astype(bool)
+        targets[is_set, col] = row
+    return targets
+
+
+def run(keys: np.ndarray, n_bugs: int, input_codes: np.ndarray) -> np.ndarray:
+    """
+    Executes every program on every input.
+
+    :param keys: (P,) packed programs
+    :param n_bugs: number of bugs
+    :param input_codes: (m,) input codes
+    :return: (P, m) output codes
+    """
+    keys = np.asarray(keys, dtype=np.uint64)
+    input_codes = np.asarray(input_codes, dtype=np.int64)
+    outputs = np.empty(shape=(len(keys), len(input_codes)), dtype=np.int64)
+
+    for start in range(0, len(keys), CHUNK_SIZE):
+        targets = flow_targets(keys[start:start + CHUNK_SIZE], n_bugs)
+        n_programs = len(targets)
+        flat_targets = targets.reshape(-1)
+        offsets = (np.arange(n_programs, dtype=np.int64) * 2 * n_bugs)[:, None]
+
+        states = np.broadcast_to(input_codes, (n_programs, len(input_codes))).copy()
+        current = np.zeros_like(states)
+        running = np.ones(states.shape, dtype=bool)
+        for _ in range(n_bugs):
+            if not running.any():
+                break
+            shift = n_bugs - 1 - current
+            states = np.where(running, states ^ (1 << shift), states)
+            pin = (states >> shift) & 1
+            following = flat_targets[offsets + 2 * current + pin]
+            running &= following >= 0
+            current = np.where(running, following, current)
+        outputs[start:start + n_programs] = states
+    return outputs
+
+
+def truth_tables(keys: np.ndarray, n_bugs: int) -> np.ndarray:
+    """
+    Returns the outputs of every program on all 2^n inputs.
+
+    :param keys: (P,) packed programs
+    :param n_bugs: number of bugs
+    :return: (P, 2^n) output codes (column x holds the output for input code x)
+    """
+    dtype = np.uint8 if n_bugs <= 8 else np.uint16
+    return run(keys, n_bugs, np.arange(2 ** n_bugs)).astype(dtype)
@@ -0,0 +1,152 @@
+"""
+Conversions between the layouts of BugBit programs:
+
+- control flow matrix: (n, 2n) array, entry [i, j] connects control pin j % 2 of bug j // 2 to bug i
+- flattened representation: the k = n * (n - 1) entries of the matrix that the waterfall principle allows (j < 2 * i),
+  row by row (the observation / action layout of the BugBit environment); entry [i, j] is element i * (i - 1) + j
+- packed key: bit i of an unsigned 64-bit integer is element i of the flattened representation
+
+The gather/scatter indices are computed once per number of bugs and cached, hence every conversion of a batch is a
+single indexing operation. The conversions between matrices and flattened representations accept NumPy arrays as well
+as torch tensors (and return the same type); packed keys are NumPy only.
+"""
+
+# standard library imports
+from functools import lru_cache
+from typing import Tuple, Union, TYPE_CHECKING
+
+# 3rd party imports
+import numpy as np
+
+if TYPE_CHECKING:
+    import torch
+
+# NumPy array or torch tensor
+Array = Union[np.ndarray, "torch.Tensor"]
+
+
+@lru_cache(maxsize=None)
+def flat_coordinates(n_bugs: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the coordinates in the (n, 2n) control flow matrix of the elements of the flattened representation.
+
+    :param n_bugs: number of bugs
+    :return: rows, columns (each of length n_bugs * (n_bugs - 1))
+    """
+    rows = np.concatenate([np.full(2 * i, i) for i in range(n_bugs)]).astype(np.int64)
+    cols = np.concatenate([np.arange(2 * i) for i in range(n_bugs)]).astype(np.int64)
+    rows.setflags(write=False)
+    cols.setflags(write=False)
+    return rows, cols
+
+
+@lru_cache(maxsize=None)
+def flat_positions(n_bugs: int) -> np.ndarray:
+    """
+    Returns the positions in the row-major flattened (n, 2n) control flow matrix of the elements of the flattened
+    representation (i.e. the gather / scatter index of the conversions).
+
+    :param n_bugs: number of bugs
+    :return: (n_bugs * (n_bugs - 1),) positions
+    """
+    rows, cols = flat_coordinates(n_bugs)
+    positions = rows * 2 * n_bugs + cols
+    positions.setflags(write=False)
+    return positions
+
+
+def flat_index(row: Union[int, np.ndarray], col: Union[int, np.ndarray]) -> Union[int, np.ndarray]:
+    """
+    Returns the index in the flattened representation of control flow matrix entries (which must satisfy col < 2 * row).
+
+    :param row: row(s) of the entries
+    :param col: column(s) of the entries
+    :return: index / indices in the flattened representation
+    """
+    return row * (row - 1) + col
+
+
+def _index(array: Array, index: np.ndarray) -> Array:
+    """
+    :param array: NumPy array or torch tensor that is indexed
+    :param index: NumPy index
+    :return: the index in the type (and on the device) of array
+    """
+    if isinstance(array, np.ndarray):
+        return index
+    # noinspection PyPackageRequirements
+    import torch
+    return torch.as_tensor(index, device=array.device)
+
+
+def to_flat(cf: Array) -> Array:
+    """
+    Converts control flow matrices to flattened representations.
+
+    :param cf: (..., n, 2n) control flow matrices
+    :return: (..., n * (n - 1)) flattened representations (same type and dtype)
+    """
+    n_bugs = cf.shape[-2]
+    return cf.reshape(*cf.shape[:-2], 2 * n_bugs * n_bugs)[..., _index(cf, flat_positions(n_bugs))]
+
+
+def to_matrix(flat_cf: Array, n_bugs: int) -> Array:
+    """
+    Converts flattened representations to control flow matrices (entries outside the waterfall layout are 0).
+
+    :param flat_cf: (..., n * (n - 1)) flattened representations
+    :param n_bugs: number of bugs
+    :return: (..., n, 2n) control flow matrices (same type and dtype)
+    """
+    shape = (*flat_cf.shape[:-1], 2 * n_bugs * n_bugs)
+    if isinstance(flat_cf, np.ndarray):
+        cf = np.zeros(shape=shape, dtype=flat_cf.dtype)
+    else:
+        cf = flat_cf.new_zeros(shape)
+    cf[..., _index(flat_cf, flat_positions(n_bugs))] = flat_cf
+    return cf.reshape(*shape[:-1], n_bugs, 2 * n_bugs)
+
+
+def pack(flat_cfs: np.ndarray) -> np.ndarray:
+    """
+    Packs flattened control flow matrices into keys.
+
+    :param flat_cfs: (..., k) flattened lower-triangular representations
+    :return: (...) keys
+    """
+    flat_cfs = np.asarray(flat_cfs, dtype=np.uint64)
+    weights = np.uint64(1) << np.arange(flat_cfs.shape[-1], dtype=np.uint64)
+    return (flat_cfs * weights).sum(axis=-1, dtype=np.uint64)
+
+
+def unpack(keys: np.ndarray, n_bugs: int) -> np.ndarray:
+    """
+    Unpacks keys into flattened control flow matrices (inverse of pack).
+
+    :param keys: (...) keys
+    :param n_bugs: number of bugs
+    :return: (..., n_bugs * (n_bugs - 1)) array of 0/1
+    """
+    shifts = np.arange(n_bugs * (n_bugs - 1), dtype=np.uint64)
+    return ((np.asarray(keys, dtype=np.uint64)[..., None] >> shifts) & np.uint64(1)).astype(np.int64)
+
+
+def pack_matrices(cf: np.ndarray) -> np.ndarray:
+    """
+    Packs control flow matrices into keys.
+
+    :param cf: (..., n, 2n) control flow matrices
+    :return: (...) keys
+    """
+    return pack(to_flat(np.asarray(cf)))
+
+
+def unpack_matrices(keys: np.ndarray, n_bugs: int) -> np.ndarray:
+    """
+    Unpacks keys into control flow matrices (inverse of pack_matrices).
+
+    :param keys: (...) keys
+    :param n_bugs: number of bugs
+    :return: (..., n, 2n) int64 control flow matrices
+    """
+    return to_matrix(unpack(keys, n_bugs), n_bugs)
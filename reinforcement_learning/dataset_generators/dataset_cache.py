@@ -0,0 +1,271 @@
+"""
+Content-addressed cache of the generated datasets. A dataset is requested by its parameters, e.g.
+
+    training_set = dataset_cache.rl_training_set(size=10000, n_bugs=3, sample_size=4, seed=10)
+
+and is generated on the first request only. Every entry is keyed by a hash of the generator name, its parameters, the
+seed and the code version (a hash of the source files of the dataset_generators package), i.e. changing the generator
+code invalidates the entries it generated. The entries live in data/training_sets/cache/<key>/; the manifest
+(data/training_sets/cache/manifest.json) lists the generator, parameters, seed, code version, generation time and files
+of every entry.
+
+Concurrent requests of the same dataset (e.g. the rollout workers of parallel Ray trials) are serialised by a file lock
+per key (fcntl.flock, i.e. processes on the same machine): the first process generates the entry into a hidden
+directory and renames it when it is complete, the others wait for the lock and read the entry. Requests of complete
+entries do not take the lock.
+
+Before generating, the cache seeds random, np.random and the program generator with the seed of the request.
+"""
+
+# standard library imports
+import os
+import json
+import time
+import fcntl
+import random
+import shutil
+import hashlib
+from functools import lru_cache
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, TYPE_CHECKING
+
+# 3rd party imports
+import numpy as np
+
+# local imports (i.e. our own code)
+from utilities import utilities
+from dataset_generators.program_generator import seed_program_generator
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+MANIFEST_FILE_NAME: str = "manifest.json"
+RL_TRAINING_SET_FILE_NAME: str = "training_set.pkl"
+
+_code_version: Optional[str] = None
+
+
+def default_cache_dir() -> str:
+    """
+    :return: data/training_sets/cache in the reinforcement_learning directory
+    """
+    utilities.ensure_paths()
+    return f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/training_sets/cache"
+
+
+def code_version() -> str:
+    """
+    :return: hash of the source files of the dataset_generators package (except this module), computed once per process
+    """
+    global _code_version
+    if _code_version is None:
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha256()
+        for name in sorted(os.listdir(package_dir)):
+            if name.endswith(".py") and name != os.path.basename(__file__):
+                with open(f"{package_dir}/{name}", "rb") as f:
+                    digest.update(name.encode() + b"\0" + f.read() + b"\0")
+        _code_version = digest.hexdigest()[:16]
+    return _code_version
+
+
+def cache_key(generator: str, params: Dict[str, Any], seed: int) -> str:
+    """
+    :param generator: name of the generator
+    :param params: parameters of the generator (JSON serialisable)
+    :param seed: seed of the generation
+    :return: key of the dataset
+    """
+    description = json.dumps(
+        {"generator": generator, "params": params, "seed": seed, "code_version": code_version()}, sort_keys=True
+    )
+    return hashlib.sha256(description.encode()).hexdigest()[:24]
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """
+    Holds an exclusive lock of the file (created if necessary) until the context is left.
+
+    :param path: path of the lock file
+    :return: None
+    """
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_manifest(cache_dir: Optional[str] = None) -> Dict[str, dict]:
+    """
+    :param cache_dir: directory of the cache (OPTIONAL, default: cf. default_cache_dir)
+    :return: key -> description of the entry
+    """
+    path = f"{cache_dir or default_cache_dir()}/{MANIFEST_FILE_NAME}"
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _add_to_manifest(cache_dir: str, key: str, description: dict) -> None:
+    """
+    Adds an entry to the manifest (read-modify-write under the lock of the manifest, replaced atomically).
+
+    :param cache_dir: directory of the cache
+    :param key: key of the entry
+    :param description: description of the entry
+    :return: None
+    """
+    with _file_lock(f"{cache_dir}/{MANIFEST_FILE_NAME}.lock"):
+        manifest = read_manifest(cache_dir)
+        manifest[key] = description
+        temporary_file = f"{cache_dir}/.{MANIFEST_FILE_NAME}.tmp"
+        with open(temporary_file, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temporary_file, f"{cache_dir}/{MANIFEST_FILE_NAME}")
+
+
+def get_or_create(
+        generator: str,
+        params: Dict[str, Any],
+        seed: int,
+        build: Callable[[str], None],
+        cache_dir: Optional[str] = None
+) -> str:
+    """
+    Returns the directory of a cached dataset and generates it if it is not cached yet.
+
+    :param generator: name of the generator
+    :param params: parameters of the generator (JSON serialisable)
+    :param seed: seed of the generation
+    :param build: writes the dataset into the directory it is called with
+    :param cache_dir: directory of the cache (OPTIONAL, default: cf. default_cache_dir)
+    :return: directory of the entry
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    key = cache_key(generator, params, seed)
+    directory = f"{cache_dir}/{key}"
+    if os.path.isdir(directory):
+        return directory
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with _file_lock(f"{cache_dir}/{key}.lock"):
+        # another process may have generated the entry while this one waited for the lock
+        if os.path.isdir(directory):
+            return directory
+
+        print(f"Generating {generator} {params} (seed {seed}) into the dataset cache")
+        temporary_directory = f"{cache_dir}/.{key}.tmp"
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+        os.makedirs(temporary_directory)
+
+        random.seed(seed)
+        np.random.seed(seed)
+        seed_program_generator(seed)
+        start = time.time()
+        build(temporary_directory)
+        seconds = time.time() - start
+
+        files = {
+            name: os.path.getsize(f"{temporary_directory}/{name}") for name in sorted(os.listdir(temporary_directory))
+        }
+        os.rename(temporary_directory, directory)
+        _add_to_manifest(cache_dir, key, {
+            "generator": generator,
+            "params": params,
+            "seed": seed,
+            "code_version": code_version(),
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "seconds": round(seconds, 3),
+            "files": files,
+        })
+    return directory
+
+
+def rl_training_set(
+        size: Optional[int] = 100,
+        n_bugs: Optional[int] = 5,
+        sample_size: Optional[int] = 0,
+        exact_distances: Optional[bool] = True,
+        compact: Optional[bool] = False,
+        deduplicate: Optional[bool] = False,
+        seed: Optional[int] = 10,
+        cache_dir: Optional[str] = None
+) -> "pd.DataFrame":
+    """
+    Returns the RL training set with the given parameters (cf. generate_rl_training_set) from the cache.
+
+    :param size: of the training set
+    :param n_bugs: number of bugs
+    :param sample_size: if 0: half of the specification size, else: sample_size number of specification pairs
+    :param exact_distances: whether the distances are exact (cf. generate_rl_training_set)
+    :param compact: whether the rows only store packed integers (cf. generate_rl_training_set)
+    :param deduplicate: whether redundant specifications are skipped (cf. generate_rl_training_set)
+    :param seed: seed of the generation
+    :param cache_dir: directory of the cache (OPTIONAL, default: cf. default_cache_dir)
+    :return: the training set
+    """
+    from dataset_generators.rl_trainingset_generation import generate_rl_training_set
+
+    params = {
+        "size": size, "n_bugs": n_bugs, "sample_size": sample_size, "exact_distances": exact_distances,
+        "compact": compact, "deduplicate": deduplicate
+    }
+
+    def build(directory: str) -> None:
+        generate_rl_training_set(pickle=False, **params).to_pickle(f"{directory}/{RL_TRAINING_SET_FILE_NAME}")
+
+    directory = get_or_create("rl_training_set", params, seed, build, cache_dir=cache_dir)
+    return _read_rl_training_set(f"{directory}/{RL_TRAINING_SET_FILE_NAME}")
+
+
+@lru_cache(maxsize=4)
+def _read_rl_training_set(path: str) -> "pd.DataFrame":
+    """
+    :param path: path of a cached RL training set
+    :return: the training set (read once per process, i.e. the environments of a worker share it; must not be modified)
+    """
+    import pandas as pd
+
+    return pd.read_pickle(path)
+
+
+def pretraining_dataset(
+        num_bugs: int,
+        multiple_actions: Optional[bool] = False,
+        reduced_modification_percentage: Optional[float] = 0.0,
+        upper_bound_size: Optional[int] = 500000,
+        optimal_labels: Optional[bool] = False,
+        deduplicate: Optional[bool] = False,
+        seed: Optional[int] = 10,
+        cache_dir: Optional[str] = None
+) -> str:
+    """
+    Returns the directory of the pretraining dataset with the given parameters (cf. create_pretraining_dataset) from
+    the cache; the files are read with read_samples / read_sample_types / read_programs(..., directory=...).
+
+    :param num_bugs: Number of Bugs
+    :param multiple_actions: Whether we want to use training samples, where more than one delete action is possible.
+    :param reduced_modification_percentage: Percentage of samples, which are randomly removed from the dataset.
+    :param upper_bound_size: Maximum size of the dataset.
+    :param optimal_labels: Whether the labels follow a shortest path to any consistent program.
+    :param deduplicate: Whether redundant specifications are skipped (cf. create_pretraining_dataset).
+    :param seed: seed of the generation
+    :param cache_dir: directory of the cache (OPTIONAL, default: cf. default_cache_dir)
+    :return: directory of the dataset
+    """
+    from dataset_generators.pretraining_dataset_generation import create_pretraining_dataset
+
+    params = {
+        "num_bugs": num_bugs, "multiple_actions": multiple_actions,
+        "reduced_modification_percentage": reduced_modification_percentage, "upper_bound_size": upper_bound_size,
+        "optimal_labels": optimal_labels, "deduplicate": deduplicate
+    }
+
+    def build(directory: str) -> None:
+        create_pretraining_dataset(directory=directory, **params)
+
+    return get_or_create("pretraining_dataset", params, seed, build, cache_dir=cache_dir)
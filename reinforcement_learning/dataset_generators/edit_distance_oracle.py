@@ -0,0 +1,173 @@
+"""
+Exact minimum-edit-distance oracle for BugBit specifications. For a (flattened) control flow matrix and a set of
+input-output samples, the oracle returns the minimum number of edge toggles (i.e. BugBit actions) to reach any
+program that is consistent with the samples, and the set of actions on a shortest path.
+
+For up to MAX_EXHAUSTIVE_BUGS bugs, the oracle runs a multi-source breadth-first search over the packed program space
+(a hypercube: neighbouring programs differ in one edge), starting from all consistent programs of the
+equivalence-class index. The resulting distance map covers every program and is cached per specification, hence
+all queries for the modifications of a specification are lookups. For more bugs, the distance is found by searching
+the programs within max_distance toggles of the queried program with the simulator (the index is not extended by these
+queries).
+
+Actions are indices into the flattened representation, like the actions of the BugBit environment.
+"""
+
+# standard library imports
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import combinations
+from typing import List, Optional
+
+# 3rd party imports
+import numpy as np
+
+# local imports (i.e. our own code)
+from dataset_generators import bugbit_simulator as simulator, cf_layout
+from dataset_generators.equivalence_index import EquivalenceIndex, MAX_EXHAUSTIVE_BUGS, get_index
+
+# distance of programs that are not within reach (no consistent program exists / beyond max_distance)
+UNREACHABLE: int = 255
+
+
+class EditDistanceOracle:
+
+    def __init__(self, n_bugs: int, cache_size: Optional[int] = 64, max_distance: Optional[int] = 3):
+        """
+        :param n_bugs: number of bugs of the programs
+        :param cache_size: number of distance maps (one per specification) that are kept (OPTIONAL)
+        :param max_distance: search radius for more than MAX_EXHAUSTIVE_BUGS bugs (OPTIONAL)
+        """
+        self.n_bugs: int = n_bugs
+        self.n_flat: int = n_bugs * (n_bugs - 1)
+        self.index: EquivalenceIndex = get_index(n_bugs=n_bugs)
+        self.exhaustive: bool = n_bugs <= MAX_EXHAUSTIVE_BUGS
+        self.cache_size: int = cache_size
+        self.max_distance: int = max_distance
+        self._distance_maps: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._flips: np.ndarray = np.uint64(1) << np.arange(self.n_flat, dtype=np.uint64)
+        # XOR masks of all combinations of `radius` toggles per radius (only needed for the search)
+        self._flip_masks: List[np.ndarray] = [] if self.exhaustive else [
+            np.array(
+                [np.bitwise_or.reduce(self._flips[list(bits)]) for bits in combinations(range(self.n_flat), radius)],
+                dtype=np.uint64
+            )
+            for radius in range(max_distance + 1)
+        ]
+
+    def distance_map(self, ins: np.ndarray, outs: np.ndarray) -> np.ndarray:
+        """
+        Returns the distance of every program to the closest program that is consistent with the samples
+        (multi-source BFS, cached per specification). Only available for up to MAX_EXHAUSTIVE_BUGS bugs.
+
+        :param ins: (m, n) sample inputs
+        :param outs: (m, n) sample outputs
+        :return: (2^k,) uint8 array indexed by packed key (UNREACHABLE if no program is consistent)
+        """
+        if not self.exhaustive:
+            raise ValueError(f"distance maps are only available for up to {MAX_EXHAUSTIVE_BUGS} bugs")
+
+        spec_key = self.index.spec_key(ins, outs)
+        if spec_key in self._distance_maps:
+            self._distance_maps.move_to_end(spec_key)
+            return self._distance_maps[spec_key]
+
+        distances = np.full(shape=(2 ** self.n_flat,), fill_value=UNREACHABLE, dtype=np.uint8)
+        frontier = self.index.consistent_programs(ins, outs).astype(np.int64)
+        distances[frontier] = 0
+        flips = self._flips.astype(np.int64)
+        level = 0
+        while len(frontier):
+            level += 1
+            neighbours = (frontier[:, None] ^ flips).reshape(-1)
+            neighbours = np.unique(neighbours[distances[neighbours] == UNREACHABLE])
+            distances[neighbours] = level
+            frontier = neighbours
+
+        self._distance_maps[spec_key] = distances
+        if len(self._distance_maps) > self.cache_size:
+            self._distance_maps.popitem(last=False)
+        return distances
+
+    def distances(self, flat_cfs: np.ndarray, ins: np.ndarray, outs: np.ndarray) -> np.ndarray:
+        """
+        Returns the minimum number of edge toggles from every program to a program consistent with the samples.
+
+        :param flat_cfs: (P, k) flattened lower-triangular representations
+        :param ins: (m, n) sample inputs
+        :param outs: (m, n) sample outputs
+        :return: (P,) distances (UNREACHABLE if there is no consistent program within reach)
+        """
+        flat_cfs = np.asarray(flat_cfs).reshape(-1, self.n_flat)
+        if self.exhaustive:
+            return self.distance_map(ins, outs)[cf_layout.pack(flat_cfs).astype(np.int64)].astype(np.int64)
+        return np.array([self._search(key, ins, outs) for key in cf_layout.pack(flat_cfs)], dtype=np.int64)
+
+    def distance(self, flat_cf: np.ndarray, ins: np.ndarray, outs: np.ndarray) -> int:
+        """
+        :param flat_cf: (k,) flattened lower-triangular representation
+        :param ins: (m, n) sample inputs
+        :param outs: (m, n) sample outputs
+        :return: minimum number of edge toggles to a consistent program (UNREACHABLE if out of reach)
+        """
+        return int(self.distances(flat_cf, ins, outs)[0])
+
+    def optimal_actions(self, flat_cf: np.ndarray, ins: np.ndarray, outs: np.ndarray) -> np.ndarray:
+        """
+        Returns all actions that reduce the distance to a consistent program by one.
+
+        :param flat_cf: (k,) flattened lower-triangular representation
+        :param ins: (m, n) sample inputs
+        :param outs: (m, n) sample outputs
+        :return: action indices (empty if the program is consistent or out of reach)
+        """
+        flat_cf = np.asarray(flat_cf).reshape(-1)
+        neighbours = np.repeat(flat_cf[None, :], self.n_flat, axis=0)
+        neighbours[np.arange(self.n_flat), np.arange(self.n_flat)] ^= 1
+        distance = self.distance(flat_cf, ins, outs)
+        if distance in (0, UNREACHABLE):
+            return np.zeros(shape=(0,), dtype=np.int64)
+        return np.flatnonzero(self.distances(neighbours, ins, outs) == distance - 1)
+
+    def policy_label(self, flat_cf: np.ndarray, ins: np.ndarray, outs: np.ndarray) -> np.ndarray:
+        """
+        Returns an expert policy vector that distributes the probability mass equally over all optimal actions.
+
+        :param flat_cf: (k,) flattened lower-triangular representation
+        :param ins: (m, n) sample inputs
+        :param outs: (m, n) sample outputs
+        :return: (k,) policy vector (all zeros if there is no optimal action)
+        """
+        label = np.zeros(shape=(self.n_flat,))
+        actions = self.optimal_actions(flat_cf, ins, outs)
+        if len(actions):
+            label[actions] = 1 / len(actions)
+        return label
+
+    def _search(self, key: np.uint64, ins: np.ndarray, outs: np.ndarray) -> int:
+        """
+        Finds the distance of a program by checking all programs within max_distance toggles, closest first.
+
+        :param key: packed program
+        :param ins: (m, n) sample inputs
+        :param outs: (m, n) sample outputs
+        :return: distance (UNREACHABLE if larger than max_distance)
+        """
+        input_codes = simulator.encode_rows(ins)
+        output_codes = simulator.encode_rows(outs)
+        for distance, masks in enumerate(self._flip_masks):
+            candidates = np.bitwise_xor(np.uint64(key), masks)
+            if (simulator.run(candidates, self.n_bugs, input_codes) == output_codes).all(axis=1).any():
+                return distance
+        return UNREACHABLE
+
+
+@lru_cache(maxsize=None)
+def get_oracle(n_bugs: int) -> EditDistanceOracle:
+    """
+    Returns the oracle of the current process for the given number of bugs.
+
+    :param n_bugs: number of bugs
+    :return: oracle
+    """
+    return EditDistanceOracle(n_bugs=n_bugs)
@@ -0,0 +1,285 @@
+"""
+Behavioural equivalence-class index over the BugBit program space. Many flattened control flow matrices compute the
+same function on the 2^n inputs; the index groups programs by their truth table and stores, for every class, the
+truth table, a canonical representative (the smallest packed key) and the class size.
+
+For up to MAX_EXHAUSTIVE_BUGS bugs the whole program space is enumerated, hence the class sizes are exact and
+consistent_programs() returns every program. For more bugs, the index is filled incrementally with randomly sampled
+programs and with every program that is classified. Truth tables are computed with the NumPy simulator
+(cf. bugbit_simulator.py), packed keys follow cf_layout.py (bit i of the key is element i of the flattened
+representation).
+
+Consistency queries ("which classes / programs produce these outputs for these inputs?") are answered with bitsets:
+for every (input, output) pair, the index holds the set of classes mapping the input to the output as a Python int,
+hence a query is the intersection of one bitset per sample.
+"""
+
+# standard library imports
+from functools import lru_cache
+from typing import Dict, Hashable, Optional, Tuple
+
+# 3rd party imports
+import numpy as np
+
+# local imports (i.e. our own code)
+from dataset_generators import bugbit_simulator as simulator, cf_layout
+
+# largest number of bugs for which the whole program space (2^(n * (n - 1)) programs) is enumerated
+MAX_EXHAUSTIVE_BUGS: int = 5
+
+# number of random programs that seed an incrementally built index
+DEFAULT_DISCOVERY_SIZE: int = 1 << 16
+
+# number of redundant specifications in a row after which the generators consider the distinct specifications
+# exhausted and stop de-duplicating
+MAX_REDUNDANT_IN_A_ROW: int = 1000
+
+
+class EquivalenceIndex:
+
+    def __init__(self, n_bugs: int):
+        """
+        Initialises an empty index. Use EquivalenceIndex.build() or get_index() to create a filled index.
+
+        :param n_bugs: number of bugs of the programs
+        """
+        self.n_bugs: int = n_bugs
+        # True if every program of the program space is in the index
+        self.complete: bool = False
+
+        # per class: truth table (output code for every input code), smallest packed key, number of known programs
+        self.truth_tables: np.ndarray = np.zeros(shape=(0, 2 ** n_bugs), dtype=np.uint8 if n_bugs <= 8 else np.uint16)
+        self.canonical: np.ndarray = np.zeros(shape=(0,), dtype=np.uint64)
+        self.sizes: np.ndarray = np.zeros(shape=(0,), dtype=np.int64)
+        self._class_of_table: Dict[bytes, int] = {}
+
+        # known programs (sorted packed keys) and their classes
+        self._keys: np.ndarray = np.zeros(shape=(0,), dtype=np.uint64)
+        self._key_classes: np.ndarray = np.zeros(shape=(0,), dtype=np.int64)
+
+        # lazily built lookup structures (reset whenever programs are added)
+        self._bitsets: Optional[Dict[Tuple[int, int], int]] = None
+        self._members: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @classmethod
+    def build(cls, n_bugs: int, n_programs: Optional[int] = None, seed: Optional[int] = None) -> "EquivalenceIndex":
+        """
+        Builds an index by enumerating the program space (if n_programs is None and n_bugs <= MAX_EXHAUSTIVE_BUGS)
+        or from n_programs uniformly sampled programs.
+
+        :param n_bugs: number of bugs of the programs
+        :param n_programs: number of sampled programs (OPTIONAL, default: enumerate if possible)
+        :param seed: seed of the sampling (OPTIONAL)
+        :return: index
+        """
+        index = cls(n_bugs=n_bugs)
+        n_flat = n_bugs * (n_bugs - 1)
+        if n_programs is None and n_bugs <= MAX_EXHAUSTIVE_BUGS:
+            index.add_programs(np.arange(2 ** n_flat, dtype=np.uint64))
+            index.complete = True
+        else:
+            rng = np.random.default_rng(seed)
+            index.add_programs(cf_layout.pack(rng.integers(0, 2, size=(n_programs or DEFAULT_DISCOVERY_SIZE, n_flat))))
+        return index
+
+    @property
+    def n_classes(self) -> int:
+        return len(self.canonical)
+
+    @property
+    def n_programs(self) -> int:
+        return len(self._keys)
+
+    def _table_bytes(self, tables: np.ndarray) -> np.ndarray:
+        """
+        :param tables: (P, 2^n) truth tables
+        :return: (P,) void view of the rows (hashable and comparable as a whole)
+        """
+        tables = np.ascontiguousarray(tables)
+        return tables.view(np.dtype((np.void, tables.dtype.itemsize * tables.shape[1]))).reshape(-1)
+
+    def add_programs(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Adds programs to the index (programs that are already known are skipped).
+
+        :param keys: (P,) packed programs
+        :return: (P,) class ids of the programs
+        """
+        keys = np.asarray(keys, dtype=np.uint64).reshape(-1)
+        unique_keys = np.unique(keys)
+        new_keys = unique_keys[~self._contains(unique_keys)]
+
+        if len(new_keys):
+            tables = simulator.truth_tables(new_keys, self.n_bugs)
+            distinct, first, inverse = np.unique(self._table_bytes(tables), return_index=True, return_inverse=True)
+
+            # map the distinct truth tables to (possibly new) class ids
+            distinct_classes = np.empty(shape=(len(distinct),), dtype=np.int64)
+            new_tables = []
+            for i, table in enumerate(distinct):
+                table = table.tobytes()
+                if table not in self._class_of_table:
+                    self._class_of_table[table] = self.n_classes + len(new_tables)
+                    new_tables.append(tables[first[i]])
+                distinct_classes[i] = self._class_of_table[table]
+            new_key_classes = distinct_classes[inverse.reshape(-1)]
+
+            if new_tables:
+                self.truth_tables = np.concatenate([self.truth_tables, np.array(new_tables)])
+                self.canonical = np.concatenate([
+                    self.canonical, np.full(shape=(len(new_tables),), fill_value=np.iinfo(np.uint64).max, dtype=np.uint64)
+                ])
+                self.sizes = np.concatenate([self.sizes, np.zeros(shape=(len(new_tables),), dtype=np.int64)])
+            np.minimum.at(self.canonical, new_key_classes, new_keys)
+            self.sizes += np.bincount(new_key_classes, minlength=self.n_classes)
+
+            # merge the new programs into the sorted arrays of known programs
+            all_keys = np.concatenate([self._keys, new_keys])
+            order = np.argsort(all_keys, kind="stable")
+            self._keys = all_keys[order]
+            self._key_classes = np.concatenate([self._key_classes, new_key_classes])[order]
+            self._bitsets = None
+            self._members = None
+
+        return self._key_classes[np.searchsorted(self._keys, keys)]
+
+    def _contains(self, keys: np.ndarray) -> np.ndarray:
+        """
+        :param keys: (P,) packed programs
+        :return: (P,) True for programs that are in the index
+        """
+        if not self.n_programs:
+            return np.zeros(shape=(len(keys),), dtype=bool)
+        positions = np.minimum(np.searchsorted(self._keys, keys), self.n_programs - 1)
+        return self._keys[positions] == keys
+
+    def classify(self, flat_cfs: np.ndarray) -> np.ndarray:
+        """
+        Returns the classes of flattened control flow matrices (unknown programs are added to the index).
+
+        :param flat_cfs: (P, k) or (k,) flattened lower-triangular representations
+        :return: (P,) class ids (or a single id)
+        """
+        flat_cfs = np.asarray(flat_cfs)
+        classes = self.add_programs(cf_layout.pack(flat_cfs.reshape(-1, flat_cfs.shape[-1])))
+        return classes if flat_cfs.ndim > 1 else classes[0]
+
+    def _get_bitsets(self) -> Dict[Tuple[int, int], int]:
+        """
+        Builds (if necessary) and returns the bitsets of classes per (input code, output code).
+
+        :return: dictionary (input code, output code) -> bitset of class ids
+        """
+        if self._bitsets is None:
+            self._bitsets = {}
+            for x in range(2 ** self.n_bugs):
+                column = self.truth_tables[:, x]
+                for y in np.unique(column):
+                    mask = np.packbits(column == y, bitorder="little")
+                    self._bitsets[(x, int(y))] = int.from_bytes(mask.tobytes(), "little")
+        return self._bitsets
+
+    def spec_key(self, ins: np.ndarray, outs: np.ndarray) -> int:
+        """
+        Returns the set of classes consistent with the samples as a bitset. Two specifications with the same key admit
+        exactly the same (known) programs, i.e. they are behaviourally redundant.
+
+        :param ins: (m, n) sample inputs
+        :param outs: (m, n) sample outputs
+        :return: bitset (bit c is set if class c is consistent)
+        """
+        bitsets = self._get_bitsets()
+        key = (1 << self.n_classes) - 1
+        for x, y in zip(simulator.encode_rows(ins).tolist(), simulator.encode_rows(outs).tolist()):
+            key &= bitsets.get((x, y), 0)
+            if not key:
+                break
+        return key
+
+    def redundancy_key(self, ins: np.ndarray, outs: np.ndarray) -> Hashable:
+        """
+        Returns the key the generators de-duplicate specifications by. With a complete index, it is the spec_key, i.e.
+        specifications that admit exactly the same programs share a key. An incomplete index does not know all
+        consistent programs (different specifications may share a spec_key), hence the key is the sorted
+        (input code, output code) pairs, i.e. only identical samples share a key.
+
+        :param ins: (m, n) sample inputs
+        :param outs: (m, n) sample outputs
+        :return: key of the specification
+        """
+        if self.complete:
+            return self.spec_key(ins, outs)
+        return tuple(sorted(zip(simulator.encode_rows(ins).tolist(), simulator.encode_rows(outs).tolist())))
+
+    def consistent_classes(self, ins: np.ndarray, outs: np.ndarray) -> np.ndarray:
+        """
+        Returns the classes that produce the sample outputs for the sample inputs.
+
+        :param ins: (m, n) sample inputs
+        :param outs: (m, n) sample outputs
+        :return: class ids
+        """
+        key = self.spec_key(ins, outs)
+        mask = np.frombuffer(key.to_bytes((self.n_classes + 7) // 8, "little"), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(mask, bitorder="little")[:self.n_classes])
+
+    def members(self, class_id: int) -> np.ndarray:
+        """
+        Returns the (known) programs of a class.
+
+        :param class_id: class id
+        :return: packed keys
+        """
+        if self._members is None:
+            order = np.argsort(self._key_classes, kind="stable")
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(self._key_classes, minlength=self.n_classes))])
+            self._members = (self._keys[order], offsets)
+        keys, offsets = self._members
+        return keys[offsets[class_id]:offsets[class_id + 1]]
+
+    def consistent_programs(self, ins: np.ndarray, outs: np.ndarray) -> np.ndarray:
+        """
+        Returns all (known) programs that produce the sample outputs for the sample inputs.
+
+        :param ins: (m, n) sample inputs
+        :param outs: (m, n) sample outputs
+        :return: packed keys
+        """
+        classes = self.consistent_classes(ins, outs)
+        if not len(classes):
+            return np.zeros(shape=(0,), dtype=np.uint64)
+        return np.concatenate([self.members(c) for c in classes])
+
+    def is_consistent(self, flat_cfs: np.ndarray, ins: np.ndarray, outs: np.ndarray) -> np.ndarray:
+        """
+        Checks whether programs produce the sample outputs for the sample inputs.
+
+        :param flat_cfs: (P, k) flattened lower-triangular representations
+        :param ins: (m, n) sample inputs
+        :param outs: (m, n) sample outputs
+        :return: (P,) boolean array
+        """
+        classes = self.classify(np.asarray(flat_cfs).reshape(-1, self.n_bugs * (self.n_bugs - 1)))
+        tables = self.truth_tables[classes][:, simulator.encode_rows(ins)]
+        return (tables == simulator.encode_rows(outs)).all(axis=1)
+
+
+@lru_cache(maxsize=None)
+def get_index(n_bugs: int) -> EquivalenceIndex:
+    """
+    Returns the index of the current process for the given number of bugs (built on the first call).
+
+    :param n_bugs: number of bugs
+    :return: index
+    """
+    return EquivalenceIndex.build(n_bugs=n_bugs)
+
+
+if __name__ == "__main__":
+    import time
+
+    for num_bugs in range(2, MAX_EXHAUSTIVE_BUGS + 1):
+        start = time.time()
+        idx = EquivalenceIndex.build(n_bugs=num_bugs)
+        print(f"{num_bugs} bugs: {idx.n_programs} programs, {idx.n_classes} classes, "
+              f"largest class {idx.sizes.max()} programs (built in {time.time() - start:.2f}s)")
@@ -3,22 +3,33 @@ This file contains relevant functions to create a dataset for pretraining the Re
 """
 
 # standard library imports
-from typing import Tuple, Optional
-from copy import deepcopy
+from typing import Callable, Tuple, Optional
 import random
 import pickle
-from itertools import chain, combinations
 import warnings
 import os
 
 # 3rd party imports
 import numpy as np
-from tqdm import tqdm
 
 # local imports (i.e. our own code)
-# noinspection PyUnresolvedReferences
 from utilities import utilities
-from dataset_generators.utils import generate_control_flow_matrix_and_specification, cf_to_lower_triangular_flattened
+from dataset_generators import cf_layout, stage_profiler
+from dataset_generators.utils import generate_specification
+from dataset_generators.equivalence_index import MAX_REDUNDANT_IN_A_ROW, get_index
+from dataset_generators.program_generator import next_control_flow, seed_program_generator
+from dataset_generators.stage_profiler import StageProfiler
+from dataset_generators.edit_distance_oracle import UNREACHABLE, get_oracle
+
+
+def _pretraining_training_sets_dir() -> str:
+    """
+    Returns the directory the pretraining training sets are written to / read from.
+
+    :return: path to data/training_sets/pretraining_training_sets
+    """
+    utilities.ensure_paths()
+    return f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/training_sets/pretraining_training_sets"
 
 
 def solver(inputs: np.ndarray, outputs: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
@@ -53,8 +64,11 @@ def solver(inputs: np.ndarray, outputs: np.ndarray = None) -> Tuple[np.ndarray,
 def generate_sample(
         n_bugs: Optional[int] = 5,
         multiple_actions=False,
-        reduced_modification_percentage: float = 0
-) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, list]:
+        reduced_modification_percentage: float = 0,
+        seen_specifications: Optional[set] = None,
+        accept_specification: Optional[Callable[[np.ndarray, np.ndarray], bool]] = None,
+        simulated: Optional[bool] = False
+) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
     """
     Generates training samples for a given number of bugs. All training samples have the same input-output
     pairs but different control flow matrix modifications. It then returns the generated program (target)
@@ -65,49 +79,81 @@ def generate_sample(
     :param multiple_actions: if True, the algorithm can take one of multiple delete actions in a single step.
     :param reduced_modification_percentage: percentage of unused control flow matrix modifications.
     If 0, all possible modifications are returned.
+    :param seen_specifications: keys (cf. EquivalenceIndex.redundancy_key) of the specifications generated so far. If
+    given, None is returned for a specification that is redundant to one of them (OPTIONAL)
+    :param accept_specification: if given, None is returned for programs it rejects; it is called with the full
+    specification (all inputs and their outputs, i.e. the function of the program) before the inputs are subsampled,
+    e.g. to split the functions into train and test (OPTIONAL)
+    :param simulated: if True, the specification is computed with the NumPy simulator instead of the JVM
 
     :return: target program, algorithm steps, input output pairs, control flow matrix modifications
     """
     ins: np.ndarray
     outs: np.ndarray
     prog: np.ndarray
-    ins, outs, prog = generate_control_flow_matrix_and_specification(n_bugs=n_bugs)
+    with stage_profiler.stage("program generation"):
+        prog = next_control_flow(n_bugs=n_bugs)
+    with stage_profiler.stage("spec execution"):
+        ins, outs = generate_specification(prog, n_bugs=n_bugs, simulated=simulated)
+
+    if accept_specification is not None and not accept_specification(ins, outs):
+        return None
 
     # choose subset (half) of all input-output pairs
     choice = random.sample(range(ins.shape[0]), len(ins) // 2)
     ins = ins[choice, :]
     outs = outs[choice, :]
 
-    algorithm_steps: np.ndarray
-    prog, algorithm_steps = solver(inputs=ins, outputs=outs)
+    # skip behaviourally redundant specifications
+    if seen_specifications is not None:
+        with stage_profiler.stage("de-duplication"):
+            key = get_index(n_bugs=n_bugs).redundancy_key(ins, outs)
+        if key in seen_specifications:
+            return None
+        seen_specifications.add(key)
 
-    # detect all partial solutions where at least one 1 has to be added
-    s = list(np.argwhere(prog))
-    powerset = chain.from_iterable(combinations(s, r) for r in range(len(s) + 1))
+    with stage_profiler.stage("neighbourhood expansion"):
+        return _solve_and_modify(ins, outs, multiple_actions, reduced_modification_percentage)
 
-    res = []
 
-    for _, elem in enumerate(powerset):
-        a = np.zeros(shape=np.shape(prog), dtype=np.int64)
-        for _, index in enumerate(elem):
-            a[index[0], index[1]] = 1
-        res.append(a)
+def _solve_and_modify(
+        ins: np.ndarray,
+        outs: np.ndarray,
+        multiple_actions: bool,
+        reduced_modification_percentage: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Solves the sample and generates the control flow matrix modifications (cf. generate_sample).
 
-    # remove as many modifications as specified by the percentage
-    if reduced_modification_percentage > 0:
-        idx_list = random.sample(range(0, len(res)),
-                                 int(len(res) * reduced_modification_percentage)
-                                 )  # remove 95% of samples for each function
-        res_b = [elem for index, elem in enumerate(res) if index not in idx_list]
-        res = res_b
+    :param ins: sample inputs
+    :param outs: sample outputs
+    :param multiple_actions: if True, the algorithm can take one of multiple delete actions in a single step.
+    :param reduced_modification_percentage: percentage of unused control flow matrix modifications.
+    :return: target program, algorithm steps, input output pairs, control flow matrix modifications
+    """
+    algorithm_steps: np.ndarray
+    prog, algorithm_steps = solver(inputs=ins, outputs=outs)
+
+    # detect all partial solutions where at least one 1 has to be added: every subset of the edges of the target
+    # program is a bitmask over the edge list; as many subsets as specified by the percentage are left out by only
+    # sampling the kept bitmasks (without replacement, the powerset is never built)
+    edges = np.argwhere(prog)
+    n_subsets = 2 ** len(edges)
+    n_kept = n_subsets - int(n_subsets * reduced_modification_percentage)
+    masks = np.array(random.sample(range(n_subsets), n_kept), dtype=np.int64)
+    res = subsets_to_matrices(masks, edges=edges, shape=prog.shape)
 
     # create modifications where at least one 1 is added randomly to the respective CF matrix
-    modifications = additive_modifications(np.array(res), prog=prog, multiple_actions=multiple_actions)
+    modifications = additive_modifications(res, prog=prog, multiple_actions=multiple_actions)
     return prog, algorithm_steps, ins, outs, modifications
 
 
 def create_training_samples(n_bugs: int, multiple_actions: Optional[bool] = False,
-                            reduced_modification_percentage: Optional[float] = 0.0):
+                            reduced_modification_percentage: Optional[float] = 0.0,
+                            seen_specifications: Optional[set] = None,
+                            optimal_labels: Optional[bool] = False,
+                            accept_specification: Optional[Callable[[np.ndarray, np.ndarray], bool]] = None,
+                            simulated: Optional[bool] = False):
     """
     Generates training samples for a given number of bugs. All training samples have the same input-output
     pairs but different control flow matrices. For each training sample, it creates a target probability
@@ -118,63 +164,143 @@ def create_training_samples(n_bugs: int, multiple_actions: Optional[bool] = Fals
     :param n_bugs: number of bugs
     :param multiple_actions: if True, the algorithm can take one of multiple delete actions in a single step.
     :param reduced_modification_percentage: percentage of unused control flow matrix modifications.
+    :param seen_specifications: keys of the specifications generated so far; no samples are created for a
+    behaviourally redundant specification (cf. generate_sample)
+    :param optimal_labels: if True, the label distributes the probability mass over all actions on a shortest path to
+    any program consistent with the sample (cf. EditDistanceOracle) instead of following the solver
+    :param accept_specification: no samples are created for specifications it rejects (cf. generate_sample)
+    :param simulated: if True, the specification is computed without the JVM (cf. generate_sample)
     :return: x_samples, y_samples, sample_types, target program
     """
 
-    x_samples = []
-    y_samples = []
-    sample_types = []
-    ts = []
-
     # generate training samples for one input-output pair
-    t, algorithm_steps, ins, outs, modifications = generate_sample(
+    sample = generate_sample(
         n_bugs=n_bugs,
         multiple_actions=multiple_actions,
-        reduced_modification_percentage=reduced_modification_percentage
+        reduced_modification_percentage=reduced_modification_percentage,
+        seen_specifications=seen_specifications,
+        accept_specification=accept_specification,
+        simulated=simulated
     )
+    if sample is None:
+        return build_training_samples(
+            pre=np.zeros(shape=(0, n_bugs, 2 * n_bugs), dtype=np.int64),
+            target=np.zeros(shape=(n_bugs, 2 * n_bugs), dtype=np.int64),
+            algorithm_steps=np.zeros(shape=(0, 2), dtype=np.int64),
+            ins=np.zeros(shape=(2 ** n_bugs // 2, n_bugs), dtype=np.int64),
+            outs=np.zeros(shape=(2 ** n_bugs // 2, n_bugs), dtype=np.int64)
+        )
+    t, algorithm_steps, ins, outs, modifications = sample
+
+    with stage_profiler.stage("label building"):
+        return build_training_samples(
+            pre=modifications,
+            target=t,
+            algorithm_steps=algorithm_steps,
+            ins=ins,
+            outs=outs,
+            optimal_labels=optimal_labels
+        )
 
-    # create label vectors for each training sample
-    for pre in modifications:
-        label = np.zeros(((n_bugs * 2 * n_bugs) // 2 - n_bugs,))
-
-        diff: np.array = t - pre
-
-        # Check
-        if -1 in diff:
-            indices = np.argwhere(diff == -1)
-            # how many Ones could we remove
-            ahead = len(indices)
-            for index in indices:
-                # equally distribute the probability mass over all possible deletions
-                label[get_new_index(n_bugs, index)] = 1 / ahead
-            sample_type = -1
-        elif 1 in diff:
-            indices = np.argwhere(diff == 1)
-            sample_type = 1
-            set_one = False
-            for coord in algorithm_steps:
-                for ind in indices:
-                    if np.array_equal(coord, ind):
-                        # put all weight on next add action of solving algorithm
-                        label[get_new_index(n_bugs, coord)] = 1
-                        set_one = True
-                        break
-                if set_one:
-                    break
-        else:
-            raise AssertionError("Pre Matrix equals target Matrix")
-
-        pre1 = cf_to_lower_triangular_flattened(cf_matrix=pre)
-
-        ins1 = np.array(ins).flatten()
-        outs1 = np.array(outs).flatten()
-        x1 = np.concatenate((pre1, ins1, outs1))
-        label = label.flatten()
-        x_samples.append(x1)
-        y_samples.append(label)
-        sample_types.append(sample_type)
-        ts.append(t)
-    return x_samples, y_samples, sample_types, ts
+
+def build_training_samples(
+        pre: np.ndarray,
+        target: np.ndarray,
+        algorithm_steps: np.ndarray,
+        ins: np.ndarray,
+        outs: np.ndarray,
+        optimal_labels: Optional[bool] = False
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Builds the training samples and label vectors of all (modified) control flow matrices of one specification at
+    once. If the matrix has edges the target does not have, the probability mass is distributed equally over all
+    deletions (sample type -1); otherwise, all weight is put on the first step of the solving algorithm that is
+    missing (sample type 1).
+
+    :param pre: (K, n, 2n) modified control flow matrices
+    :param target: (n, 2n) target control flow matrix found by the solver
+    :param algorithm_steps: (S, 2) coordinates of the edges in the order the solver adds them
+    :param ins: (m, n) sample inputs
+    :param outs: (m, n) sample outputs
+    :param optimal_labels: if True, the label distributes the probability mass over all actions on a shortest path
+    to any program consistent with the sample (cf. EditDistanceOracle); matrices that already fulfil the sample are
+    dropped
+    :return: x_samples (K', k + 2 * m * n), y_samples (K', k), sample_types (K',), target programs (K', n, 2n)
+    """
+    n_bugs = target.shape[0]
+    pre_flat = cf_layout.to_flat(np.asarray(pre, dtype=np.int64).reshape(-1, n_bugs, 2 * n_bugs))
+    diff = cf_layout.to_flat(target)[None, :] - pre_flat
+
+    to_delete = diff == -1
+    to_add = diff == 1
+    has_deletion = to_delete.any(axis=1)
+    if not (has_deletion | to_add.any(axis=1)).all():
+        raise AssertionError("Pre Matrix equals target Matrix")
+    sample_types = np.where(has_deletion, -1, 1)
+
+    if optimal_labels:
+        y_samples = optimal_policy_labels(pre_flat, ins=ins, outs=outs)
+        # programs that already fulfil the sample do not need an action
+        keep = y_samples.any(axis=1)
+        pre_flat, y_samples, sample_types = pre_flat[keep], y_samples[keep], sample_types[keep]
+    else:
+        # equally distribute the probability mass over all possible deletions
+        y_samples = np.zeros(shape=pre_flat.shape)
+        y_samples[has_deletion] = to_delete[has_deletion] / to_delete[has_deletion].sum(axis=1, keepdims=True)
+
+        # put all weight on the next add action of the solving algorithm
+        if len(algorithm_steps):
+            step_indices = cf_layout.flat_index(algorithm_steps[:, 0], algorithm_steps[:, 1])
+            missing_steps = to_add[:, step_indices] & ~has_deletion[:, None]
+            rows = np.flatnonzero(missing_steps.any(axis=1))
+            y_samples[rows, step_indices[missing_steps[rows].argmax(axis=1)]] = 1
+
+    # samples: flattened control flow matrix, inputs and outputs
+    n_flat = pre_flat.shape[1]
+    x_samples = np.empty(shape=(len(pre_flat), n_flat + ins.size + outs.size), dtype=np.int64)
+    x_samples[:, :n_flat] = pre_flat
+    x_samples[:, n_flat:n_flat + ins.size] = np.asarray(ins).reshape(-1)
+    x_samples[:, n_flat + ins.size:] = np.asarray(outs).reshape(-1)
+
+    targets = np.broadcast_to(target, (len(pre_flat), *target.shape))
+    return x_samples, y_samples, sample_types, targets
+
+
+def optimal_policy_labels(flat_cfs: np.ndarray, ins: np.ndarray, outs: np.ndarray) -> np.ndarray:
+    """
+    Returns the expert policy vectors of EditDistanceOracle.policy_label for a batch of programs; the distances of all
+    programs and of all their neighbours are looked up at once.
+
+    :param flat_cfs: (K, k) flattened control flow matrices
+    :param ins: (m, n) sample inputs
+    :param outs: (m, n) sample outputs
+    :return: (K, k) policy vectors (all zeros if there is no optimal action)
+    """
+    n_programs, n_flat = flat_cfs.shape
+    oracle = get_oracle(n_bugs=ins.shape[1])
+    distances = oracle.distances(flat_cfs, ins=ins, outs=outs)
+    neighbours = flat_cfs[:, None, :] ^ np.eye(n_flat, dtype=flat_cfs.dtype)[None, :, :]
+    neighbour_distances = oracle.distances(neighbours.reshape(-1, n_flat), ins=ins, outs=outs)
+
+    optimal = neighbour_distances.reshape(n_programs, n_flat) == distances[:, None] - 1
+    optimal &= ((distances != 0) & (distances != UNREACHABLE))[:, None]
+    n_optimal = optimal.sum(axis=1, keepdims=True)
+    return np.divide(optimal, n_optimal, out=np.zeros(shape=optimal.shape), where=n_optimal > 0)
+
+
+def subsets_to_matrices(masks: np.ndarray, edges: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Converts subsets of edges, given as bitmasks over the edge list, to control flow matrices.
+
+    :param masks: (K,) bitmasks (bit e is set if edges[e] is in the subset)
+    :param edges: (E, 2) coordinates of the edges
+    :param shape: shape of the control flow matrices
+    :return: (K, *shape) int64 control flow matrices
+    """
+    res = np.zeros(shape=(len(masks), *shape), dtype=np.int64)
+    bits = (masks[:, None] >> np.arange(len(edges), dtype=np.int64)) & 1
+    res[:, edges[:, 0], edges[:, 1]] = bits
+    return res
 
 
 def additive_modifications(
@@ -182,17 +308,17 @@ def additive_modifications(
         n_modifications: Optional[int] = 1,
         multiple_actions: Optional[bool] = False,
         prog=None
-) -> list:
+) -> np.ndarray:
     """
     Returns additive modifications of the history created by the solving algorithm
 
     :param prog: The target CF matrix found by the algorithm
-    :param history: in-template history
+    :param history: (K, n, 2n) in-template history
     :param n_modifications: how many modifications to produce for each history element
     :param multiple_actions: whether we want to produce training samples, where more than one action is needed to
     get back on template or not
-    :return: array of arrays of original history elements and their additive modifications. The originals
-    are the 0th elements in each array
+    :return: (M, n, 2n) original history elements, each followed by its additive modifications (elements that equal
+    the target CF matrix are left out)
     """
 
     warnings.warn(
@@ -201,26 +327,26 @@ def additive_modifications(
         category=FutureWarning,
         stacklevel=1)
 
-    res: list = []
-
-    possible_coordinate_mappings = get_valid_coordinates(n_bugs=len(history[0]))
-
-    for _, hist_elem in enumerate(history):
-        if not np.array_equal(prog, hist_elem):
-            res.append(hist_elem)
-        for n in range(n_modifications):
-            tmp = deepcopy(hist_elem)
-            z = 1
-            if multiple_actions:
-                # Flip up to 3 bits in the CF matrix depending on the given probabilities
-                z = np.random.choice([1, 2, 3], 1, p=[0.5, 0.3, 0.2])[0]
-            for _ in range(z):
-                idx = np.random.choice(len(possible_coordinate_mappings))
-                tmp[possible_coordinate_mappings[idx]] = 1
-            if not np.array_equal(prog, tmp):
-                res.append(tmp)
+    history = np.asarray(history)
+    n_bugs = history.shape[1]
+    flat_history = cf_layout.to_flat(history)
+    n_history, n_flat = flat_history.shape
 
-    return res
+    # Flip up to 3 bits in the CF matrix depending on the given probabilities (random bit masks over the flattened
+    # representation; an entry may be drawn more than once)
+    n_flips = np.ones(shape=(n_history, n_modifications), dtype=np.int64)
+    if multiple_actions:
+        n_flips = np.random.choice([1, 2, 3], size=(n_history, n_modifications), p=[0.5, 0.3, 0.2])
+    flips = np.random.randint(0, n_flat, size=(n_history, n_modifications, 3))
+    drawn = np.arange(3) < n_flips[..., None]
+    masks = np.zeros(shape=(n_history, n_modifications, n_flat), dtype=bool)
+    h, m, _ = np.nonzero(drawn)
+    masks[h, m, flips[drawn]] = True
+
+    # originals followed by their modifications
+    res = np.concatenate([flat_history[:, None, :], flat_history[:, None, :] | masks], axis=1).reshape(-1, n_flat)
+    res = res[(res != cf_layout.to_flat(np.asarray(prog))).any(axis=1)]
+    return cf_layout.to_matrix(res, n_bugs=n_bugs)
 
 
 def get_new_index(n_bugs: int, coordinate: Tuple[int, int]) -> int:
@@ -233,11 +359,7 @@ def get_new_index(n_bugs: int, coordinate: Tuple[int, int]) -> int:
     :return: int: Element index if relevant CF matrix entries are sorted line by line
     """
 
-    c_normal = coordinate[0] * 2 * n_bugs + coordinate[1]
-    new_index = c_normal
-    for i in range(coordinate[0]):
-        new_index = new_index - (2 * n_bugs - 2 * i)
-    return new_index
+    return int(cf_layout.flat_index(coordinate[0], coordinate[1]))
 
 
 def get_valid_coordinates(n_bugs: int) -> dict:
@@ -250,13 +372,8 @@ def get_valid_coordinates(n_bugs: int) -> dict:
     """
 
     # a dict containing sorted relevant CF coordinates
-    transformations = dict()
-    for i in range(n_bugs):
-        for j in range(2 * n_bugs):
-            if j >= 2 * i:
-                continue
-            transformations[get_new_index(n_bugs, (i, j))] = (i, j)
-    return transformations
+    rows, cols = cf_layout.flat_coordinates(n_bugs)
+    return dict(enumerate(zip(rows.tolist(), cols.tolist())))
 
 
 def write_samples_to_file(
@@ -266,7 +383,8 @@ def write_samples_to_file(
         sample_types: np.ndarray,
         programs: np.ndarray,
         multiple_actions: Optional[bool] = False,
-        verbose: Optional[bool] = False
+        verbose: Optional[bool] = False,
+        directory: Optional[str] = None
 ):
     """
     Writes samples to file. The samples are written to a file in the following format:
@@ -278,9 +396,10 @@ def write_samples_to_file(
     :param programs: Programs
     :param multiple_actions: Whether we want to produce training samples, where more than one delete action is possible
     :param verbose: Whether we want to print the progress of the writing process
+    :param directory: directory the files are written to (OPTIONAL, default: cf. _pretraining_training_sets_dir)
     :return: None
     """
-    file_path = f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/training_sets/pretraining_training_sets"
+    file_path = directory or _pretraining_training_sets_dir()
     x_file_name = f"{file_path}/X_TrainingSet{num_bugs}{('multiple_actions' if multiple_actions else '')}.pkl"
     y_file_name = f"{file_path}/Y_TrainingSet{num_bugs}{('multiple_actions' if multiple_actions else '')}.pkl"
     type_file_name = f"{file_path}/SampleTypes{num_bugs}{('multiple_actions' if multiple_actions else '')}.pkl"
@@ -308,7 +427,8 @@ def write_samples_to_file(
 def read_samples(
         num_bugs: int,
         multiple_actions: Optional[bool] = False,
-        verbose: Optional[bool] = False
+        verbose: Optional[bool] = False,
+        directory: Optional[str] = None
 ):
     """
     Reads x,y samples from file. The samples are read from a file in the following format:
@@ -316,10 +436,11 @@ def read_samples(
     :param num_bugs: Number of Bugs
     :param multiple_actions: Whether we want to use training samples, where more than one delete action is possible
     :param verbose: Whether we want to print the progress of the reading process
+    :param directory: directory the files are read from (OPTIONAL, default: cf. _pretraining_training_sets_dir)
     :return: None
     """
 
-    file_path = f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/training_sets/pretraining_training_sets"
+    file_path = directory or _pretraining_training_sets_dir()
     x_file_name = f"{file_path}/X_TrainingSet{num_bugs}{('multiple_actions' if multiple_actions else '')}.pkl"
     y_file_name = f"{file_path}/Y_TrainingSet{num_bugs}{('multiple_actions' if multiple_actions else '')}.pkl"
 
@@ -337,7 +458,8 @@ def read_samples(
 def read_sample_types(
         num_bugs: int,
         multiple_actions: Optional[bool] = False,
-        verbose: Optional[bool] = False
+        verbose: Optional[bool] = False,
+        directory: Optional[str] = None
 ):
     """
     Reads the sample types from the given file. A sample type can be either -1 or 1. -1 means that this sample is
@@ -347,10 +469,11 @@ def read_sample_types(
     :param num_bugs: Number of Bugs
     :param multiple_actions: Whether we want to use training samples, where more than one delete action is possible.
     :param verbose: Whether we want to print the progress of the reading process
+    :param directory: directory the files are read from (OPTIONAL, default: cf. _pretraining_training_sets_dir)
     :return: Sample Types
     """
 
-    file_path = f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/training_sets/pretraining_training_sets"
+    file_path = directory or _pretraining_training_sets_dir()
     type_file_name = f"{file_path}/SampleTypes{num_bugs}{('multiple_actions' if multiple_actions else '')}.pkl"
 
     with open(type_file_name, "rb") as f:
@@ -370,7 +493,8 @@ def read_sample_types(
 def read_programs(
         num_bugs: int,
         multiple_actions: Optional[bool] = False,
-        verbose: Optional[bool] = False
+        verbose: Optional[bool] = False,
+        directory: Optional[str] = None
 ):
     """
     Reads the programs from the given file. A Program is the target matrix for the corresponding input output pairs
@@ -379,9 +503,10 @@ def read_programs(
     :param num_bugs: Number of Bugs
     :param multiple_actions: Whether we want to use training samples, where more than one delete action is possible.
     :param verbose: Whether we want to print the progress of the reading process
+    :param directory: directory the files are read from (OPTIONAL, default: cf. _pretraining_training_sets_dir)
     :return: Programs
     """
-    file_path = f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/training_sets/pretraining_training_sets"
+    file_path = directory or _pretraining_training_sets_dir()
     type_file_name = f"{file_path}/Programs{num_bugs}{('multiple_actions' if multiple_actions else '')}.pkl"
 
     with open(type_file_name, "rb") as f:
@@ -398,7 +523,11 @@ def create_pretraining_dataset(
         multiple_actions: Optional[bool] = False,
         reduced_modification_percentage: Optional[float] = 0.0,
         upper_bound_size: Optional[int] = 500000,
-        verbose: Optional[bool] = False
+        verbose: Optional[bool] = False,
+        optimal_labels: Optional[bool] = False,
+        profiler: Optional[StageProfiler] = None,
+        directory: Optional[str] = None,
+        deduplicate: Optional[bool] = False
 ):
     """
     Creates a full pretraining dataset for pretraining the Reinforcement Learning Agent.
@@ -411,37 +540,73 @@ def create_pretraining_dataset(
     value is high, this increases the number of different input-output pairs in the dataset.
     :param upper_bound_size: Maximum size of the dataset.
     :param verbose: Whether we want to print the progress of the creation process.
+    :param optimal_labels: Whether the labels follow a shortest path to any consistent program (cf.
+    EditDistanceOracle) instead of the solver.
+    :param profiler: if given, the stages of the generation are profiled and the report is written to data/profiles
+    (cf. stage_profiler.py)
+    :param directory: directory the dataset is written to (OPTIONAL, default: cf. write_samples_to_file)
+    :param deduplicate: if True, redundant specifications are skipped (cf. EquivalenceIndex.redundancy_key) until
+    MAX_REDUNDANT_IN_A_ROW redundant specifications in a row show that the distinct ones are exhausted
     :return: None
     """
+    if profiler is not None:
+        with profiler.activate():
+            create_pretraining_dataset(
+                num_bugs=num_bugs, multiple_actions=multiple_actions,
+                reduced_modification_percentage=reduced_modification_percentage, upper_bound_size=upper_bound_size,
+                verbose=verbose, optimal_labels=optimal_labels, directory=directory, deduplicate=deduplicate
+            )
+        profiler.write(name=f"pretraining_dataset_{num_bugs}")
+        return
+
+    from tqdm import tqdm
 
     x_samples = []
     y_samples = []
     sample_types = []
     programs = []
+    n_samples = 0
+    # redundant specifications are skipped (cf. EquivalenceIndex.redundancy_key)
+    seen_specifications = set() if deduplicate else None
+    n_distinct = 0
+    redundant_in_a_row = 0
     for i in tqdm(range(200000)):
         x_sample, y_sample, sample_type, t = create_training_samples(
             n_bugs=num_bugs,
             multiple_actions=multiple_actions,
-            reduced_modification_percentage=reduced_modification_percentage
+            reduced_modification_percentage=reduced_modification_percentage,
+            seen_specifications=seen_specifications,
+            optimal_labels=optimal_labels
         )
 
-        x_samples += x_sample
-        y_samples += y_sample
-        sample_types += sample_type
-        programs += t
+        x_samples.append(x_sample)
+        y_samples.append(y_sample)
+        sample_types.append(sample_type)
+        programs.append(t)
+        n_samples += len(x_sample)
 
-        if len(x_samples) > upper_bound_size:
+        if seen_specifications is not None:
+            redundant_in_a_row = redundant_in_a_row + 1 if len(seen_specifications) == n_distinct else 0
+            n_distinct = len(seen_specifications)
+            if redundant_in_a_row >= MAX_REDUNDANT_IN_A_ROW:
+                print(f"Distinct specifications exhausted after {n_distinct}, de-duplication stopped")
+                seen_specifications = None
+
+        if n_samples > upper_bound_size:
             print("Specifications tried: ", i)
-            print("Samples: ", len(x_samples))
+            print("Samples: ", n_samples)
             break
 
-    x_samples = np.array(x_samples, dtype=float)
-    y_samples = np.array(y_samples, dtype=float)
+    x_samples = np.concatenate(x_samples).astype(float)
+    y_samples = np.concatenate(y_samples).astype(float)
+    sample_types = np.concatenate(sample_types)
+    programs = np.concatenate(programs)
 
     print("Complete Size in Bytes: ", x_samples.size * x_samples.itemsize)
 
     # we don't want duplicates in our training set
-    x_samples, lbl_indices = np.unique(x_samples, return_index=True, axis=0)
+    with stage_profiler.stage("de-duplication"):
+        x_samples, lbl_indices = np.unique(x_samples, return_index=True, axis=0)
     y_samples = np.take(y_samples, lbl_indices, axis=0)
     sample_types = np.take(sample_types, lbl_indices, axis=0)
     all_programs = np.take(programs, lbl_indices, axis=0)
@@ -450,21 +615,26 @@ def create_pretraining_dataset(
     # how many functions do we have?
     number_of_functions = np.unique(x_samples[:, num_bugs * (num_bugs - 1):], return_index=False, axis=0)
     print("Number of Functions: ", len(number_of_functions))
+    if deduplicate:
+        print("Distinct specifications: ", n_distinct)
 
     # write Training set into files
-    write_samples_to_file(
-        num_bugs=num_bugs,
-        x_samples=x_samples,
-        y_samples=y_samples,
-        sample_types=sample_types,
-        programs=all_programs,
-        multiple_actions=multiple_actions,
-        verbose=verbose
-    )
+    with stage_profiler.stage("serialization"):
+        write_samples_to_file(
+            num_bugs=num_bugs,
+            x_samples=x_samples,
+            y_samples=y_samples,
+            sample_types=sample_types,
+            programs=all_programs,
+            multiple_actions=multiple_actions,
+            verbose=verbose,
+            directory=directory
+        )
 
 
 if __name__ == "__main__":
     random.seed(10)
+    seed_program_generator(10)
     create_pretraining_dataset(
         num_bugs=3,
         multiple_actions=True,
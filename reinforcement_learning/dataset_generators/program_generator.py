@@ -0,0 +1,227 @@
+"""
+Vectorised random program generator. generate_control_flow_batch draws M control flow matrices at once with the same
+distribution as utils.generate_control_flow_sequentially: the work lists of all programs are simulated in lockstep
+(one circular buffer per program), and every step draws the two control pin targets of the current bug of all
+programs with one call of a seeded np.random.Generator.
+
+check_distribution() compares the empirical distribution of generated programs with the exact distribution of
+generate_control_flow_sequentially (obtained by enumerating all of its random choices) with a chi-square test. Run this
+module (python -m dataset_generators.program_generator from the reinforcement_learning directory) to execute the check.
+"""
+
+# standard library imports
+import math
+from collections import defaultdict
+from typing import Dict, Iterator, Optional, Tuple
+
+# 3rd party imports
+import numpy as np
+
+# local imports (i.e. our own code)
+from dataset_generators import cf_layout
+
+# generator and buffered programs used by next_control_flow() (cf. seed_program_generator())
+_rng: np.random.Generator = np.random.default_rng()
+_buffers: Dict[int, Iterator[np.ndarray]] = {}
+
+BUFFER_SIZE: int = 1024
+
+
+def generate_control_flow_batch(
+        n_bugs: int,
+        size: int,
+        num_edges: Optional[int] = None,
+        rng: Optional[np.random.Generator] = None
+) -> np.ndarray:
+    """
+    Generates size control flow matrices for turing tumble / BugBit (same distribution as
+    utils.generate_control_flow_sequentially).
+
+    :param n_bugs: number of bugs used
+    :param size: number of control flow matrices
+    :param num_edges: number of edges to be used (OPTIONAL, default: 2 * (n_bugs - 1))
+    :param rng: random generator (OPTIONAL)
+    :return: (size, n_bugs, 2 * n_bugs) uint8 array of control flow matrices
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    num_edges = 2 * (n_bugs - 1) if not num_edges else num_edges
+
+    programs = np.arange(size)
+    cf = np.zeros(shape=(size, n_bugs, 2 * n_bugs), dtype=np.uint8)
+    edges_left = np.full(shape=(size,), fill_value=num_edges, dtype=np.int64)
+
+    # work list of connected bugs per program: circular buffer (bugs are distinct, hence n_bugs slots suffice)
+    queue = np.zeros(shape=(size, n_bugs), dtype=np.int64)
+    in_queue = np.zeros(shape=(size, n_bugs), dtype=bool)
+    head = np.zeros(shape=(size,), dtype=np.int64)
+    length = np.ones(shape=(size,), dtype=np.int64)
+    in_queue[:, 0] = True
+
+    def push(mask: np.ndarray, bugs: np.ndarray) -> None:
+        mask = mask & ~in_queue[programs, np.where(mask, bugs, 0)]
+        rows = programs[mask]
+        queue[rows, (head[rows] + length[rows]) % n_bugs] = bugs[mask]
+        in_queue[rows, bugs[mask]] = True
+        length[rows] += 1
+
+    while True:
+        active = (length > 0) & (edges_left != 0)
+        if not active.any():
+            break
+        current = queue[programs, head]
+
+        # options are the bugs current + 1, ..., n_bugs - 1 and the sink (last option), drawn with replacement
+        n_options = n_bugs - current
+        choices = (rng.random(size=(2, size)) * n_options).astype(np.int64)
+        targets = current + 1 + choices
+        to_sink = choices == n_options - 1
+
+        set_a = active & ~to_sink[0]
+        cf[programs[set_a], targets[0][set_a], 2 * current[set_a]] = 1
+        edges_left -= set_a
+        push(set_a, targets[0])
+
+        set_b = active & ~to_sink[1] & (edges_left != 0)
+        cf[programs[set_b], targets[1][set_b], 2 * current[set_b] + 1] = 1
+        edges_left -= set_b
+        push(set_b, targets[1])
+
+        # remove the current bug from the work list
+        in_queue[programs[active], current[active]] = False
+        head[active] = (head[active] + 1) % n_bugs
+        length[active] -= 1
+
+    return cf
+
+
+def seed_program_generator(seed: Optional[int] = None) -> None:
+    """
+    Seeds the generator used by next_control_flow() and discards the buffered programs.
+
+    :param seed: seed
+    :return: None
+    """
+    global _rng
+    _rng = np.random.default_rng(seed)
+    _buffers.clear()
+
+
+def next_control_flow(n_bugs: int) -> np.ndarray:
+    """
+    Returns the next control flow matrix of the process-wide program stream (generated in batches of BUFFER_SIZE).
+
+    :param n_bugs: number of bugs
+    :return: (n_bugs, 2 * n_bugs) int64 control flow matrix
+    """
+    def stream() -> Iterator[np.ndarray]:
+        while True:
+            yield from generate_control_flow_batch(n_bugs=n_bugs, size=BUFFER_SIZE, rng=_rng).astype(np.int64)
+
+    if n_bugs not in _buffers:
+        _buffers[n_bugs] = stream()
+    return next(_buffers[n_bugs])
+
+
+def exact_distribution(n_bugs: int, num_edges: Optional[int] = None) -> Dict[int, float]:
+    """
+    Returns the exact distribution of utils.generate_control_flow_sequentially by enumerating all of its random
+    choices (states with the same work list, edge budget and matrix are merged).
+
+    :param n_bugs: number of bugs
+    :param num_edges: number of edges (OPTIONAL)
+    :return: dictionary packed key -> probability
+    """
+    num_edges = 2 * (n_bugs - 1) if not num_edges else num_edges
+    sink = -1
+
+    def bit(target: int, column: int) -> int:
+        return 1 << (target * (target - 1) + column)
+
+    distribution: Dict[int, float] = defaultdict(float)
+    states: Dict[Tuple[Tuple[int, ...], int, int], float] = {((0,), num_edges, 0): 1.0}
+    while states:
+        following: Dict[Tuple[Tuple[int, ...], int, int], float] = defaultdict(float)
+        for (queue, edges_left, key), probability in states.items():
+            if not queue or edges_left == 0:
+                distribution[key] += probability
+                continue
+            current = queue[0]
+            options = list(range(current + 1, n_bugs)) + [sink]
+            p = probability / len(options) ** 2
+            for choice_a in options:
+                for choice_b in options:
+                    new_queue, new_edges, new_key = list(queue), edges_left, key
+                    if choice_a != sink:
+                        new_key |= bit(choice_a, 2 * current)
+                        new_edges -= 1
+                        if choice_a not in new_queue:
+                            new_queue.append(choice_a)
+                    if choice_b != sink and new_edges != 0:
+                        new_key |= bit(choice_b, 2 * current + 1)
+                        new_edges -= 1
+                        if choice_b not in new_queue:
+                            new_queue.append(choice_b)
+                    new_queue.remove(current)
+                    following[(tuple(new_queue), new_edges, new_key)] += p
+        states = following
+    return dict(distribution)
+
+
+def chi_square_test(observed: np.ndarray, expected: np.ndarray) -> Tuple[float, int, float]:
+    """
+    Pearson's chi-square goodness-of-fit test. Categories with an expected count below 5 are pooled. The p-value uses
+    the Wilson-Hilferty approximation of the chi-square distribution.
+
+    :param observed: observed counts per category
+    :param expected: expected counts per category
+    :return: statistic, degrees of freedom, p-value
+    """
+    small = expected < 5
+    observed = np.append(observed[~small], observed[small].sum())
+    expected = np.append(expected[~small], expected[small].sum())
+    if expected[-1] == 0:
+        observed, expected = observed[:-1], expected[:-1]
+
+    statistic = float(((observed - expected) ** 2 / expected).sum())
+    dof = len(expected) - 1
+    z = ((statistic / dof) ** (1 / 3) - (1 - 2 / (9 * dof))) / math.sqrt(2 / (9 * dof))
+    return statistic, dof, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def check_distribution(
+        n_bugs: int,
+        n_samples: int = 200000,
+        seed: Optional[int] = 0,
+        significance_level: float = 0.001
+) -> float:
+    """
+    Tests whether generate_control_flow_batch follows the exact distribution of generate_control_flow_sequentially.
+
+    :param n_bugs: number of bugs
+    :param n_samples: number of generated programs
+    :param seed: seed of the generator
+    :param significance_level: the check fails if the p-value is below the significance level
+    :return: p-value of the chi-square test
+    """
+    distribution = exact_distribution(n_bugs=n_bugs)
+    keys = np.array(sorted(distribution.keys()), dtype=np.uint64)
+    probabilities = np.array([distribution[key] for key in sorted(distribution.keys())])
+
+    generated = cf_layout.pack_matrices(generate_control_flow_batch(n_bugs, n_samples, rng=np.random.default_rng(seed)))
+    unique, counts = np.unique(generated, return_counts=True)
+    if not np.isin(unique, keys).all():
+        raise AssertionError("generate_control_flow_batch generated a program that the sequential generator cannot")
+
+    observed = np.zeros(shape=(len(keys),))
+    observed[np.searchsorted(keys, unique)] = counts
+    statistic, dof, p_value = chi_square_test(observed, probabilities * n_samples)
+    print(f"{n_bugs} bugs: {len(keys)} programs, chi2 = {statistic:.1f} (dof {dof}), p = {p_value:.3f}")
+    if p_value < significance_level:
+        raise AssertionError(f"the generated programs do not follow the distribution of the sequential generator "
+                             f"(p = {p_value:.2e})")
+    return p_value
+
+
+if __name__ == "__main__":
+    for num_bugs in (2, 3, 4, 5):
+        check_distribution(n_bugs=num_bugs, n_samples=1000000)
@@ -2,29 +2,47 @@
 This file is used to generate the training set / training samples for RL
 """
 
+# standard library imports
 import os
-from typing import Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 import random
 import time
 from copy import deepcopy
 
 # 3rd party imports
-import pandas as pd
 import numpy as np
 
 # local imports (i.e. our own code)
-# noinspection PyUnresolvedReferences
 from utilities import utilities
-from dataset_generators.utils import generate_control_flow_matrix_and_specification, get_outputs, \
-    cf_to_lower_triangular_flattened, flattened_repr_to_control_flow_matrix
+from dataset_generators import bugbit_simulator as simulator, cf_layout, stage_profiler
+from dataset_generators.utils import generate_specification, cf_to_lower_triangular_flattened
+from dataset_generators.equivalence_index import MAX_REDUNDANT_IN_A_ROW, get_index
+from dataset_generators.program_generator import next_control_flow, seed_program_generator
+from dataset_generators.stage_profiler import StageProfiler
+from dataset_generators.edit_distance_oracle import UNREACHABLE, get_oracle
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# columns of the training sets
+COLUMNS = ["distance", "input_samples", "output_samples", "modified_control_flow_matrix"]
+COMPACT_COLUMNS = ["distance", "program", "sample_mask", "modified_program"]
+
+# the sample mask of a compact training set has a bit per input code (2^n_bugs)
+MAX_COMPACT_BUGS: int = 6
 
 
 def generate_rl_training_set(
         size: Optional[int] = 100,
         n_bugs: Optional[int] = 5,
         sample_size: Optional[int] = 0,
-        pickle: Optional[bool] = True
-) -> pd.DataFrame:
+        pickle: Optional[bool] = True,
+        exact_distances: Optional[bool] = True,
+        compact: Optional[bool] = False,
+        profiler: Optional[StageProfiler] = None,
+        deduplicate: Optional[bool] = False
+) -> "pd.DataFrame":
     """
     Generates a training set for the RL algorithm
 
@@ -32,24 +50,50 @@ def generate_rl_training_set(
     :param size: of the training set
     :param n_bugs: number of bugs to be used
     :param sample_size: if 0: half of the specification size, else: sample_size number of specification pairs
-    :return: pd.DataFrame(columns=["distance","input_samples", "output_samples", "modified_control_flow_matrix"])
+    :param exact_distances: if True, the distance of a modification is the minimum number of toggles to any program
+    consistent with the sample (cf. EditDistanceOracle), else the number of toggles from the original program
+    :param compact: if True, every row only stores packed integers: the original program, the bitmask of the sampled
+    input codes and the modified program (cf. COMPACT_COLUMNS); BugBit rebuilds the samples on reset
+    :param profiler: if given, the stages of the generation are profiled and the report is written to data/profiles
+    (cf. stage_profiler.py)
+    :param deduplicate: if True, redundant specifications are skipped (cf. EquivalenceIndex.redundancy_key) until
+    MAX_REDUNDANT_IN_A_ROW redundant specifications in a row show that the distinct ones are exhausted
+    :return: pd.DataFrame(columns=["distance","input_samples", "output_samples", "modified_control_flow_matrix"]) or
+    pd.DataFrame(columns=COMPACT_COLUMNS) if compact
     """
-    training_set = pd.DataFrame(
-        columns=[
-            "distance",
-            "input_samples",
-            "output_samples",
-            "modified_control_flow_matrix"
-        ]
-    )
+    import pandas as pd
+
+    if profiler is not None:
+        with profiler.activate():
+            training_set = generate_rl_training_set(
+                size=size, n_bugs=n_bugs, sample_size=sample_size, pickle=pickle, exact_distances=exact_distances,
+                compact=compact, deduplicate=deduplicate
+            )
+        profiler.write(name=f"rl_training_set_{size}_{n_bugs}")
+        return training_set
+
+    if compact and n_bugs > MAX_COMPACT_BUGS:
+        raise ValueError(f"compact training sets support up to {MAX_COMPACT_BUGS} bugs (64-bit sample masks)")
+
+    rows = {column: [] for column in (COMPACT_COLUMNS if compact else COLUMNS)}
+    n_rows = 0
+
+    # behaviourally equivalent programs and redundant specifications are detected with the equivalence-class index
+    equivalence_index = get_index(n_bugs=n_bugs)
+    oracle = get_oracle(n_bugs=n_bugs)
+    seen_specifications = set()
+    redundant_in_a_row = 0
 
     # time the training set generation and print the runtime
     start = time.time()
 
     # while the training set is not full
-    while len(training_set) < size:
+    while n_rows < size:
         # generate a random program and the full specification
-        ins, outs, prog = generate_control_flow_matrix_and_specification(n_bugs=n_bugs)
+        with stage_profiler.stage("program generation"):
+            prog = next_control_flow(n_bugs=n_bugs)
+        with stage_profiler.stage("spec execution"):
+            ins, outs = generate_specification(prog, n_bugs=n_bugs)
 
         # if sample size not specified (i.e. 0), take exactly half of the full
         sample_size = int(((2 ** n_bugs) / 2) if sample_size == 0 else sample_size)
@@ -60,134 +104,205 @@ def generate_rl_training_set(
         ins = ins[sample_choice, :]
         outs = outs[sample_choice, :]
 
-        # convert the matrix to the vector representation
-        flat_matrix = deepcopy(cf_to_lower_triangular_flattened(prog))
-        subtractive_modifications = []
-        queue = [(0, flat_matrix)]
-
-        # generate subtractive modifications
-        while queue:
-            distance, current_element = queue.pop()
-            edge_indices = np.argwhere(current_element == 1)
-            local_results = []
-
-            for index in edge_indices:
-                tmp = deepcopy(current_element)
-                tmp[index] = 0
-                local_results.append(tmp)
-
-            for modification in local_results:
-                if subtractive_modifications:
-                    appears = False
-                    # check if the modification is already in the list
-                    for _, elem in subtractive_modifications:
-                        if np.array_equal(modification, elem):
-                            appears = True
-                    # if it is not in the list, add it to the queue and the list
-                    if not appears:
-                        queue.append((distance + 1, modification))
-                        subtractive_modifications.append((distance + 1, modification))
-                else:
-                    queue.append((distance + 1, modification))
-                    subtractive_modifications.append((distance + 1, modification))
+        # skip specifications that are redundant to one that is already in the training set; once no new
+        # specifications are found anymore, the distinct ones are exhausted and de-duplication stops
+        if deduplicate:
+            with stage_profiler.stage("de-duplication"):
+                key = equivalence_index.redundancy_key(ins, outs)
+            if key in seen_specifications:
+                redundant_in_a_row += 1
+                if redundant_in_a_row >= MAX_REDUNDANT_IN_A_ROW:
+                    print(f"Distinct specifications exhausted after {len(seen_specifications)}, de-duplication stopped")
+                    deduplicate = False
+                continue
+            seen_specifications.add(key)
+            redundant_in_a_row = 0
+
+        with stage_profiler.stage("neighbourhood expansion"):
+            modifications = _neighbourhood(prog)
+
+        with stage_profiler.stage("label building"):
+            results = []
+
+            # the oracle returns the minimum number of toggles from each modification to any program consistent with
+            # the sample of the specification; modifications at distance 0 generate the same outputs as the original
+            # program
+            exact = oracle.distances(np.array([elem for _, elem in modifications]), ins=ins, outs=outs)
+            for (distance, elem), exact_distance in zip(modifications, exact):
+                if exact_distance == 0:
+                    continue
+                if exact_distances and exact_distance != UNREACHABLE:
+                    distance = int(exact_distance)
+                results.append((distance, elem))
 
-        # generate additive modifications based on subtractive_modifications
-        additive_modifications = []
+        if not results:
+            continue
 
-        for distance, matrix in subtractive_modifications:
-            # take random zero index and add one to it
-            zero_indices = np.argwhere(matrix == 0)
+        # add the results that do not generate the same outputs as the original program to the training set
+        n_rows += len(results)
+        rows["distance"] += [distance for distance, _ in results]
+        if compact:
+            # input code x is row x of the full specification
+            sample_mask = sum(1 << code for code in sample_choice)
+            rows["program"] += [int(cf_layout.pack(cf_to_lower_triangular_flattened(prog)))] * len(results)
+            rows["sample_mask"] += [sample_mask] * len(results)
+            rows["modified_program"] += [int(key) for key in cf_layout.pack([elem for _, elem in results])]
+        else:
+            rows["input_samples"] += [ins] * len(results)
+            rows["output_samples"] += [outs] * len(results)
+            rows["modified_control_flow_matrix"] += [elem for _, elem in results]
+
+    with stage_profiler.stage("serialization"):
+        training_set = pd.DataFrame(rows)
+        if compact:
+            training_set = training_set.astype({
+                "distance": np.int8, "program": np.uint64, "sample_mask": np.uint64, "modified_program": np.uint64
+            })
+
+        end = time.time()
+        print("RL training set generation took {} seconds".format(end - start))
+        if pickle:
+            utilities.ensure_paths()
+            training_set.to_pickle(
+                f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/training_sets/rl_training_sets/rl_training_set_"
+                f"{size}_{n_bugs}_{sample_size}{'_compact' if compact else ''}.pkl"
+            )
+    return training_set
 
-            local_results = []
 
-            for index in zero_indices:
-                tmp = deepcopy(matrix)
-                tmp[index] = 1
-                local_results.append(tmp)
+def _neighbourhood(prog: np.ndarray) -> List[Tuple[int, np.ndarray]]:
+    """
+    Generates the modifications of a program: its subtractive modifications, additive modifications of these and
+    additive modifications of the program itself.
 
-            # check that the additive modifications are not in additive_modifications or subtractive_modifications
-            for modification in local_results:
+    :param prog: (n, 2n) control flow matrix
+    :return: (number of toggles from the program, flattened modification) pairs
+    """
+    # convert the matrix to the vector representation
+    flat_matrix = deepcopy(cf_to_lower_triangular_flattened(prog))
+    subtractive_modifications = []
+    queue = [(0, flat_matrix)]
+
+    # generate subtractive modifications
+    while queue:
+        distance, current_element = queue.pop()
+        edge_indices = np.argwhere(current_element == 1)
+        local_results = []
+
+        for index in edge_indices:
+            tmp = deepcopy(current_element)
+            tmp[index] = 0
+            local_results.append(tmp)
+
+        for modification in local_results:
+            if subtractive_modifications:
                 appears = False
-                for _, elem in additive_modifications:
+                # check if the modification is already in the list
+                for _, elem in subtractive_modifications:
                     if np.array_equal(modification, elem):
                         appears = True
+                # if it is not in the list, add it to the queue and the list
                 if not appears:
-                    for _, elem in subtractive_modifications:
-                        if np.array_equal(modification, elem):
-                            appears = True
-                if not appears and not np.array_equal(modification, flat_matrix):
-                    additive_modifications.append((distance + 1, modification))
-
-        # generate additive modifications based on the original program
-        flat_matrix = deepcopy(cf_to_lower_triangular_flattened(prog))
-        original_additive_modifications = []
-        queue = [(0, flat_matrix)]
+                    queue.append((distance + 1, modification))
+                    subtractive_modifications.append((distance + 1, modification))
+            else:
+                queue.append((distance + 1, modification))
+                subtractive_modifications.append((distance + 1, modification))
+
+    # generate additive modifications based on subtractive_modifications
+    additive_modifications = []
+
+    for distance, matrix in subtractive_modifications:
+        # take random zero index and add one to it
+        zero_indices = np.argwhere(matrix == 0)
+
+        local_results = []
+
+        for index in zero_indices:
+            tmp = deepcopy(matrix)
+            tmp[index] = 1
+            local_results.append(tmp)
+
+        # check that the additive modifications are not in additive_modifications or subtractive_modifications
+        for modification in local_results:
+            appears = False
+            for _, elem in additive_modifications:
+                if np.array_equal(modification, elem):
+                    appears = True
+            if not appears:
+                for _, elem in subtractive_modifications:
+                    if np.array_equal(modification, elem):
+                        appears = True
+            if not appears and not np.array_equal(modification, flat_matrix):
+                additive_modifications.append((distance + 1, modification))
+
+    # generate additive modifications based on the original program
+    flat_matrix = deepcopy(cf_to_lower_triangular_flattened(prog))
+    original_additive_modifications = []
+    queue = [(0, flat_matrix)]
+
+    while queue and len(original_additive_modifications) < 30:
+        distance, current_element = queue.pop()
+        no_edge_indices = np.argwhere(current_element == 0)
+        local_results = []
+
+        for index in no_edge_indices:
+            tmp = deepcopy(current_element)
+            tmp[index] = 1
+            local_results.append(tmp)
+
+        for modification in local_results:
+
+            appears = False
+            # check if the modification is already in the list
+            for _, elem in original_additive_modifications:
+                if np.array_equal(modification, elem):
+                    appears = True
+            # check if it is already in the additive_modifications list
+            if not appears:
+                for _, elem in additive_modifications:
+                    if np.array_equal(modification, elem):
+                        appears = True
 
-        while queue and len(original_additive_modifications) < 30:
-            distance, current_element = queue.pop()
-            no_edge_indices = np.argwhere(current_element == 0)
-            local_results = []
+            # if it is not in the list, add it to the queue and the list
+            if not appears:
+                queue.append((distance + 1, modification))
+                original_additive_modifications.append((distance + 1, modification))
 
-            for index in no_edge_indices:
-                tmp = deepcopy(current_element)
-                tmp[index] = 1
-                local_results.append(tmp)
+    # merge subtractive_modifications, additive_modifications, original_additive_modifications into one list
+    return subtractive_modifications + additive_modifications + original_additive_modifications
 
-            for modification in local_results:
 
-                appears = False
-                # check if the modification is already in the list
-                for _, elem in original_additive_modifications:
-                    if np.array_equal(modification, elem):
-                        appears = True
-                # check if it is already in the additive_modifications list
-                if not appears:
-                    for _, elem in additive_modifications:
-                        if np.array_equal(modification, elem):
-                            appears = True
+def expand_row(program: int, sample_mask: int, modified_program: int, n_bugs: int) -> Dict[str, np.ndarray]:
+    """
+    Rebuilds the arrays of a row of a compact training set: the sample outputs are looked up in the truth table of
+    the original program.
+
+    :param program: packed original program
+    :param sample_mask: bitmask of the sampled input codes
+    :param modified_program: packed modified program
+    :param n_bugs: number of bugs
+    :return: dictionary with "input_samples", "output_samples" and "modified_control_flow_matrix"
+    """
+    input_codes = np.flatnonzero((int(sample_mask) >> np.arange(2 ** n_bugs)) & 1)
+    return {
+        "input_samples": simulator.decode_codes(input_codes, n_bugs=n_bugs),
+        "output_samples": simulator.decode_codes(truth_table(int(program), n_bugs)[input_codes], n_bugs=n_bugs),
+        "modified_control_flow_matrix": cf_layout.unpack(np.uint64(modified_program), n_bugs=n_bugs)
+    }
 
-                # if it is not in the list, add it to the queue and the list
-                if not appears:
-                    queue.append((distance + 1, modification))
-                    original_additive_modifications.append((distance + 1, modification))
-
-        # merge subtractive_modifications, additive_modifications, original_additive_modifications into one list
-        modifications = subtractive_modifications + additive_modifications + original_additive_modifications
-        results = []
-
-        # check if the modifications generate the same outputs as the original
-        # program for the sample of the specification
-        for distance, elem in modifications:
-            mod_outs = get_outputs(
-                n_bugs=n_bugs,
-                ins=ins,
-                prog=flattened_repr_to_control_flow_matrix(
-                    flat_cf_repr=elem,
-                    n_bugs=n_bugs)
-            )
-            # check if mod_outs and outs are the same
-            if not np.array_equal(a1=outs, a2=mod_outs):
-                results.append((distance, elem))
 
-        # add the results that do not generate the same outputs as the original program to the training set
-        for distance, elem in results:
-            training_set = training_set.append(pd.DataFrame({
-                "distance": distance,
-                "input_samples": [ins],
-                "output_samples": [outs],
-                "modified_control_flow_matrix": [elem]
-            }), ignore_index=True)
-
-    end = time.time()
-    print("RL training set generation took {} seconds".format(end - start))
-    if pickle:
-        training_set.to_pickle(
-            f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/training_sets/rl_training_sets/rl_training_set_"
-            f"{size}_{n_bugs}_{sample_size}.pkl"
-        )
-    return training_set
+@lru_cache(maxsize=4096)
+def truth_table(program: int, n_bugs: int) -> np.ndarray:
+    """
+    :param program: packed program
+    :param n_bugs: number of bugs
+    :return: (2^n,) output code for every input code (cached)
+    """
+    return simulator.truth_tables(np.array([program], dtype=np.uint64), n_bugs)[0]
 
 
 if __name__ == "__main__":
     random.seed(10)
+    seed_program_generator(10)
     generate_rl_training_set(size=10000, n_bugs=3)
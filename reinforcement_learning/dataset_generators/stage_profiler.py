@@ -0,0 +1,192 @@
+"""
+Stage-level profiler of the dataset generators. The generators mark their stages with
+
+    with stage_profiler.stage("neighbourhood expansion"):
+        ...
+
+which costs next to nothing unless a StageProfiler is active (generate_rl_training_set / create_pretraining_dataset
+activate the profiler passed as `profiler`). Per stage, the profiler records the wall time, the number of calls and,
+with memory=True, the peak of the memory allocated during a call (tracemalloc, which slows down the run). With
+sample_interval > 0, a background thread samples the stack of the profiled thread and write_collapsed_stacks() writes
+them in the collapsed stack format of flamegraph.pl / speedscope, with the stage as the root frame.
+
+Stages: program generation, spec execution, neighbourhood expansion, de-duplication, label building, serialization.
+"""
+
+# standard library imports
+import os
+import sys
+import json
+import time
+import threading
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, Optional
+
+# local imports (i.e. our own code)
+from utilities import utilities
+
+# profiler the stages are recorded in (cf. StageProfiler.activate())
+_active: Optional["StageProfiler"] = None
+
+
+def stage(name: str) -> ContextManager:
+    """
+    :param name: name of the stage
+    :return: context manager that records the stage in the active profiler (no-op if there is none)
+    """
+    return nullcontext() if _active is None else _active.stage(name)
+
+
+class StageProfiler:
+
+    def __init__(self, memory: Optional[bool] = False, sample_interval: Optional[float] = 0.0):
+        """
+        :param memory: if True, the peak memory allocated per stage is recorded with tracemalloc
+        :param sample_interval: interval of the stack sampler in seconds (0: no sampling)
+        """
+        self.memory: bool = memory
+        self.sample_interval: float = sample_interval
+
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.peak_bytes: Dict[str, int] = defaultdict(int)
+        # collapsed stack ("stage;file:function;...") -> number of samples
+        self.samples: Dict[str, int] = defaultdict(int)
+        self.total_seconds: float = 0.0
+
+        self._current: str = "other"
+        self._thread_id: Optional[int] = None
+        self._stop: threading.Event = threading.Event()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Records the wall time, the call and (optionally) the peak memory of a stage.
+
+        :param name: name of the stage
+        :return: None
+        """
+        previous, self._current = self._current, name
+        start_bytes = tracemalloc.get_traced_memory()[0] if self.memory else 0
+        if self.memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+            if self.memory:
+                self.peak_bytes[name] = max(self.peak_bytes[name], tracemalloc.get_traced_memory()[1] - start_bytes)
+            self._current = previous
+
+    @contextmanager
+    def activate(self) -> Iterator["StageProfiler"]:
+        """
+        Makes this the active profiler of the process (recorded by stage()) and starts tracemalloc and the sampler.
+
+        :return: the profiler
+        """
+        global _active
+        previous, _active = _active, self
+        started_tracemalloc = self.memory and not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+
+        sampler = None
+        if self.sample_interval > 0:
+            self._thread_id = threading.get_ident()
+            self._stop.clear()
+            sampler = threading.Thread(target=self._sample_loop, name="stage-profiler", daemon=True)
+            sampler.start()
+
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.total_seconds += time.perf_counter() - start
+            if sampler is not None:
+                self._stop.set()
+                sampler.join()
+            if started_tracemalloc:
+                tracemalloc.stop()
+            _active = previous
+
+    def _sample_loop(self) -> None:
+        """
+        Samples the stack of the profiled thread every sample_interval seconds.
+
+        :return: None
+        """
+        while not self._stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join([self._current] + frames[::-1])] += 1
+
+    def report(self) -> dict:
+        """
+        :return: per stage: wall time, share of the total wall time, calls and peak memory (if recorded)
+        """
+        total = self.total_seconds or sum(self.seconds.values()) or 1.0
+        stages = {
+            name: {
+                "seconds": round(seconds, 6),
+                "share": round(seconds / total, 4),
+                "calls": self.calls[name],
+                **({"peak_bytes": self.peak_bytes[name]} if self.memory else {})
+            }
+            for name, seconds in sorted(self.seconds.items(), key=lambda item: -item[1])
+        }
+        return {"total_seconds": round(self.total_seconds, 6), "stages": stages}
+
+    def format_report(self) -> str:
+        """
+        :return: report as a table
+        """
+        report = self.report()
+        header = f"{'stage':<24}{'seconds':>12}{'share':>8}{'calls':>10}"
+        lines = [header + (f"{'peak MiB':>11}" if self.memory else "")]
+        for name, entry in report["stages"].items():
+            line = f"{name:<24}{entry['seconds']:>12.3f}{entry['share']:>8.1%}{entry['calls']:>10}"
+            if self.memory:
+                line += f"{entry['peak_bytes'] / 2 ** 20:>11.2f}"
+            lines.append(line)
+        lines.append(f"{'total':<24}{report['total_seconds']:>12.3f}")
+        return "\n".join(lines)
+
+    def write_collapsed_stacks(self, path: str) -> None:
+        """
+        Writes the stack samples in the collapsed stack format ("frame;frame;... count" per line).
+
+        :param path: path of the output file
+        :return: None
+        """
+        with open(path, "w") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+    def write(self, name: str, directory: Optional[str] = None) -> str:
+        """
+        Prints the report and writes it (and the stack samples, if any) to the profile directory.
+
+        :param name: name of the run (prefix of the file names)
+        :param directory: output directory (OPTIONAL, default: data/profiles)
+        :return: path of the JSON report
+        """
+        if directory is None:
+            utilities.ensure_paths()
+            directory = f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/profiles"
+        os.makedirs(directory, exist_ok=True)
+        prefix = f"{directory}/{name}_{time.strftime('%Y-%m-%d_%H-%M-%S')}"
+
+        print(self.format_report())
+        with open(f"{prefix}.json", "w") as f:
+            json.dump(self.report(), f, indent=2)
+        if self.samples:
+            self.write_collapsed_stacks(f"{prefix}.collapsed")
+        return f"{prefix}.json"
@@ -6,32 +6,70 @@ from typing import List, Tuple, Optional
 
 from numpy import binary_repr
 import numpy as np
-# noinspection PyPackageRequirements
-import jpype
-# noinspection PyUnresolvedReferences
-from utilities import utilities
 
-CF_Translated = jpype.JClass(
-    "de.bugplus.examples.development.CF_Translated"
-)
+# local imports (i.e. our own code)
+from utilities import utilities, jvm_bridge, jvm_executor
+from dataset_generators import bugbit_simulator as simulator, cf_layout
+from dataset_generators.program_generator import next_control_flow
 
+# java class executing BugBit programs, resolved on first use (cf. _get_cf_translated())
+_cf_translated = None
 
-def generate_control_flow_matrix_and_specification(n_bugs: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+def _get_cf_translated():
+    """
+    Returns the java class that executes BugBit programs. Starts the JVM on the first call.
+
+    :return: the JClass de.bugplus.examples.development.CF_Translated
+    """
+    global _cf_translated
+    if _cf_translated is None:
+        utilities.ensure_jvm()
+        # noinspection PyPackageRequirements
+        import jpype
+        _cf_translated = jpype.JClass("de.bugplus.examples.development.CF_Translated")
+    return _cf_translated
+
+
+def generate_control_flow_matrix_and_specification(
+        n_bugs: int,
+        simulated: Optional[bool] = False
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Generates a control flow matrix and the corresponding specification
 
     :param n_bugs: number of bugs
-    :return:
+    :param simulated: if True, the outputs are computed with the NumPy simulator instead of the JVM (e.g. in
+    processes that should not start a JVM, cf. bugbit_simulator.py)
+    :return: inputs, outputs, control flow matrix
     """
 
-    prog = generate_control_flow_sequentially(n_bugs=n_bugs)
+    prog = next_control_flow(n_bugs=n_bugs)
+    ins, outs = generate_specification(prog, n_bugs=n_bugs, simulated=simulated)
+    return ins, outs, prog
 
+
+def generate_specification(
+        prog: np.ndarray,
+        n_bugs: int,
+        simulated: Optional[bool] = False
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Executes a program for all possible inputs
+
+    :param prog: control flow matrix of the program
+    :param n_bugs: number of bugs
+    :param simulated: if True, the outputs are computed with the NumPy simulator instead of the JVM
+    :return: inputs, outputs
+    """
     ins: np.ndarray = generate_ins(n_bugs=n_bugs)
-    outs = []
+    if simulated:
+        output_codes = simulator.run(cf_layout.pack_matrices(prog)[None], n_bugs, simulator.encode_rows(ins))[0]
+        return ins, simulator.decode_codes(output_codes, n_bugs=n_bugs)
 
-    for _, elem in enumerate(ins):
-        outs.append(np.array(CF_Translated.execute(n_bugs, prog, elem), dtype=np.int64))
-    return ins, np.array(outs), prog
+    outs = get_outputs(n_bugs=n_bugs, ins=ins, prog=prog)
+
+    return ins, np.array(outs)
 
 
 def get_outputs(n_bugs: int, ins: np.ndarray, prog: np.ndarray) -> List[np.ndarray]:
@@ -43,10 +81,41 @@ def get_outputs(n_bugs: int, ins: np.ndarray, prog: np.ndarray) -> List[np.ndarr
     :param prog: control flow matrix of the program
     :return: program outputs of len(ins)
     """
-    outs = []
-    for _, elem in enumerate(ins):
-        outs.append(np.array(CF_Translated.execute(n_bugs, prog, elem), dtype=np.int64))
-    return outs
+    # execute in the executor sidecar if one is configured (cf. utilities.jvm_executor)
+    client = jvm_executor.get_client()
+    if client is not None:
+        return list(client.execute(n_bugs=n_bugs, prog=prog, ins=ins))
+
+    # one call for all inputs; arguments and results are passed through shared buffers (cf. utilities.jvm_bridge)
+    return list(jvm_bridge.execute_flat(_get_cf_translated(), n_bugs=n_bugs, prog=prog, ins=ins))
+
+
+def get_outputs_batch(n_bugs: int, ins: np.ndarray, progs: List[np.ndarray]) -> List[List[np.ndarray]]:
+    """
+    For given inputs and several programs, returns the outputs of every program. With the executor sidecar, all
+    programs are executed in one round trip.
+
+    :param n_bugs: number of bugs of the programs
+    :param ins: program inputs (shared by all programs)
+    :param progs: control flow matrices of the programs
+    :return: program outputs of len(ins) for every program
+    """
+    return execute_jobs([(n_bugs, prog, ins) for prog in progs])
+
+
+def execute_jobs(jobs: List[Tuple[int, np.ndarray, np.ndarray]]) -> List[List[np.ndarray]]:
+    """
+    Executes several programs, each with its own inputs. With the executor sidecar, all programs are executed in one
+    round trip.
+
+    :param jobs: list of (n_bugs, control flow matrix, inputs)
+    :return: program outputs of len(inputs) for every job
+    """
+    client = jvm_executor.get_client()
+    if client is not None:
+        return [list(outs) for outs in client.execute_batch(jobs)]
+
+    return [get_outputs(n_bugs=n_bugs, ins=ins, prog=prog) for n_bugs, prog, ins in jobs]
 
 
 def generate_ins(n_bugs: int) -> np.ndarray:
@@ -66,7 +135,8 @@ def generate_ins(n_bugs: int) -> np.ndarray:
 
 def generate_control_flow_sequentially(n_bugs: int, num_edges: Optional[int] = None) -> np.ndarray:
     """
-    returns a (sequentially) generated control flow matrix for turing tumble / BugBit
+    returns a (sequentially) generated control flow matrix for turing tumble / BugBit. Reference implementation of
+    the program distribution; the generators draw from program_generator.generate_control_flow_batch
 
     :param n_bugs: number of bugs used
     :param num_edges: number of edges to be used (OPTIONAL)
@@ -106,41 +176,22 @@ def generate_control_flow_sequentially(n_bugs: int, num_edges: Optional[int] = N
 
 def flattened_repr_to_control_flow_matrix(flat_cf_repr: np.ndarray, n_bugs: int) -> np.ndarray:
     """
-    Converts a flattened representation of the control flow matrix to a control flow matrix
+    Converts a flattened representation of the control flow matrix to a control flow matrix (cf. cf_layout.to_matrix
+    for batches and torch tensors)
 
-    :param flat_cf_repr:
-    :param n_bugs:
-    :return:
+    :param flat_cf_repr: flattened lower-triangular representation
+    :param n_bugs: number of bugs
+    :return: (n_bugs, 2 * n_bugs) int64 control flow matrix
     """
-    cf_new = np.zeros(shape=(n_bugs, 2 * n_bugs), dtype=np.int64)
-
-    i = 0
-    for rowindex in range(n_bugs):
-        # remove the irrelevant CF Matrix elements (waterflow principle, upper right corner)
-        row_add_indices = list(range(2 * rowindex))
-
-        for rai in row_add_indices:
-            # print(rowindex, rai, i)
-            cf_new[rowindex, rai] = flat_cf_repr[i]
-            i += 1
-    return cf_new
+    return cf_layout.to_matrix(np.asarray(flat_cf_repr, dtype=np.int64), n_bugs=n_bugs)
 
 
 def cf_to_lower_triangular_flattened(cf_matrix: np.ndarray) -> np.ndarray:
     """
-    Converts a control flow matrix to a lower triangular matrix represented as a vector
+    Converts a control flow matrix to a lower triangular matrix represented as a vector (cf. cf_layout.to_flat for
+    batches and torch tensors)
 
-    :param cf_matrix:
-    :return:
+    :param cf_matrix: (n_bugs, 2 * n_bugs) control flow matrix
+    :return: flattened lower-triangular representation
     """
-    n_bugs = len(cf_matrix)
-
-    remove_indices = []
-
-    for rowindex in range(len(cf_matrix)):
-        row_remove_indices = list(range(2 * rowindex + rowindex * 2 * n_bugs, 2 * n_bugs * (rowindex + 1)))
-        remove_indices += row_remove_indices
-
-    cf_matrix = np.array(cf_matrix).flatten()
-
-    return np.delete(cf_matrix, remove_indices)
+    return cf_layout.to_flat(np.asarray(cf_matrix))
@@ -0,0 +1,114 @@
+"""
+Adaptive curriculum of a BugBit environment. Instead of moving all environments to the next phase (i.e. distance of the
+training set rows) when the global win rate passes a threshold, every environment holds an AdaptiveCurriculum that
+tracks the rolling win rate per phase from its own episodes and samples the phase of every episode from a mixture:
+
+- frontier: the lowest phase that is not mastered yet (rolling win rate >= threshold over at least min_episodes)
+- lookahead: the phase after the frontier, weighted with the win rate of the frontier, such that its statistics are
+  collected while the frontier is being mastered
+- review: the mastered phases below the frontier, weighted with their failure rate (against forgetting)
+
+The weights are updated locally after every episode, i.e. no broadcast through the trainer is needed.
+"""
+
+# standard library imports
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+# 3rd party imports
+import numpy as np
+
+
+class AdaptiveCurriculum:
+
+    def __init__(
+            self,
+            phases: List[int],
+            window: Optional[int] = 50,
+            threshold: Optional[float] = 0.85,
+            min_episodes: Optional[int] = 20,
+            frontier_weight: Optional[float] = 0.6,
+            lookahead_weight: Optional[float] = 0.2,
+            review_weight: Optional[float] = 0.2,
+            rng: Optional[np.random.Generator] = None
+    ):
+        """
+        :param phases: phases of the curriculum (ascending)
+        :param window: number of most recent episodes per phase the win rate is computed from
+        :param threshold: win rate at which a phase is mastered
+        :param min_episodes: minimum number of episodes of a phase before it can be mastered
+        :param frontier_weight: weight of the frontier phase
+        :param lookahead_weight: weight of the phase after the frontier (scaled with the win rate of the frontier)
+        :param review_weight: weight of the mastered phases (split according to their failure rates)
+        :param rng: random number generator (OPTIONAL)
+        """
+        self.phases: List[int] = sorted(phases)
+        self.threshold: float = threshold
+        self.min_episodes: int = min_episodes
+        self.frontier_weight: float = frontier_weight
+        self.lookahead_weight: float = lookahead_weight
+        self.review_weight: float = review_weight
+        self.rng: np.random.Generator = rng if rng is not None else np.random.default_rng()
+
+        # outcomes (1: won, 0: lost) of the most recent episodes per phase
+        self.outcomes: Dict[int, Deque[int]] = {phase: deque(maxlen=window) for phase in self.phases}
+        self.frontier: int = self.phases[0]
+        self.weights: np.ndarray = self._compute_weights()
+
+    def win_rate(self, phase: int) -> float:
+        """
+        :param phase: phase
+        :return: rolling win rate of the phase (0 if it was not played yet)
+        """
+        outcomes = self.outcomes[phase]
+        return sum(outcomes) / len(outcomes) if outcomes else 0.0
+
+    def mastered(self, phase: int) -> bool:
+        """
+        :param phase: phase
+        :return: whether the rolling win rate of the phase reached the threshold over at least min_episodes episodes
+        """
+        return len(self.outcomes[phase]) >= self.min_episodes and self.win_rate(phase) >= self.threshold
+
+    def sample(self) -> int:
+        """
+        :return: phase of the next episode
+        """
+        return self.phases[self.rng.choice(len(self.phases), p=self.weights)]
+
+    def update(self, phase: int, won: int) -> None:
+        """
+        Records the outcome of an episode and updates the frontier and the sampling weights.
+
+        :param phase: phase of the episode
+        :param won: 1 if the episode was won, else 0
+        :return: None
+        """
+        self.outcomes[phase].append(won)
+        self.frontier = next((p for p in self.phases if not self.mastered(p)), self.phases[-1])
+        self.weights = self._compute_weights()
+
+    def _compute_weights(self) -> np.ndarray:
+        """
+        :return: sampling probabilities of the phases (cf. module docstring)
+        """
+        index = self.phases.index(self.frontier)
+        weights = np.zeros(len(self.phases))
+        weights[index] = self.frontier_weight
+        if index + 1 < len(self.phases):
+            weights[index + 1] = self.lookahead_weight * self.win_rate(self.frontier)
+        if index > 0:
+            # a small floor keeps every mastered phase in the review
+            failure_rates = np.array([1.0 - self.win_rate(p) for p in self.phases[:index]]) + 0.05
+            weights[:index] = self.review_weight * failure_rates / failure_rates.sum()
+        return weights / weights.sum()
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        :return: frontier and rolling win rate per played phase
+        """
+        metrics = {"curriculum_frontier": float(self.frontier)}
+        for phase in self.phases:
+            if self.outcomes[phase]:
+                metrics[f"curriculum_win_rate_phase_{phase}"] = self.win_rate(phase)
+        return metrics
@@ -3,20 +3,29 @@ BugBit environment for RL training. Abstraction of the Turing Tumble game.
 """
 
 # standard library imports
-from copy import deepcopy
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List, Optional, Tuple, TYPE_CHECKING
 
 # 3rd party imports
-import pandas as pd
 import gym
 from gym.utils import seeding
 
 import numpy as np
 
 # local imports (i.e. our own code)
-# noinspection PyUnresolvedReferences
-from utilities import utilities
-from dataset_generators.utils import flattened_repr_to_control_flow_matrix, get_outputs
+from dataset_generators import cf_layout, dataset_cache
+from dataset_generators.utils import get_outputs
+from dataset_generators.rl_trainingset_generation import expand_row, truth_table
+from environments.instrumentation import EnvStats
+from environments.curriculum import AdaptiveCurriculum
+
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# all observation components are 0/1, hence one byte per element suffices (instead of 8 for int64); the model casts the
+# observation to float in its first layer (cf. FullyConnectedNetwork.forward)
+OBSERVATION_DTYPE = np.uint8
 
 
 # noinspection PyMethodMayBeStatic
@@ -40,11 +49,21 @@ class BugBit(gym.Env):
         self.n_bugs: int = 3
         self.config = config
         self.sample_size: int = 4
-        self.training_set: pd.DataFrame = pd.DataFrame()
+        self.training_set: "pd.DataFrame" = None
         self.phase: int = 1
         # self.generator: Generator = Generator()
         self.step_counter: int = 0
         self.max_steps: int = 15
+        self.base_max_steps: int = 15
+        # compact training sets store packed programs and sample masks (cf. generate_rl_training_set)
+        self.compact: bool = False
+        self.resample_samples: bool = False
+        # counters and timers of the hot path, None if the instrumentation is off (cf. environments/instrumentation.py)
+        self.stats: Optional[EnvStats] = None
+        # per-environment curriculum, None if the phase is incremented by the callbacks (cf. environments/curriculum.py)
+        self.curriculum: Optional[AdaptiveCurriculum] = None
+        # row indices of the training set per distance
+        self.phase_rows: Dict[int, np.ndarray] = {}
 
         self.parse_config(self.config)
 
@@ -57,19 +76,19 @@ class BugBit(gym.Env):
                 "control_flow_matrix": gym.spaces.Box(
                     low=0,
                     high=1,
-                    shape=(self.n_bugs * (self.n_bugs - 1),), dtype=np.int64
+                    shape=(self.n_bugs * (self.n_bugs - 1),), dtype=OBSERVATION_DTYPE
                 ),
                 "sample_input_pairs": gym.spaces.Box(
                     low=0,
                     high=1,
                     shape=(self.sample_size, self.n_bugs),
-                    dtype=np.int64
+                    dtype=OBSERVATION_DTYPE
                 ),
                 "sample_output_pairs": gym.spaces.Box(
                     low=0,
                     high=1,
                     shape=(self.sample_size, self.n_bugs),
-                    dtype=np.int64
+                    dtype=OBSERVATION_DTYPE
                 )
             }
         )
@@ -84,14 +103,28 @@ class BugBit(gym.Env):
         self.reward = 0
         self.info = dict()
         self.step_counter = 0
+        if self.curriculum is not None:
+            self.set_phase(self.curriculum.sample())
+
+        stats = self.stats
+        start = time.perf_counter() if stats is not None else 0.0
 
         row = self._sample_from_training_set()
+        sampled = time.perf_counter() if stats is not None else 0.0
 
-        self.state = {
-            "control_flow_matrix": row["modified_control_flow_matrix"].values[0],
-            "sample_input_pairs": row["input_samples"].values[0],
-            "sample_output_pairs": row["output_samples"].values[0]
-        }
+        if self.compact:
+            self.state = self._expand_compact_row(row)
+        else:
+            self.state = {
+                "control_flow_matrix": np.asarray(row["modified_control_flow_matrix"].values[0],
+                                                  dtype=OBSERVATION_DTYPE),
+                "sample_input_pairs": np.asarray(row["input_samples"].values[0], dtype=OBSERVATION_DTYPE),
+                "sample_output_pairs": np.asarray(row["output_samples"].values[0], dtype=OBSERVATION_DTYPE)
+            }
+
+        if stats is not None:
+            stats.add("reset_sampling_seconds", sampled - start)
+            stats.add("observation_seconds", time.perf_counter() - sampled)
 
         return self.state
 
@@ -101,6 +134,28 @@ class BugBit(gym.Env):
         :param action: edge in the control flow matrix to be set/unset
         :return:
         """
+        job = self.apply_action(action)
+        if job is None:
+            return [self.state, self.reward, self.done, self.info]
+
+        # 3. Get the outputs for the corresponding input pairs for the (now) modified control flow matrix
+        n_bugs, prog, ins = job
+        if self.stats is None:
+            return self.evaluate_outputs(get_outputs(n_bugs=n_bugs, ins=ins, prog=prog))
+
+        start = time.perf_counter()
+        outs = get_outputs(n_bugs=n_bugs, ins=ins, prog=prog)
+        self.stats.add("executor_seconds", time.perf_counter() - start)
+        self.stats.add("executor_calls")
+        return self.evaluate_outputs(outs)
+
+    def apply_action(self, action: int) -> Optional[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        First half of step(): takes the action and returns the program execution needed to evaluate it, such that
+        several environments can execute their programs in one batch (cf. BugBitVectorEnv).
+        :param action: edge in the control flow matrix to be set/unset
+        :return: (n_bugs, control flow matrix, inputs) or None if the game ended because of the step limit
+        """
         # 1. Check if the maximum number of steps has reached and, if so, end the game
         self.step_counter += 1
         if self.step_counter > self.max_steps:
@@ -109,26 +164,32 @@ class BugBit(gym.Env):
             self.info = {
                 "won": 0
             }
-            return [self.state, self.reward, self.done, self.info]
+            self._record_outcome(0)
+            return None
 
         # 2. Take the action the agent selected (i.e. set/unset an edge)
-        cf_matrix = deepcopy(self.state["control_flow_matrix"])
+        cf_matrix = np.array(self.state["control_flow_matrix"])
 
         cf_matrix[action] = 1 if cf_matrix[action] == 0 else 0
 
-        # 3. Get the outputs for the corresponding input pairs for the (now) modified control flow matrix
-        current_outs = get_outputs(
-            n_bugs=self.n_bugs,
-            ins=self.state["sample_input_pairs"],
-            prog=flattened_repr_to_control_flow_matrix(flat_cf_repr=cf_matrix, n_bugs=self.n_bugs)
-        )
         # 4. Update the state
         self.state = {
             "control_flow_matrix": cf_matrix,
             "sample_input_pairs": self.state["sample_input_pairs"],
             "sample_output_pairs": self.state["sample_output_pairs"]
         }
+        return (
+            self.n_bugs,
+            cf_layout.to_matrix(cf_matrix, n_bugs=self.n_bugs),
+            self.state["sample_input_pairs"]
+        )
 
+    def evaluate_outputs(self, current_outs: List[np.ndarray]) -> list:
+        """
+        Second half of step(): compares the outputs of the modified program with the sample outputs.
+        :param current_outs: outputs of the modified control flow matrix for the sample inputs
+        :return: state, reward, done, info
+        """
         # 5. If the outputs in the observations space equal the ones of the updated control flow matrix
         # return a positive reward and end the game
         if np.array_equal(current_outs, self.state["sample_output_pairs"]):
@@ -137,6 +198,7 @@ class BugBit(gym.Env):
             self.info = {
                 "won": 1
             }
+            self._record_outcome(1)
         # 6. else keep the reward at 0 and let the game continue
         else:
             self.reward = -1
@@ -160,15 +222,80 @@ class BugBit(gym.Env):
         self.config = config
         self.n_bugs = config.get("n_bugs")
         self.training_set = config.get("training_set")
+        if self.training_set is None and "training_set_params" in config:
+            # every worker reads the training set from the dataset cache instead of receiving it with the config
+            self.training_set = dataset_cache.rl_training_set(**config["training_set_params"])
         self.max_steps = config.get("max_steps")
         self.sample_size = config.get("sample_size")
+        self.compact = "program" in self.training_set.columns
+        self.resample_samples = config.get("resample_samples", False)
+        self.stats = EnvStats() if config.get("instrumentation", False) else None
 
-    def _sample_from_training_set(self) -> pd.Series:
+        distances = self.training_set["distance"].to_numpy()
+        self.phase_rows = {int(distance): np.flatnonzero(distances == distance) for distance in np.unique(distances)}
+        # max_steps is the step limit of the first phase; every further phase allows one more step
+        self.base_max_steps = self.max_steps
+        if config.get("curriculum") is not None:
+            self.curriculum = AdaptiveCurriculum(phases=list(self.phase_rows), **config["curriculum"])
+            self.set_phase(self.curriculum.frontier)
+
+    def _sample_from_training_set(self) -> "pd.DataFrame":
         """
         Takes a random sample from the training set depending on the phase the environment is set to
         :return:
         """
-        return self.training_set.loc[self.training_set["distance"] == self.phase].sample(n=1)
+        rows = self.phase_rows[self.phase]
+        return self.training_set.iloc[[rows[np.random.randint(len(rows))]]]
+
+    def _expand_compact_row(self, row: "pd.DataFrame") -> Dict[str, np.ndarray]:
+        """
+        Rebuilds the state from a row of a compact training set: the sample outputs are looked up in the truth table
+        of the original program. With "resample_samples", a new subset of sample_size inputs is drawn per episode
+        (the distance of the row then only holds for the stored subset).
+        :param row: row of a compact training set
+        :return: state
+        """
+        sample_mask = int(row["sample_mask"].values[0])
+        if self.resample_samples:
+            codes = np.random.choice(2 ** self.n_bugs, size=self.sample_size, replace=False)
+            sample_mask = sum(1 << int(code) for code in codes)
+
+        cache_info = truth_table.cache_info() if self.stats is not None else None
+        expanded = expand_row(
+            program=int(row["program"].values[0]),
+            sample_mask=sample_mask,
+            modified_program=int(row["modified_program"].values[0]),
+            n_bugs=self.n_bugs
+        )
+
+        if self.stats is not None:
+            hits = truth_table.cache_info().hits - cache_info.hits
+            self.stats.add("truth_table_hits", hits)
+            self.stats.add("truth_table_misses", 1 - hits)
+
+        return {
+            "control_flow_matrix": expanded["modified_control_flow_matrix"].astype(OBSERVATION_DTYPE),
+            "sample_input_pairs": expanded["input_samples"].astype(OBSERVATION_DTYPE),
+            "sample_output_pairs": expanded["output_samples"].astype(OBSERVATION_DTYPE)
+        }
+
+    def set_phase(self, phase: int) -> None:
+        """
+        Sets the phase and the corresponding maximum number of steps.
+        :param phase: phase (i.e. distance of the training set rows)
+        :return: None
+        """
+        self.phase = phase
+        self.max_steps = self.base_max_steps + phase - min(self.phase_rows)
+
+    def _record_outcome(self, won: int) -> None:
+        """
+        Reports the outcome of the finished episode to the curriculum (if any).
+        :param won: 1 if the episode was won, else 0
+        :return: None
+        """
+        if self.curriculum is not None:
+            self.curriculum.update(self.phase, won)
 
     def increment_phase(self):
         """
@@ -0,0 +1,111 @@
+"""
+Vectorised BugBit environment. Steps all BugBit instances of a rollout worker together, such that the program
+executions of one vector step are run as one batch by the execution scheduler (cf. environments/execution_scheduler.py)
+instead of one get_outputs call per environment.
+"""
+
+# standard library imports
+import time
+from typing import List, Optional
+
+# 3rd party imports
+from ray.rllib.env.vector_env import VectorEnv
+from ray.rllib.utils.typing import EnvActionType, EnvObsType
+
+# local imports (i.e. our own code)
+from environments.envs.bugbit_env import BugBit
+from environments.execution_scheduler import ExecutionScheduler, get_scheduler
+
+
+class BugBitVectorEnv(VectorEnv):
+
+    def __init__(self, config: dict):
+        """
+        Initialises num_envs BugBit environments with the same config.
+
+        :param config: config of the BugBit environments, plus "num_envs" (number of environments, OPTIONAL, default 1)
+        :return: None
+        """
+        self.envs: List[BugBit] = [BugBit(config) for _ in range(config.get("num_envs", 1))]
+        self.scheduler: ExecutionScheduler = get_scheduler()
+        super().__init__(
+            observation_space=self.envs[0].observation_space,
+            action_space=self.envs[0].action_space,
+            num_envs=len(self.envs)
+        )
+
+    def vector_reset(self) -> List[EnvObsType]:
+        """
+        Resets all environments.
+
+        :return: observations of all environments
+        """
+        return [env.reset() for env in self.envs]
+
+    def reset_at(self, index: Optional[int] = None) -> EnvObsType:
+        """
+        Resets a single environment.
+
+        :param index: index of the environment
+        :return: observation of the environment
+        """
+        return self.envs[index or 0].reset()
+
+    def vector_step(self, actions: List[EnvActionType]):
+        """
+        Takes the actions in all environments. The program executions of all environments are submitted to the
+        scheduler and run with one batched call; identical programs are executed once.
+
+        :param actions: actions of all environments
+        :return: observations, rewards, dones and infos of all environments
+        """
+        keys = []
+        for env, action in zip(self.envs, actions):
+            job = env.apply_action(action)
+            keys.append(None if job is None else self.scheduler.submit(*job))
+
+        start = time.perf_counter()
+        self.scheduler.flush()
+        self._record_execution(keys, time.perf_counter() - start)
+
+        obs, rewards, dones, infos = [], [], [], []
+        for env, key in zip(self.envs, keys):
+            if key is None:
+                state, reward, done, info = env.state, env.reward, env.done, env.info
+            else:
+                state, reward, done, info = env.evaluate_outputs(self.scheduler.result(key))
+            obs.append(state)
+            rewards.append(reward)
+            dones.append(done)
+            infos.append(info)
+        return obs, rewards, dones, infos
+
+    def _record_execution(self, keys: list, seconds: float) -> None:
+        """
+        Splits the time of the batched call evenly between the instrumented environments that submitted a job.
+
+        :param keys: job keys of the environments (None if an environment did not submit a job)
+        :param seconds: time of the batched call
+        :return: None
+        """
+        submitted = [env for env, key in zip(self.envs, keys) if key is not None and env.stats is not None]
+        for env in submitted:
+            env.stats.add("executor_seconds", seconds / len(submitted))
+            env.stats.add("executor_calls")
+
+    def get_sub_environments(self) -> List[BugBit]:
+        """
+        Returns the BugBit environments (e.g. for increment_phase in the callbacks).
+
+        :return: list of environments
+        """
+        return self.envs
+
+    def try_render_at(self, index: Optional[int] = None):
+        """
+        Render method of the environment. Not implemented for bugbit.
+
+        :param index: index of the environment
+        :return: None
+        """
+        raise NotImplementedError("render() is not implemented")
@@ -0,0 +1,137 @@
+"""
+Multi-agent self-play Connect Four environment built on connectfour.ConnectFour.selfplay_step. Both seats are
+driven by RLlib policies, hence the opponent's moves are computed in batches by the policy (across all environments
+of a rollout worker) instead of move by move in Java.
+"""
+
+# standard library imports
+from typing import Dict, Optional
+
+# 3rd party imports
+import gym
+# noinspection PyPackageRequirements
+import jpype
+import numpy as np
+from ray.rllib.env.multi_agent_env import MultiAgentEnv
+from ray.rllib.utils.typing import MultiAgentDict
+
+# local imports (i.e. our own code)
+from utilities import utilities
+
+PLAYER_IDS: Dict[str, int] = {"player_1": 1, "player_2": 2}
+
+# reward of a win in ConnectFour.selfplay_step
+WIN_REWARD: float = 50.0
+
+
+# noinspection PyAbstractClass
+class ConnectFourSelfPlay(MultiAgentEnv):
+    """
+    Turn-based two player Connect Four. Only the player to move receives an observation in each step; every player
+    observes the board with its own tokens as 1 (like the agent in ConnectFourMVC), such that single-agent checkpoints
+    and self-play policies are interchangeable. Rewards follow ConnectFour.selfplay_step for the moving player; the
+    losing player receives the negated win reward when the game ends. An invalid move ends the game as a win of the
+    opponent, who then receives the win reward (the mover receives the invalid move penalty).
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        """
+        Initialises the environment.
+
+        :param config: dictionary containing the config for the environment (OPTIONAL, currently unused)
+        :return: None
+        """
+        super().__init__()
+        self.config = config or {}
+        self.action_space: gym.spaces.Space = gym.spaces.Discrete(7)
+        self.observation_space: gym.spaces.Space = gym.spaces.Box(0, 2, shape=(6, 7))
+        self._agent_ids = set(PLAYER_IDS.keys())
+        utilities.ensure_jvm()
+        self.connectfour: jpype.JClass = jpype.JClass("connectfour.ConnectFour")()
+        self.state: np.ndarray = np.array(self.connectfour.reset())
+        self.current_player: str = "player_1"
+        self.winner: int = 0
+        # rewards of a player that are handed out with its next observation
+        self.pending_rewards: Dict[str, float] = {agent_id: 0.0 for agent_id in PLAYER_IDS}
+
+    def reset(self) -> MultiAgentDict:
+        """
+        Resets the environment (e.g. after a game has ended). Player 1 moves first.
+
+        :return: observation of player 1
+        """
+        self.state = np.array(self.connectfour.reset())
+        self.current_player = "player_1"
+        self.winner = 0
+        self.pending_rewards = {agent_id: 0.0 for agent_id in PLAYER_IDS}
+        return {self.current_player: self._observation(self.current_player)}
+
+    def step(self, action_dict: MultiAgentDict):
+        """
+        Step function of the environment. Places the token of the player to move.
+
+        :param action_dict: dictionary with the action of the player to move
+        :return: observations, rewards, dones, infos (dictionaries keyed by agent id)
+        """
+        player = self.current_player
+        opponent = "player_2" if player == "player_1" else "player_1"
+
+        state, reward, done, _, winner = self.connectfour.selfplay_step(
+            int(action_dict[player]), PLAYER_IDS[player])
+        # noinspection PyTypeChecker
+        self.state = np.array(state)
+        reward = float(reward)
+        done = bool(done)
+        self.winner = int(winner)
+
+        self.pending_rewards[player] += reward
+
+        if done:
+            if self.winner == PLAYER_IDS[player]:
+                self.pending_rewards[opponent] -= reward
+            elif self.winner == PLAYER_IDS[opponent]:
+                # the move was invalid (a move cannot make the other player win)
+                self.pending_rewards[opponent] += WIN_REWARD
+            elif self.winner == 0:
+                self.pending_rewards[opponent] += reward
+            obs = {agent_id: self._observation(agent_id) for agent_id in PLAYER_IDS}
+            rewards = dict(self.pending_rewards)
+            dones = {agent_id: True for agent_id in PLAYER_IDS}
+            dones["__all__"] = True
+            infos = {
+                agent_id: {"winner": self.winner, "won": int(self.winner == PLAYER_IDS[agent_id])}
+                for agent_id in PLAYER_IDS
+            }
+            self.pending_rewards = {agent_id: 0.0 for agent_id in PLAYER_IDS}
+            return obs, rewards, dones, infos
+
+        # hand the turn (and the rewards collected since its last move) to the other player
+        self.current_player = opponent
+        obs = {opponent: self._observation(opponent)}
+        rewards = {opponent: self.pending_rewards[opponent]}
+        self.pending_rewards[opponent] = 0.0
+        return obs, rewards, {"__all__": False}, {}
+
+    def _observation(self, agent_id: str) -> np.ndarray:
+        """
+        Returns the board from the point of view of the given player (own tokens are 1, tokens of the other player 2).
+
+        :param agent_id: "player_1" or "player_2"
+        :return: (6, 7) board
+        """
+        board = self.state.astype(np.float32)
+        if agent_id == "player_1":
+            return board
+        inverted = board.copy()
+        inverted[board == 1] = 2
+        inverted[board == 2] = 1
+        return inverted
+
+    def render(self, mode: str = "human"):
+        """
+        Render method of the environment. Not implemented, use the GUI (connect_four_gui.py) instead.
+
+        :param mode:
+        :return: None
+        """
+        raise NotImplementedError("render() is not implemented")
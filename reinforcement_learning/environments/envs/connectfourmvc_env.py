@@ -3,7 +3,7 @@ The Connect Four environment Python adaptation of the original Java Implementati
 """
 # standard library imports
 
-from typing import List
+from typing import List, Optional
 
 # 3rd party imports
 import gym
@@ -12,8 +12,8 @@ import jpype
 import numpy as np
 
 # local imports (i.e. our own code)
-# noinspection PyUnresolvedReferences
 from utilities import utilities
+from utilities.jvm_bridge import ConnectFourBuffers
 
 
 # noinspection PyAbstractClass
@@ -31,18 +31,32 @@ class ConnectFourMVC(gym.Env):
         "render.modes": ["human"]
     }
 
-    def __init__(self):
+    def __init__(self, config: Optional[dict] = None):
         """
         Initialises the environment.
 
+        :param config: dictionary containing the config for the environment (OPTIONAL). Supported keys:
+        "opponent" ("greedy" or "negamax"), "search_depth" (maximum search depth in plies of the negamax opponent)
+        and "search_time_ms" (time budget per move in milliseconds of the negamax opponent, 0 = no limit)
         :return: None
         """
+        config = config or {}
         self.winner: int = 0
+        self.opponent: str = "greedy"
+        self.search_depth: int = 8
+        self.search_time_ms: int = 50
         self.action_space: gym.spaces.Space = gym.spaces.Discrete(7)
         self.observation_space: gym.spaces.Space = gym.spaces.Box(0, 2, shape=(6, 7))
+        utilities.ensure_jvm()
         self.connectfour: jpype.JClass = jpype.JClass("connectfour.ConnectFour")()
-        # noinspection PyTypeChecker
-        self.state: np.ndarray = np.array(self.connectfour.reset())
+        # board and result buffers shared with the JVM (cf. utilities/jvm_bridge.py)
+        self.buffers: ConnectFourBuffers = ConnectFourBuffers()
+        self.set_opponent(
+            opponent=config.get("opponent", "greedy"),
+            search_depth=config.get("search_depth", 8),
+            search_time_ms=config.get("search_time_ms", 50)
+        )
+        self.state: np.ndarray = self.buffers.reset(self.connectfour)
 
     def reset(self):
         """
@@ -52,7 +66,8 @@ class ConnectFourMVC(gym.Env):
         """
         self.reward = 0
         self.done = False
-        return np.array(self.connectfour.reset())
+        self.state = self.buffers.reset(self.connectfour)
+        return self.state
 
     def step(self, action: int) -> list:
         """
@@ -61,11 +76,7 @@ class ConnectFourMVC(gym.Env):
         :param action: Integer representing the action to take
         :return: state, reward, done, info
         """
-        self.state, self.reward, self.done, self.info, winner = self.connectfour.step(action)
-        # noinspection PyTypeChecker
-        self.state = np.array(self.state)
-        self.reward = int(self.reward)
-        self.done = bool(self.done)
+        self.state, self.reward, self.done, winner = self.buffers.step(self.connectfour, action)
         self.info = {}
 
         return [self.state, self.reward, self.done, self.info]
@@ -94,6 +105,21 @@ class ConnectFourMVC(gym.Env):
         """
         return self.winner
 
+    def set_opponent(self, opponent: str, search_depth: Optional[int] = 8, search_time_ms: Optional[int] = 50):
+        """
+        Selects the opponent that answers the agent's moves in step() and in get_opponent_action().
+
+        :param opponent: either "greedy" (heuristic agent) or "negamax" (search-based agent)
+        :param search_depth: maximum search depth in plies of the search-based agent
+        :param search_time_ms: time budget per move in milliseconds of the search-based agent (0 = no limit)
+        :return: None
+        """
+        if opponent not in ("greedy", "negamax"):
+            raise ValueError(f"opponent must be either 'greedy' or 'negamax', got '{opponent}'")
+        self.opponent = opponent
+        self.search_depth, self.search_time_ms = int(search_depth), int(search_time_ms)
+        self.connectfour.setOpponent(opponent, int(search_depth), int(search_time_ms))
+
     def get_greedy_action(self, agent_id: int) -> int:
         """
         Returns the next action of the greedy player.
@@ -103,6 +129,26 @@ class ConnectFourMVC(gym.Env):
         """
         return int(self.connectfour.getGreedyAction(agent_id))
 
+    def get_search_action(self, agent_id: int) -> int:
+        """
+        Returns the next action of the search-based (alpha-beta negamax) player.
+
+        :param agent_id: specifies which ´id´ the search-based agent is (1 or 2)
+        :return: int indicating the next action of the search-based player.
+        """
+        return int(self.connectfour.getSearchAction(agent_id))
+
+    def get_opponent_action(self, agent_id: int) -> int:
+        """
+        Returns the next action of the opponent selected in the environment config (greedy or negamax).
+
+        :param agent_id: specifies which ´id´ the opponent is (1 or 2)
+        :return: int indicating the next action of the opponent.
+        """
+        if self.opponent == "negamax":
+            return self.get_search_action(agent_id)
+        return self.get_greedy_action(agent_id)
+
     def interactive_step(self, action: int, agent_id: int) -> list:
         """
         Interactive step such that only one action is taken at a time (either RL agent or heuristic/greedy agent)
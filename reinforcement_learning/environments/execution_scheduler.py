@@ -0,0 +1,90 @@
+"""
+Worker-local execution scheduler. Environments of one rollout worker submit their program executions (control flow
+matrix and inputs) to the scheduler of their process; the scheduler executes all pending jobs with one batched call
+(one round trip to the executor sidecar, if configured) and executes identical jobs only once.
+"""
+
+# standard library imports
+import os
+from typing import Dict, List, Optional, Tuple
+
+# 3rd party imports
+import numpy as np
+
+# local imports (i.e. our own code)
+from dataset_generators.utils import execute_jobs
+
+# identifies a job: number of bugs, bytes of the control flow matrix, bytes of the inputs
+JobKey = Tuple[int, bytes, bytes]
+
+# scheduler of the current process, (re-)created per process id (cf. get_scheduler())
+_scheduler: Optional["ExecutionScheduler"] = None
+
+
+class ExecutionScheduler:
+    """
+    Collects program executions and runs them in batches. Usage:
+
+        key = scheduler.submit(n_bugs, prog, ins)  # for every environment
+        scheduler.flush()                          # once per vector step
+        outs = scheduler.result(key)
+    """
+
+    def __init__(self):
+        self.pid: int = os.getpid()
+        self._pending: Dict[JobKey, Tuple[int, np.ndarray, np.ndarray]] = {}
+        self._results: Dict[JobKey, List[np.ndarray]] = {}
+        # statistics: submitted jobs, executed (i.e. unique) jobs and batched calls
+        self.submitted: int = 0
+        self.executed: int = 0
+        self.calls: int = 0
+
+    def submit(self, n_bugs: int, prog: np.ndarray, ins: np.ndarray) -> JobKey:
+        """
+        Adds a job to the next batch. Jobs with the same control flow matrix and inputs are executed once.
+
+        :param n_bugs: number of bugs of the program
+        :param prog: (n, 2n) control flow matrix of the program
+        :param ins: (m, n) program inputs
+        :return: key to retrieve the outputs with after flush()
+        """
+        prog = np.ascontiguousarray(prog, dtype=np.int8)
+        ins = np.ascontiguousarray(ins, dtype=np.int8)
+        key = (n_bugs, prog.tobytes(), ins.tobytes())
+        self._pending.setdefault(key, (n_bugs, prog, ins))
+        self.submitted += 1
+        return key
+
+    def flush(self) -> None:
+        """
+        Executes all pending jobs with one batched call. The outputs of the previous batch are discarded.
+
+        :return: None
+        """
+        keys = list(self._pending.keys())
+        jobs = list(self._pending.values())
+        self._pending = {}
+        self._results = dict(zip(keys, execute_jobs(jobs))) if jobs else {}
+        self.executed += len(jobs)
+        self.calls += int(bool(jobs))
+
+    def result(self, key: JobKey) -> List[np.ndarray]:
+        """
+        Returns the outputs of a job of the last batch.
+
+        :param key: key returned by submit()
+        :return: program outputs of len(ins)
+        """
+        return self._results[key]
+
+
+def get_scheduler() -> ExecutionScheduler:
+    """
+    Returns the scheduler of the current process. A forked process gets a scheduler of its own.
+
+    :return: scheduler
+    """
+    global _scheduler
+    if _scheduler is None or _scheduler.pid != os.getpid():
+        _scheduler = ExecutionScheduler()
+    return _scheduler
@@ -0,0 +1,39 @@
+"""
+Lightweight instrumentation of the BugBit hot path. With env_config["instrumentation"] = True, every BugBit
+environment holds an EnvStats instance and adds counters and timings to it:
+
+- executor_calls / executor_seconds: program executions of step() (with BugBitVectorEnv: the time of the batched call,
+  split evenly between the environments that submitted a job)
+- reset_sampling_seconds: sampling the row of the training set in reset()
+- observation_seconds: building the observation from the row (e.g. expanding a row of a compact training set)
+- truth_table_hits / truth_table_misses: lookups of the truth table cache of compact training sets
+
+CustomMetricCallbacks.on_episode_end() moves the values of the episode's environment into the custom metrics of the
+episode. With the switch off (default), the environments hold no EnvStats and skip the timers.
+"""
+
+# standard library imports
+from collections import defaultdict
+from typing import Dict
+
+
+class EnvStats:
+
+    def __init__(self):
+        self.values: Dict[str, float] = defaultdict(float)
+
+    def add(self, name: str, value: float = 1.0) -> None:
+        """
+        :param name: name of the counter / timer
+        :param value: value added to it
+        :return: None
+        """
+        self.values[name] += value
+
+    def pop(self) -> Dict[str, float]:
+        """
+        :return: values since the last pop() (the values are reset)
+        """
+        values = dict(self.values)
+        self.values.clear()
+        return values
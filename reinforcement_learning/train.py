@@ -14,33 +14,82 @@ from ray.tune.schedulers import ASHAScheduler
 import pandas as pd
 
 # local imports (i.e. our own code)
-# noinspection PyUnresolvedReferences
-from utilities import utilities
+from utilities import utilities, jvm_executor
+from dataset_generators import dataset_cache
 # noinspection PyUnresolvedReferences
 from utilities import registration
 from callbacks.custom_metric_callbacks import CustomMetricCallbacks
+from callbacks.metrics_logger_callback import LocalMetricsLoggerCallback
+
+utilities.ensure_paths()
 
-# training set path and pretrained_model_path must point to the respective files in the data directory
+# the RL training set is requested by its parameters from the dataset cache (generated on the first request, cf.
+# dataset_generators/dataset_cache.py); pretrained_model_path must point to the respective file in the data directory
 
 num_bugs: int = 3
 sample_size = int((2 ** num_bugs) / 2)
+# OPTIONAL: name of a training set file in data/training_sets/rl_training_sets, used instead of the dataset cache
 rl_training_set_file_name: str = ""
 pretrained_model_file_name: str = ""
 
 global_config = {
+    "training_set_params": {
+        "size": 10000,
+        "n_bugs": num_bugs,
+        "sample_size": sample_size,
+        "exact_distances": True,
+        "compact": False,
+        "seed": 10,
+    },
     "training_set_path": f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/training_sets/rl_training_sets/"
                          f"{rl_training_set_file_name}",
     "pretraining": True,
     "pretrained_model_path": f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/model_weights"
                              f"/{pretrained_model_file_name}",
+    # if True, all rollout workers execute BugBit programs in one shared JVM (cf. utilities/jvm_executor.py)
+    "executor_sidecar": False,
+    # where the results are logged: "wandb" (needs the wandb_key_file and network access), "jsonl" or "sqlite" (local
+    # file in data/metrics, cf. utilities/metrics.py) or "none"
+    "metrics_backend": "wandb",
 }
 
-if not rl_training_set_file_name or (global_config["pretraining"] and not pretrained_model_file_name):
-    raise ValueError("rl_training_set_file_name and/or pretrained_model_path must be set")
+if global_config["pretraining"] and not pretrained_model_file_name:
+    raise ValueError("pretrained_model_file_name must be set")
 
 if __name__ == "__main__":
-    # load training set from pickle
-    training_set = pd.read_pickle(global_config["training_set_path"])
+    if global_config["metrics_backend"] == "wandb":
+        utilities.ensure_wandb_key()
+    utilities.configure_warnings()
+
+    if global_config["metrics_backend"] == "wandb":
+        # adjust the entries here to conform to your wandb environment
+        # cf. https://docs.wandb.ai/ and https://docs.ray.io/en/master/tune/examples/tune-wandb.html
+        logger_callbacks = [
+            WandbLoggerCallback(
+                api_key_file="wandb_key_file",
+                project="ray-tune-bugbit",
+                entity="mtp-ai-board-game-engine",
+                group="final-submission-testing",
+            ),
+        ]
+    elif global_config["metrics_backend"] in ("jsonl", "sqlite"):
+        logger_callbacks = [
+            LocalMetricsLoggerCallback(project="ray-tune-bugbit", file_format=global_config["metrics_backend"])
+        ]
+    else:
+        logger_callbacks = []
+
+    if rl_training_set_file_name:
+        # load training set from pickle
+        training_set = pd.read_pickle(global_config["training_set_path"])
+    else:
+        # generate the training set once, before the trials start; the environments of the workers read it from the
+        # cache (cf. BugBit.parse_config) instead of receiving it with the config
+        dataset_cache.rl_training_set(**global_config["training_set_params"])
+        training_set = None
+
+    # start the executor sidecar before ray such that the workers inherit BUGBIT_EXECUTOR_SOCKET and _AUTHKEY
+    sidecar = jvm_executor.start_sidecar() if global_config["executor_sidecar"] else None
 
     # initialise ray (set local_mode to True for debugging)
     ray.init()
@@ -63,16 +112,7 @@ if __name__ == "__main__":
             reduction_factor=3,
             brackets=1
         ),  # scheduler for training (i.e. predictive termination)
-        callbacks=[
-            # adjust the entries here to conform to your wandb environment
-            # cf. https://docs.wandb.ai/ and https://docs.ray.io/en/master/tune/examples/tune-wandb.html
-            WandbLoggerCallback(
-                api_key_file="wandb_key_file",
-                project="ray-tune-bugbit",
-                entity="mtp-ai-board-game-engine",
-                group="final-submission-testing",
-            ),
-        ],
+        callbacks=logger_callbacks,
         # trainer config
         config={
             "callbacks": CustomMetricCallbacks,
@@ -85,6 +125,9 @@ if __name__ == "__main__":
             # as below. Else: the model is initialised with random weights and one can modify the model config as needed.
             "model": {
                 "custom_model": "custom_torch_fcnn",
+                # keep the uint8 observations of the environment in the sample batches instead of flattening them to
+                # float32 (the model casts them in its first layer)
+                "_disable_preprocessor_api": True,
                 "custom_model_config": {
                     "fcnet_hiddens": [256, 256, 256],
                     "fcnet_activation": torch.nn.ReLU,
@@ -99,10 +142,28 @@ if __name__ == "__main__":
             "env_config": {
                 "n_bugs": num_bugs,  # number of bugs
                 "training_set": training_set,
-                "max_steps": 3,  # the maximum number of steps before the game is terminated
+                "training_set_params": global_config["training_set_params"],
+                "max_steps": 3,  # the maximum number of steps before the game is terminated (in the first phase)
                 "sample_size": sample_size,  # MUST be set to (n_bugs^2)/2
                 "pretraining": global_config["pretraining"],
                 "pretrained_model_path": global_config["pretrained_model_path"],
+                # if True, the environments record timings of the hot path which CustomMetricCallbacks reports as
+                # custom metrics "env_*" (cf. environments/instrumentation.py)
+                "instrumentation": False,
+                # every environment samples the phase of its episodes from its own rolling win rates per phase, weighted
+                # towards the lowest phase it has not mastered yet (cf. environments/curriculum.py). None: all
+                # environments are moved to the next phase when game_history_mean passes 0.85
+                "curriculum": {
+                    "window": 50,
+                    "threshold": 0.85,
+                    "min_episodes": 20,
+                    "frontier_weight": 0.6,
+                    "lookahead_weight": 0.2,
+                    "review_weight": 0.2,
+                },
             }
         },
     )
+
+    if sidecar is not None:
+        sidecar.terminate()
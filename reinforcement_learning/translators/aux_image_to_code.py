@@ -16,9 +16,12 @@ import jpype
 import numpy as np
 
 # local imports
-# noinspection PyUnresolvedReferences
 from utilities import utilities
 
+# the translator is bound to the Bug+ classes, hence the JVM is started when this module is imported
+utilities.ensure_paths()
+utilities.ensure_jvm()
+
 # get java classes
 NegBugsBasicArithmetic = jpype.JClass(
     "de.bugplus.examples.development.NegBugsBasicArithmetic"
@@ -36,8 +39,6 @@ BugplusProgramInstanceImpl = jpype.JClass(
 BugplusThread = jpype.JClass("de.bugplus.development.BugplusThread")
 BugplusDevelopment = jpype.JPackage("de.bugplus.development")
 
-logfile = open('logfile.txt', "w")
-
 
 class Translator:
     # The identifying number for each piece and field
@@ -9,7 +9,6 @@ from io import BytesIO
 from typing import List
 
 # 3rd party imports
-from PIL import Image
 import numpy as np
 
 parts = {
@@ -98,6 +97,8 @@ def translate_matrix_to_board(mat: np.ndarray) -> str:
     :param mat: auxiliary matrix indicating position of TT pieces on board.
     :return: formatted_str: image for upload to Jesse Crossen TT simulator in base 64.
     """
+    from PIL import Image
+
     mat = np.array(mat)
     img = Image.open('assets/long_board.png')
     pixel_map = img.load()
@@ -6,7 +6,6 @@ from typing import List
 
 # 3rd party imports
 import numpy as np
-from igraph import *
 
 
 class PartialOrderer:
@@ -40,6 +39,8 @@ class PartialOrderer:
         :param fathers: List of n sub-lists
         :return: ranking: List of page ranks of length n
         """
+        from igraph import Graph, plot
+
         print(f"Children: {fathers}")
         all_nodes = [i for i in range(len(fathers))]
         ranking = []
@@ -11,26 +11,25 @@ This image is then used translator_image_to_code.py
 
 # standard library imports
 import os
+from typing import TYPE_CHECKING
 
 # 3rd party imports
-import ray
-from ray import serve
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
-# local imports (i.e. our own code)
-from aux_image_to_code import Translator
-# noinspection PyUnresolvedReferences
+# local imports
 from utilities import utilities
 
+if TYPE_CHECKING:
+    from aux_image_to_code import Translator
+
 # initialise FastAPI API instance
 app = FastAPI()
 
 
-@serve.deployment
-@serve.ingress(app)
+# deployed by deploy(), such that importing this module neither imports ray nor starts the JVM
 class TranslationLayer:
-    translator: Translator
+    translator: "Translator"
 
     def __int__(self):
         app.add_middleware(
@@ -51,6 +50,8 @@ class TranslationLayer:
         :param matrix: matrix coded as string
         :return: None
         """
+        from aux_image_to_code import Translator
+
         self.translator = Translator()
         self.translator.matrix_to_bugbit_code(matrix)
         return None
@@ -63,23 +64,41 @@ class TranslationLayer:
         :param request: request object
         :return: None
         """
+        from aux_image_to_code import Translator
 
         self.translator = Translator()
         var = await request.json()
         self.translator.matrix_to_bugbit_code(var)
 
 
+def deploy() -> None:
+    """
+    Connects to the running ray cluster and deploys the TranslationLayer with ray serve.
+
+    :return: None
+    """
+    import ray
+    from ray import serve
+
+    ray.init(address="auto", ignore_reinit_error=True, namespace="serve")
+    serve.start(detached=True)  # or False
+
+    serve.deployment(serve.ingress(app)(TranslationLayer)).deploy()
+
+
 if __name__ == "__main__":
+    utilities.ensure_paths()
+
     # start ray server
     os.system("ray stop")
     os.system("ray start --head")
     os.system("serve start --http-host=127.0.0.1 --http-port=8000")
 
-    ray.init(address="auto", ignore_reinit_error=True, namespace="serve")
-    serve.start(detached=True)  # or False
-
-    TranslationLayer.deploy()
+    deploy()
     # start TTSIM GUI
+    working_directory = os.getcwd()
     os.chdir(os.environ['TTSIM_PATH'])
-    os.system("make server")
-    os.chdir(os.getcwd())
+    try:
+        os.system("make server")
+    finally:
+        os.chdir(working_directory)
@@ -5,14 +5,14 @@ and aux_matrix_to_image.py
 """
 
 # standard library imports
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 # 3rd party imports
-from igraph import *
+import numpy as np
 
 # local imports (i.e. our own code)
 from aux_partial_orderer import PartialOrderer
-from aux_matrix_to_image import *
+from aux_matrix_to_image import parts, open_new_board
 
 
 # noinspection PyShadowingNames
@@ -36,6 +36,8 @@ class RankBasedTranslator:
         :param rows: number of rows in the TT grid
         :param columns: number of columns in the TT grid
         """
+        from igraph import Graph
+
         self.rows = rows
         self.columns = columns
         self.matrix = np.zeros(shape=(rows, columns), dtype=np.int64)
@@ -276,6 +278,8 @@ class RankBasedTranslator:
 
 
 def cf_matrix_to_board(mat):
+    from igraph import plot
+
     ranking = PartialOrderer.calc_rank(PartialOrderer.order(mat))
     translator = RankBasedTranslator(27, 15)
 
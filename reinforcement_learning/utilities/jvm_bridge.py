@@ -0,0 +1,188 @@
+"""
+jvm_bridge
+==========
+Zero-copy array bridge between numpy and the JVM. Passing a numpy array to a Java method expecting int[][] makes JPype
+convert it element by element, and every Java array that is returned has to be converted back with np.array(...).
+Instead, the hot paths use direct NIO IntBuffers that share their memory with a numpy array: Python writes the
+arguments into the numpy view, the flat-buffer Java overloads (CF_Translated.executeFlat, ConnectFour.stepFlat and
+ConnectFour.resetFlat) read and write the buffers in place, and Python reads the results from the same numpy view.
+
+Running this module (python -m utilities.jvm_bridge from the reinforcement_learning directory) measures the per-call
+overhead of the int[][] and the flat-buffer calls.
+"""
+
+# standard library imports
+import threading
+import time
+from typing import Dict, Tuple
+
+# 3rd party imports
+import numpy as np
+
+# local imports (i.e. our own code)
+from utilities import utilities
+
+# buffers of the current thread for execute_flat(), keyed by their name (cf. _thread_buffer())
+_thread_local = threading.local()
+
+
+class DirectIntBuffer:
+    """
+    Block of int32 memory that is visible as a numpy array (array) and as a java.nio.IntBuffer (buffer).
+    Both views share the memory, hence writes on either side are visible to the other one without copying.
+    """
+
+    def __init__(self, size: int):
+        """
+        :param size: number of int32 elements
+        """
+        utilities.ensure_jvm()
+        # noinspection PyPackageRequirements
+        import jpype
+        # noinspection PyPackageRequirements
+        import jpype.nio
+
+        self.size: int = size
+        # the bytearray owns the memory; it must stay alive as long as the java buffer is used
+        self._memory: bytearray = bytearray(4 * max(size, 1))
+        self.array: np.ndarray = np.frombuffer(self._memory, dtype=np.int32)[:size]
+        byte_order = jpype.JClass("java.nio.ByteOrder").nativeOrder()
+        self.buffer = jpype.nio.convertToDirectBuffer(self._memory).order(byte_order).asIntBuffer()
+
+
+def _thread_buffer(name: str, size: int) -> DirectIntBuffer:
+    """
+    Returns a buffer of at least the given size that is reused by all calls of the current thread.
+
+    :param name: name of the buffer
+    :param size: minimum number of int32 elements
+    :return: buffer
+    """
+    buffers: Dict[str, DirectIntBuffer] = getattr(_thread_local, "buffers", None)
+    if buffers is None:
+        buffers = _thread_local.buffers = {}
+    if name not in buffers or buffers[name].size < size:
+        buffers[name] = DirectIntBuffer(size=size)
+    return buffers[name]
+
+
+def execute_flat(cf_translated, n_bugs: int, prog: np.ndarray, ins: np.ndarray) -> np.ndarray:
+    """
+    Executes a program for all given inputs with one call of CF_Translated.executeFlat.
+
+    :param cf_translated: the JClass de.bugplus.examples.development.CF_Translated
+    :param n_bugs: number of bugs of the program
+    :param prog: (n, 2n) control flow matrix of the program
+    :param ins: (m, n) program inputs
+    :return: (m, n) program outputs
+    """
+    ins = np.asarray(ins).reshape(-1, n_bugs)
+    n_inputs = len(ins)
+
+    cf_buffer = _thread_buffer("cf", 2 * n_bugs * n_bugs)
+    ins_buffer = _thread_buffer("ins", n_inputs * n_bugs)
+    outs_buffer = _thread_buffer("outs", n_inputs * n_bugs)
+
+    cf_buffer.array[:2 * n_bugs * n_bugs] = np.asarray(prog).reshape(-1)
+    ins_buffer.array[:n_inputs * n_bugs] = ins.reshape(-1)
+
+    cf_translated.executeFlat(n_bugs, cf_buffer.buffer, ins_buffer.buffer, n_inputs, outs_buffer.buffer)
+
+    return outs_buffer.array[:n_inputs * n_bugs].reshape(n_inputs, n_bugs).astype(np.int64)
+
+
+class ConnectFourBuffers:
+    """
+    Board and result buffers of one connectfour.ConnectFour instance (cf. ConnectFourMVC).
+    """
+
+    def __init__(self, height: int = 6, width: int = 7):
+        self.shape: Tuple[int, int] = (height, width)
+        self.board: DirectIntBuffer = DirectIntBuffer(size=height * width)
+        # reward, done, winner
+        self.result: DirectIntBuffer = DirectIntBuffer(size=3)
+
+    def reset(self, connectfour) -> np.ndarray:
+        """
+        :param connectfour: instance of connectfour.ConnectFour
+        :return: (6, 7) board after the reset
+        """
+        connectfour.resetFlat(self.board.buffer)
+        return self.board.array.reshape(self.shape).copy()
+
+    def step(self, connectfour, action: int) -> Tuple[np.ndarray, int, bool, int]:
+        """
+        :param connectfour: instance of connectfour.ConnectFour
+        :param action: column of the agent's token
+        :return: board, reward, done, winner
+        """
+        connectfour.stepFlat(int(action), self.board.buffer, self.result.buffer)
+        reward, done, winner = self.result.array.tolist()
+        return self.board.array.reshape(self.shape).copy(), reward, bool(done), winner
+
+
+def _time_per_call(fn, repeats: int) -> float:
+    """
+    :param fn: function without arguments
+    :param repeats: number of calls
+    :return: mean wall time per call in microseconds
+    """
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def benchmark(n_bugs: int = 3, repeats: int = 2000) -> Dict[str, float]:
+    """
+    Measures the per-call overhead of the int[][] calls and the flat-buffer calls for program execution (all inputs
+    of a program) and Connect Four steps, and prints the results.
+
+    :param n_bugs: number of bugs of the benchmarked program
+    :param repeats: number of calls per measurement
+    :return: mean wall time per call in microseconds, keyed by the name of the measurement
+    """
+    utilities.ensure_jvm()
+    # noinspection PyPackageRequirements
+    import jpype
+    from dataset_generators.utils import generate_control_flow_sequentially, generate_ins
+
+    cf_translated = jpype.JClass("de.bugplus.examples.development.CF_Translated")
+    prog = generate_control_flow_sequentially(n_bugs=n_bugs)
+    ins = generate_ins(n_bugs=n_bugs)
+
+    def execute_int_arrays():
+        return [np.array(cf_translated.execute(n_bugs, prog, elem), dtype=np.int64) for elem in ins]
+
+    def execute_buffers():
+        return execute_flat(cf_translated, n_bugs=n_bugs, prog=prog, ins=ins)
+
+    assert np.array_equal(np.array(execute_int_arrays()), execute_buffers())
+
+    connectfour = jpype.JClass("connectfour.ConnectFour")()
+    buffers = ConnectFourBuffers()
+
+    def step_int_arrays():
+        connectfour.reset()
+        state, reward, done, _, winner = connectfour.step(3)
+        return np.array(state), int(reward), bool(done), int(winner)
+
+    def step_buffers():
+        buffers.reset(connectfour)
+        return buffers.step(connectfour, 3)
+
+    results = {
+        "execute (int[][], one call per input)": _time_per_call(execute_int_arrays, repeats),
+        "execute (IntBuffer, one call per program)": _time_per_call(execute_buffers, repeats),
+        "connect four reset + step (int[][] / LinkedList)": _time_per_call(step_int_arrays, repeats),
+        "connect four reset + step (IntBuffer)": _time_per_call(step_buffers, repeats),
+    }
+    for name, micros in results.items():
+        print(f"{name}: {micros:.1f} us per call")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark(n_bugs=3)
+    benchmark(n_bugs=5, repeats=200)
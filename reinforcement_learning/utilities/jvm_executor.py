@@ -0,0 +1,248 @@
+"""
+jvm_executor
+============
+Optional executor sidecar: one local process hosts a warmed-up JVM with the Bug+ jar and executes BugBit programs
+(de.bugplus.examples.development.CF_Translated) on behalf of all other local processes (rollout workers, dataset
+generator processes, ...). Clients talk to the sidecar over a Unix socket; every request carries a batch of programs,
+each with all of its inputs, such that a specification costs one round trip. The socket is only accessible by the
+current user and every connection is authenticated with a secret key (BUGBIT_EXECUTOR_AUTHKEY, hex encoded).
+
+Usage:
+
+- start the sidecar with `python -m utilities.jvm_executor` from the reinforcement_learning directory (it generates a
+  key and prints it if BUGBIT_EXECUTOR_AUTHKEY is not set) or call start_sidecar() in the driver before any worker is
+  started
+- export BUGBIT_EXECUTOR_SOCKET and BUGBIT_EXECUTOR_AUTHKEY (start_sidecar() does this for the current process and its
+  children)
+
+While BUGBIT_EXECUTOR_SOCKET is set, dataset_generators.utils.get_outputs() executes through the sidecar and the
+calling process never starts a JVM of its own.
+"""
+
+# standard library imports
+import os
+import sys
+import time
+import threading
+import subprocess
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from typing import List, Optional, Sequence, Tuple
+
+# 3rd party imports
+import numpy as np
+
+# local imports (i.e. our own code)
+from utilities import utilities, jvm_bridge
+
+# environment variable holding the path to the socket of the sidecar
+SOCKET_ENV_VAR: str = "BUGBIT_EXECUTOR_SOCKET"
+# environment variable holding the key (hex encoded) that authenticates the connections to the sidecar
+AUTHKEY_ENV_VAR: str = "BUGBIT_EXECUTOR_AUTHKEY"
+
+DEFAULT_SOCKET_PATH: str = "/tmp/bugbit_executor.sock"
+
+# a job consists of the number of bugs, the (n, 2n) control flow matrix and the (m, n) inputs of a program
+Job = Tuple[int, np.ndarray, np.ndarray]
+
+# client of the current process, (re-)created per process id (cf. get_client())
+_client: Optional["ExecutorClient"] = None
+
+
+class ExecutorError(RuntimeError):
+    """
+    Raised by the client if the sidecar could not execute a program (e.g. an invalid control flow).
+    """
+
+
+class ExecutorClient:
+    """
+    Client of the executor sidecar. Holds one connection per process; not thread safe.
+    """
+
+    def __init__(self, socket_path: str, authkey: bytes):
+        self.socket_path: str = socket_path
+        self.pid: int = os.getpid()
+        self.connection: Connection = Client(address=socket_path, family="AF_UNIX", authkey=authkey)
+
+    def execute_batch(self, jobs: Sequence[Job]) -> List[np.ndarray]:
+        """
+        Executes a batch of programs in one round trip.
+
+        :param jobs: sequence of (n_bugs, control flow matrix, inputs)
+        :return: (m, n) outputs for every job
+        """
+        self.connection.send([
+            (int(n_bugs), np.asarray(prog, dtype=np.int8), np.asarray(ins, dtype=np.int8))
+            for n_bugs, prog, ins in jobs
+        ])
+        replies = self.connection.recv()
+
+        results = []
+        for status, payload in replies:
+            if status != "ok":
+                raise ExecutorError(payload)
+            results.append(payload.astype(np.int64))
+        return results
+
+    def execute(self, n_bugs: int, prog: np.ndarray, ins: np.ndarray) -> np.ndarray:
+        """
+        Executes one program for all given inputs.
+
+        :param n_bugs: number of bugs of the program
+        :param prog: control flow matrix of the program
+        :param ins: program inputs
+        :return: (m, n) program outputs
+        """
+        return self.execute_batch([(n_bugs, prog, ins)])[0]
+
+    def close(self) -> None:
+        """
+        Closes the connection to the sidecar.
+
+        :return: None
+        """
+        self.connection.close()
+
+
+def get_client() -> Optional[ExecutorClient]:
+    """
+    Returns the client of the current process if BUGBIT_EXECUTOR_SOCKET is set, None otherwise. A forked process
+    opens a connection of its own instead of sharing the one of its parent.
+
+    :return: client or None
+    """
+    global _client
+    socket_path = os.getenv(SOCKET_ENV_VAR)
+    if not socket_path:
+        return None
+    if _client is None or _client.socket_path != socket_path or _client.pid != os.getpid():
+        authkey = os.getenv(AUTHKEY_ENV_VAR)
+        if not authkey:
+            raise RuntimeError(f"{SOCKET_ENV_VAR} is set, but {AUTHKEY_ENV_VAR} is not")
+        _client = ExecutorClient(socket_path=socket_path, authkey=bytes.fromhex(authkey))
+    return _client
+
+
+def _execute_jobs(cf_translated, jobs: Sequence[Job]) -> List[Tuple[str, object]]:
+    """
+    Executes the jobs of a request in the JVM of the sidecar.
+
+    :param cf_translated: the JClass de.bugplus.examples.development.CF_Translated
+    :param jobs: sequence of (n_bugs, control flow matrix, inputs)
+    :return: ("ok", outputs) or ("error", message) for every job
+    """
+    replies = []
+    for n_bugs, prog, ins in jobs:
+        try:
+            outs = jvm_bridge.execute_flat(cf_translated, n_bugs=n_bugs, prog=prog, ins=ins)
+            replies.append(("ok", outs.astype(np.int8)))
+        except Exception as e:
+            replies.append(("error", str(e)))
+    return replies
+
+
+def _serve_connection(connection: Connection, cf_translated, lock: threading.Lock) -> None:
+    """
+    Answers the requests of one client until it disconnects.
+
+    :param connection: connection to the client
+    :param cf_translated: the JClass de.bugplus.examples.development.CF_Translated
+    :param lock: lock serialising the executions (the Bug+ library is a singleton)
+    :return: None
+    """
+    with connection:
+        while True:
+            try:
+                jobs = connection.recv()
+            except (EOFError, OSError):
+                return
+            with lock:
+                replies = _execute_jobs(cf_translated, jobs)
+            connection.send(replies)
+
+
+def serve(authkey: bytes, socket_path: str = DEFAULT_SOCKET_PATH) -> None:
+    """
+    Starts the JVM and serves execution requests on the given Unix socket until the process is terminated.
+
+    :param authkey: key the clients have to authenticate with
+    :param socket_path: path of the Unix socket
+    :return: None
+    """
+    utilities.ensure_jvm()
+    # noinspection PyPackageRequirements
+    import jpype
+    cf_translated = jpype.JClass("de.bugplus.examples.development.CF_Translated")
+
+    # warm up the JVM (class loading, JIT) before the first client connects
+    _execute_jobs(cf_translated, [(3, np.zeros(shape=(3, 6), dtype=np.int8), np.zeros(shape=(1, 3), dtype=np.int8))])
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    lock = threading.Lock()
+    # only the current user may connect: the socket is created without permissions for the group and others
+    umask = os.umask(0o077)
+    try:
+        listener = Listener(address=socket_path, family="AF_UNIX", authkey=authkey)
+    finally:
+        os.umask(umask)
+
+    with listener:
+        print(f"BugBit executor listening on {socket_path}")
+        while True:
+            try:
+                connection = listener.accept()
+            except (AuthenticationError, EOFError, ConnectionError):
+                # the client did not authenticate
+                continue
+            threading.Thread(target=_serve_connection, args=(connection, cf_translated, lock), daemon=True).start()
+
+
+def start_sidecar(socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = 60.0) -> subprocess.Popen:
+    """
+    Starts the sidecar with a new random key in a separate process, waits until it accepts connections and exports
+    BUGBIT_EXECUTOR_SOCKET and BUGBIT_EXECUTOR_AUTHKEY to the current process (and hence to the processes it starts
+    afterwards, e.g. ray workers).
+
+    :param socket_path: path of the Unix socket
+    :param timeout: seconds to wait for the sidecar
+    :return: handle of the sidecar process
+    """
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    authkey = os.urandom(32).hex()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "utilities.jvm_executor", socket_path],
+        cwd=f"{os.path.dirname(os.path.abspath(__file__))}/..",
+        env={**os.environ, AUTHKEY_ENV_VAR: authkey}
+    )
+
+    deadline = time.time() + timeout
+    while True:
+        try:
+            Client(address=socket_path, family="AF_UNIX", authkey=bytes.fromhex(authkey)).close()
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            if process.poll() is not None:
+                raise RuntimeError(f"executor sidecar exited with code {process.returncode}")
+            if time.time() > deadline:
+                process.kill()
+                raise TimeoutError(f"executor sidecar did not start within {timeout} seconds")
+            time.sleep(0.1)
+
+    os.environ[SOCKET_ENV_VAR] = socket_path
+    os.environ[AUTHKEY_ENV_VAR] = authkey
+    return process
+
+
+if __name__ == "__main__":
+    if not os.getenv(AUTHKEY_ENV_VAR):
+        os.environ[AUTHKEY_ENV_VAR] = os.urandom(32).hex()
+        print(f"export {AUTHKEY_ENV_VAR}={os.environ[AUTHKEY_ENV_VAR]}")
+    serve(
+        authkey=bytes.fromhex(os.environ[AUTHKEY_ENV_VAR]),
+        socket_path=sys.argv[1] if len(sys.argv) > 1 else os.getenv(SOCKET_ENV_VAR, DEFAULT_SOCKET_PATH)
+    )
@@ -0,0 +1,252 @@
+"""
+metrics
+=======
+Pluggable metrics backends for the training entry points (train.py, pretrain_network, train_connect_four.py). Every
+backend offers log(metrics, step) and finish():
+
+- "wandb": Weights & Biases (needs the wandb_key_file and network access)
+- "jsonl" / "sqlite": LocalMetricsSink, appends the metrics to a local file (no key file, no network)
+- "none": discards the metrics
+
+LocalMetricsSink only enqueues the metrics in log(); a background thread flattens them (nested dictionaries become
+"a/b" keys, values that are not JSON serialisable are dropped) and writes them in batches, such that logging costs
+next to nothing on the critical path of the training loop. The metrics must not be modified after they were logged.
+
+Ray Tune logs through LocalMetricsLoggerCallback (cf. callbacks/metrics_logger_callback.py) instead of the
+WandbLoggerCallback.
+"""
+
+# standard library imports
+import os
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from numbers import Number
+from typing import Any, Dict, List, Optional, Tuple
+
+# 3rd party imports
+import numpy as np
+
+# local imports (i.e. our own code)
+from utilities import utilities
+
+BACKENDS = ("wandb", "jsonl", "sqlite", "none")
+
+# a logged entry: run, step, timestamp, metrics
+Entry = Tuple[str, int, float, Dict[str, Any]]
+
+
+def flatten_metrics(metrics: Dict[str, Any], prefix: Optional[str] = "") -> Dict[str, Any]:
+    """
+    Flattens nested metrics into "a/b" keys and keeps the JSON serialisable values (NumPy scalars are converted, small
+    NumPy arrays become lists).
+
+    :param metrics: (nested) dictionary of metrics
+    :param prefix: prefix of the keys
+    :return: flat dictionary of JSON serialisable metrics
+    """
+    flat = {}
+    for key, value in metrics.items():
+        key = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_metrics(value, prefix=f"{key}/"))
+        elif isinstance(value, np.generic):
+            flat[key] = value.item()
+        elif isinstance(value, np.ndarray) and value.size <= 64:
+            flat[key] = value.tolist()
+        elif value is None or isinstance(value, (str, bool, Number)):
+            flat[key] = value
+        elif isinstance(value, (list, tuple)) and all(isinstance(v, (str, bool, Number)) for v in value):
+            flat[key] = list(value)
+    return flat
+
+
+class MetricsBackend:
+    """
+    Discards the metrics (backend "none"); base class of the other backends.
+    """
+
+    def log(self, metrics: Dict[str, Any], step: Optional[int] = None) -> None:
+        """
+        :param metrics: (nested) dictionary of metrics
+        :param step: step of the metrics (OPTIONAL, default: number of previous log() calls)
+        :return: None
+        """
+
+    def finish(self) -> None:
+        """
+        Writes all pending metrics and closes the backend.
+
+        :return: None
+        """
+
+
+class WandbMetrics(MetricsBackend):
+
+    def __init__(self, project: str, entity: Optional[str] = None, name: Optional[str] = None):
+        """
+        Logs in to wandb and starts a run.
+
+        :param project: wandb project
+        :param entity: wandb entity (OPTIONAL)
+        :param name: name of the run (OPTIONAL)
+        """
+        import wandb
+
+        utilities.ensure_wandb_key()
+        wandb.login()
+        wandb.init(project=project, entity=entity, name=name)
+        self.wandb = wandb
+
+    def log(self, metrics: Dict[str, Any], step: Optional[int] = None) -> None:
+        self.wandb.log(metrics, step=step)
+
+    def finish(self) -> None:
+        self.wandb.finish()
+
+
+class LocalMetricsSink(MetricsBackend):
+
+    def __init__(
+            self,
+            path: str,
+            file_format: Optional[str] = "jsonl",
+            run: Optional[str] = None,
+            batch_size: Optional[int] = 256,
+            flush_interval: Optional[float] = 1.0
+    ):
+        """
+        Starts the writer thread.
+
+        :param path: path of the metrics file (created with its directory if necessary, appended to otherwise)
+        :param file_format: "jsonl" (one JSON object per entry) or "sqlite" (table "metrics" with the columns run, step,
+        time and the metrics as JSON)
+        :param run: name of the run, stored with every entry (OPTIONAL, default: start time)
+        :param batch_size: maximum number of entries written at once
+        :param flush_interval: maximum time in seconds an entry waits for its batch
+        """
+        self.path: str = path
+        self.run: str = run or time.strftime("%Y-%m-%d_%H-%M-%S")
+        if file_format not in ("jsonl", "sqlite"):
+            raise ValueError(f"unknown metrics file format: {file_format}")
+        self.sqlite: bool = file_format == "sqlite"
+        self.batch_size: int = batch_size
+        self.flush_interval: float = flush_interval
+
+        self._steps: int = 0
+        self._queue: "queue.Queue[Optional[Entry]]" = queue.Queue()
+        self._closed: bool = False
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._thread = threading.Thread(target=self._write_loop, name="metrics-sink", daemon=True)
+        self._thread.start()
+        # write the pending metrics if the process ends without finish()
+        atexit.register(self.finish)
+
+    def log(self, metrics: Dict[str, Any], step: Optional[int] = None, run: Optional[str] = None) -> None:
+        """
+        Enqueues the metrics; they are written by the background thread.
+
+        :param metrics: (nested) dictionary of metrics
+        :param step: step of the metrics (OPTIONAL, default: number of previous log() calls)
+        :param run: name of the run (OPTIONAL, default: the run of the sink)
+        :return: None
+        """
+        if self._closed:
+            raise RuntimeError("log() called after finish()")
+        self._queue.put_nowait((run or self.run, self._steps if step is None else step, time.time(), metrics))
+        self._steps += 1
+
+    def finish(self) -> None:
+        """
+        Writes all pending metrics and stops the writer thread.
+
+        :return: None
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write_loop(self) -> None:
+        """
+        Writes the enqueued entries in batches of up to batch_size until finish() enqueues None.
+
+        :return: None
+        """
+        # SQLite connections must be used by the thread that created them
+        if self.sqlite:
+            output = sqlite3.connect(self.path)
+            output.execute("CREATE TABLE IF NOT EXISTS metrics (run TEXT, step INTEGER, time REAL, metrics TEXT)")
+            output.commit()
+        else:
+            output = open(self.path, "a")
+
+        finished = False
+        while not finished:
+            batch: List[Entry] = []
+            try:
+                entry = self._queue.get(timeout=self.flush_interval)
+                while entry is not None:
+                    batch.append(entry)
+                    if len(batch) == self.batch_size:
+                        break
+                    entry = self._queue.get_nowait()
+                finished = entry is None
+            except queue.Empty:
+                pass
+            if batch and self.sqlite:
+                output.executemany(
+                    "INSERT INTO metrics VALUES (?, ?, ?, ?)",
+                    [(run, step, timestamp, json.dumps(flatten_metrics(metrics)))
+                     for run, step, timestamp, metrics in batch]
+                )
+                output.commit()
+            elif batch:
+                output.write("".join(
+                    json.dumps({"run": run, "step": step, "time": timestamp, **flatten_metrics(metrics)}) + "\n"
+                    for run, step, timestamp, metrics in batch
+                ))
+                output.flush()
+
+        output.close()
+
+
+def default_metrics_path(project: str, backend: str) -> str:
+    """
+    :param project: project the metrics belong to
+    :param backend: "jsonl" or "sqlite"
+    :return: data/metrics/<project>.<jsonl|sqlite> in the reinforcement_learning directory
+    """
+    utilities.ensure_paths()
+    return f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/data/metrics/{project}.{backend}"
+
+
+def create_metrics_backend(
+        backend: str,
+        project: str,
+        entity: Optional[str] = None,
+        name: Optional[str] = None,
+        path: Optional[str] = None
+) -> MetricsBackend:
+    """
+    Creates the metrics backend of an entry point.
+
+    :param backend: "wandb", "jsonl", "sqlite" or "none"
+    :param project: wandb project; also names the local metrics file
+    :param entity: wandb entity (OPTIONAL)
+    :param name: name of the run (OPTIONAL)
+    :param path: path of the local metrics file (OPTIONAL, default: cf. default_metrics_path)
+    :return: metrics backend
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown metrics backend: {backend} (expected one of {BACKENDS})")
+    if backend == "wandb":
+        return WandbMetrics(project=project, entity=entity, name=name)
+    if backend == "none":
+        return MetricsBackend()
+    return LocalMetricsSink(path=path or default_metrics_path(project, backend), file_format=backend, run=name)
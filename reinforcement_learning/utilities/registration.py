@@ -9,7 +9,9 @@ from ray.rllib.models import ModelCatalog
 # local imports (i.e. our own code)
 from custom_torch_models.rl_fully_connected_network import FullyConnectedNetwork
 from environments.envs.bugbit_env import BugBit
+from environments.envs.bugbit_vector_env import BugBitVectorEnv
 from environments.envs.connectfourmvc_env import ConnectFourMVC
+from environments.envs.connectfour_selfplay_env import ConnectFourSelfPlay
 
 
 # registering the BugBit environment
@@ -20,12 +22,28 @@ def bugbit_env_creator(env_config):
 register_env("bugbit-v0", bugbit_env_creator)
 
 
+# registering the vectorised BugBit environment (batched program execution, cf. environments/execution_scheduler.py)
+def bugbit_vector_env_creator(env_config):
+    return BugBitVectorEnv(env_config)
+
+
+register_env("bugbit-vector-v0", bugbit_vector_env_creator)
+
+
 # registering the ConnectFour environment
 def connect_four_env_creator(env_config):
-    return ConnectFourMVC()
+    return ConnectFourMVC(env_config)
 
 
 register_env("connectfour-v0", connect_four_env_creator)
 
+
+# registering the multi-agent (self-play) ConnectFour environment
+def connect_four_selfplay_env_creator(env_config):
+    return ConnectFourSelfPlay(env_config)
+
+
+register_env("connectfour-selfplay-v0", connect_four_selfplay_env_creator)
+
 # registering the custom fully connected network model
 ModelCatalog.register_custom_model("custom_torch_fcnn", FullyConnectedNetwork)
@@ -3,6 +3,14 @@ utilities
 =========
 This file contains various utility functions. The primary purpose is to set the environment variable
 JAR_PATH to the path to the jar file that contains the java classes needed for the various environments in this project.
+
+Importing this module has no side effects. The code that needs a part of the setup calls the respective idempotent
+initialiser:
+
+- ensure_paths(): sets the environment variables JAR_PATH, REINFORCEMENT_LEARNING_DIR and TTSIM_PATH
+- ensure_jvm(): starts the JVM with the Bug+ / Connect Four jar on the classpath
+- ensure_wandb_key(): exports the wandb api key from the wandb_key_file to WANDB_API_KEY
+- configure_warnings(): filters UserWarnings and FutureWarnings (called by the entry points)
 """
 
 # standard library imports
@@ -10,51 +18,92 @@ import os
 import pathlib
 import warnings
 
-# 3rd party imports
-# noinspection PyPackageRequirements
-import jpype
-
 # setting environment variables for the path to the JAR file and the data directory
 artifact_directory: str = ""
 artifact_file_name: str = ""
 
-# throw ValueError if the user did not fill in artifact_directory or artifact_file_name during setup process
-if not artifact_directory or not artifact_file_name:
-    raise ValueError("artifact_directory and artifact_file_name must be set")
+_module_directory: str = f"{pathlib.Path(__file__).parent.resolve()}"
+
 
-relative_jar_path = f"/../../out/artifacts/{artifact_directory}/{artifact_file_name}"
+def ensure_paths() -> None:
+    """
+    Sets the environment variables for the paths to the JAR file, the reinforcement_learning directory and the
+    Turing Tumble simulator. Variables that are already set (e.g. inherited by a worker process) are kept.
 
-# path to jar file
-os.environ["JAR_PATH"] = f"{pathlib.Path(__file__).parent.resolve()}" \
-                         f"{relative_jar_path}"
+    :return: None
+    """
+    # path to jar file
+    if artifact_directory and artifact_file_name:
+        os.environ.setdefault(
+            "JAR_PATH",
+            f"{_module_directory}/../../out/artifacts/{artifact_directory}/{artifact_file_name}"
+        )
 
-# path to openai-gym-environments module
-os.environ["REINFORCEMENT_LEARNING_DIR"] = f"{pathlib.Path(__file__).parent.resolve()}/../../reinforcement_learning"
+    # path to openai-gym-environments module
+    os.environ.setdefault("REINFORCEMENT_LEARNING_DIR", f"{_module_directory}/../../reinforcement_learning")
 
-# path to Turing Tumble simulator
-os.environ["TTSIM_PATH"] = f"{pathlib.Path(__file__).parent.resolve()}/../../ttsim"
+    # path to Turing Tumble simulator
+    os.environ.setdefault("TTSIM_PATH", f"{_module_directory}/../../ttsim")
 
-# check if wandb_key_file exists
-if not os.path.exists(f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/wandb_key_file"):
-    raise FileNotFoundError(f"wandb_key_file not found in.\n"
-                            f"Please create a file called wandb_key_file in {os.getenv('REINFORCEMENT_LEARNING_DIR')} "
-                            f"and put your wandb api key in it (cf. https://docs.wandb.ai/quickstart).")
 
-# check if the wandb_key_file is empty
-if os.stat(f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/wandb_key_file").st_size == 0:
-    raise ValueError("wandb_key_file is empty; please set the wandb key in the wandb_key_file"
-                     " (cf. https://docs.wandb.ai/quickstart).")
+def ensure_jvm() -> None:
+    """
+    Starts the JVM with the jar file on the classpath unless it is already running.
 
-# export wandb key to WANDB_API_KEY environment variable
-os.environ["WANDB_API_KEY"] = open(f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/wandb_key_file", "r").read()
+    :return: None
+    """
+    # noinspection PyPackageRequirements
+    import jpype
 
-# start JVM
+    # noinspection PyUnresolvedReferences
+    if jpype.isJVMStarted():
+        return
+
+    ensure_paths()
+
+    # throw ValueError if the user did not fill in artifact_directory or artifact_file_name during setup process
+    if not os.getenv("JAR_PATH"):
+        raise ValueError("artifact_directory and artifact_file_name must be set")
 
-# noinspection PyUnresolvedReferences
-if not jpype.isJVMStarted():
     # noinspection PyUnresolvedReferences
     jpype.startJVM(classpath=os.getenv("JAR_PATH"))
 
-# filter UserWarnings, FutureWarnings
-warnings.filterwarnings("ignore", category=UserWarning)
-warnings.filterwarnings("ignore", category=FutureWarning)
+
+def ensure_wandb_key() -> None:
+    """
+    Reads the wandb api key from the wandb_key_file in the reinforcement_learning directory and exports it to the
+    WANDB_API_KEY environment variable.
+
+    :return: None
+    """
+    if os.getenv("WANDB_API_KEY"):
+        return
+
+    ensure_paths()
+    wandb_key_file = f"{os.getenv('REINFORCEMENT_LEARNING_DIR')}/wandb_key_file"
+
+    # check if wandb_key_file exists
+    if not os.path.exists(wandb_key_file):
+        raise FileNotFoundError(f"wandb_key_file not found in.\n"
+                                f"Please create a file called wandb_key_file in "
+                                f"{os.getenv('REINFORCEMENT_LEARNING_DIR')} "
+                                f"and put your wandb api key in it (cf. https://docs.wandb.ai/quickstart).")
+
+    # check if the wandb_key_file is empty
+    if os.stat(wandb_key_file).st_size == 0:
+        raise ValueError("wandb_key_file is empty; please set the wandb key in the wandb_key_file"
+                         " (cf. https://docs.wandb.ai/quickstart).")
+
+    # export wandb key to WANDB_API_KEY environment variable
+    with open(wandb_key_file, "r") as f:
+        os.environ["WANDB_API_KEY"] = f.read()
+
+
+def configure_warnings() -> None:
+    """
+    Filters UserWarnings and FutureWarnings.
+
+    :return: None
+    """
+    warnings.filterwarnings("ignore", category=UserWarning)
+    warnings.filterwarnings("ignore", category=FutureWarning)
@@ -4,6 +4,7 @@
 
 package connectfour;
 
+import java.nio.IntBuffer;
 import java.util.*;
 import java.util.concurrent.ThreadLocalRandom;
 
@@ -16,6 +17,8 @@ public class ConnectFour {
     private boolean done = false;
     private int winner = 0;
     private String game_mode = "no_interaction";
+    private String opponent = "greedy";
+    private NegamaxSearch search = null;
 
     private int[][] board = new int[HEIGHT][WIDTH];
 
@@ -39,44 +42,41 @@ public class ConnectFour {
 
     public LinkedList<Object> selfplay_step(int action, int player) {
         int reward = 0;
+        int opponent = player == 1 ? 2 : 1;
 //        unless the board is full...
         if (!boardFull()) {
 //            if the action is valid...
             if (actionValid(action)) {
-//                place the token at the indicated column for player 1 (i.e. the agent)
+//                place the token at the indicated column for the moving player
                 placeToken(action, player);
-//                if player 1 one won after the last move, set the reward to 1000
-                if (checkWinner(this.board)[0] == 1) {
-                    if (checkWinner(this.board)[1] == 2) {
-                        reward = 50;
-                    } else {
-                        reward = 50;
-                    }
+                int winner = checkWinner(this.board)[0];
+//                if the moving player won after the last move, set the reward to 50
+                if (winner == player) {
+                    reward = 50;
                     this.done = true;
-                    this.winner = 1;
-//                else if player 2 now won, (which should not happen since player 2 has not made a move yet), set the reward to -1000
-                } else if (checkWinner(this.board)[0] == 2) {
+                    this.winner = player;
+//                else if the other player won (which cannot happen through this move), set the reward to -50
+                } else if (winner == opponent) {
                     reward = -50;
                     this.done = true;
-                    this.winner = 2;
-//                else if none of them have won, sample a greedy action of player 2 to take and place it
-                } else if (checkWinner(this.board)[0] == 0) {
+                    this.winner = opponent;
+                } else if (winner == 0) {
                     if (boardFull()) {
                         this.done = true;
                         this.winner = 0;
                         reward = -10;
-//                    if player 1 and 2 have made their move and none of them have won, let the reward for this action (by player) be -1;
+//                    if none of them have won, let the reward for this action (by player) be -1;
                     } else {
                         reward = -1;
                     }
                 }
-//            if the action (by player 1) is invalid, let the reward be -200
+//            if the action of the moving player is invalid, the other player wins
             } else {
                 reward = -1000;
                 this.done = true;
-                this.winner = 2;
+                this.winner = opponent;
             }
-//            if the board is full and none of them have won, the reward will be -1000;
+//            if the board is full and none of them have won, the reward will be -10;
         } else {
             this.done = true;
             this.winner = 0;
@@ -88,7 +88,7 @@ public class ConnectFour {
         output.add(reward);
         output.add(this.done);
         output.add(null);
-        System.out.println("EOS");
+        output.add(this.winner);
         return output;
     }
 
@@ -210,7 +210,7 @@ public class ConnectFour {
 //                else if none of them have won, sample a greedy action of player 2 to take and place it
                 } else if (checkWinner(this.board)[0] == 0) {
 
-                    greedyAction(2);
+                    opponentAction(2);
 //                    if after player 2 has made their move, the board is either full or player 2 won, set the reward to -1000
                     if (checkWinner(this.board)[0] == 2) {
                         this.done = true;
@@ -343,10 +343,78 @@ public class ConnectFour {
         return this.board;
     }
 
+    /**
+     * Writes the board row-major into a flat buffer (absolute indices, the position of the buffer is ignored).
+     * @param boardOut: buffer with at least HEIGHT * WIDTH elements
+     */
+    public void writeState(IntBuffer boardOut) {
+        for (int i = 0; i < this.HEIGHT; i++) {
+            for (int j = 0; j < this.WIDTH; j++) {
+                boardOut.put(i * this.WIDTH + j, this.board[i][j]);
+            }
+        }
+    }
+
+    /**
+     * Flat-buffer variant of reset() for callers that share memory with the JVM (cf. jvm_bridge.py).
+     * @param boardOut: buffer the board is written to (HEIGHT * WIDTH elements, row-major)
+     */
+    public void resetFlat(IntBuffer boardOut) {
+        reset();
+        writeState(boardOut);
+    }
+
+    /**
+     * Flat-buffer variant of step(action) for callers that share memory with the JVM (cf. jvm_bridge.py).
+     * @param action: column of the agent's (player 1) token
+     * @param boardOut: buffer the board is written to (HEIGHT * WIDTH elements, row-major)
+     * @param resultOut: buffer reward, done (0/1) and winner are written to (3 elements)
+     */
+    public void stepFlat(int action, IntBuffer boardOut, IntBuffer resultOut) {
+        LinkedList<Object> output = step(action);
+        writeState(boardOut);
+        resultOut.put(0, (Integer) output.get(1));
+        resultOut.put(1, this.done ? 1 : 0);
+        resultOut.put(2, this.winner);
+    }
+
     private void greedyAction(int playerID) {
         placeToken(getGreedyAction(playerID), playerID);
     }
 
+    private void opponentAction(int playerID) {
+        if (this.opponent.equals("negamax")) {
+            placeToken(getSearchAction(playerID), playerID);
+        } else {
+            greedyAction(playerID);
+        }
+    }
+
+    /**
+     * Selects the built-in opponent that answers the agent's moves in step(action)
+     * @param opponent: either "greedy" (heuristic agent) or "negamax" (search-based agent)
+     * @param maxDepth: maximum search depth in plies of the search-based agent
+     * @param timeBudgetMillis: time budget per move in milliseconds of the search-based agent (0 = no limit)
+     */
+    public void setOpponent(String opponent, int maxDepth, long timeBudgetMillis) {
+        if (!opponent.equals("greedy") && !opponent.equals("negamax")) {
+            throw new IllegalArgumentException("Unknown opponent: " + opponent);
+        }
+        this.opponent = opponent;
+        this.search = new NegamaxSearch(maxDepth, timeBudgetMillis);
+    }
+
+    public String getOpponent() {
+        return this.opponent;
+    }
+
+    public int getSearchAction(int playerID) {
+        if (this.search == null) {
+            this.search = new NegamaxSearch(8, 50);
+        }
+        return this.search.bestMove(this.board, playerID);
+    }
+
     public int getGreedyAction(int playerID) {
         // if there are 3 pieces of the same colour in the same row, column or diagonal, place this piece next to them,..
         // ..in order to win or to stop the other player from winning
@@ -0,0 +1,393 @@
+/**
+ * Search-based Connect Four player: alpha-beta negamax on a bitboard with a Zobrist-keyed transposition table,
+ * move ordering and iterative deepening under a depth and/or time budget.
+ */
+
+package connectfour;
+
+import java.util.Random;
+
+
+public class NegamaxSearch {
+
+    private static final int WIDTH = 7;
+    private static final int HEIGHT = 6;
+    // every column is stored in HEIGHT + 1 bits; the extra (sentinel) bit separates the columns
+    private static final int H1 = HEIGHT + 1;
+    private static final int WIN_SCORE = 1000000;
+    private static final int MATE_BOUND = WIN_SCORE - WIDTH * HEIGHT - 1;
+
+    private static final byte EXACT = 0;
+    private static final byte LOWER_BOUND = 1;
+    private static final byte UPPER_BOUND = 2;
+
+    // columns are tried from the centre outwards, which is where most winning lines run through
+    private static final int[] COLUMN_ORDER = {3, 2, 4, 1, 5, 0, 6};
+    // heuristic weight of a window holding 0, 1, 2 or 3 stones of a single player
+    private static final int[] WINDOW_WEIGHTS = {0, 1, 4, 32};
+
+    private static final long[] WINDOWS = buildWindows();
+    private static final long[][] ZOBRIST = new long[2][WIDTH * H1];
+    private static final long ZOBRIST_SIDE;
+
+    static {
+        Random random = new Random(0x5EED);
+        for (int side = 0; side < 2; side++) {
+            for (int bit = 0; bit < WIDTH * H1; bit++) {
+                ZOBRIST[side][bit] = random.nextLong();
+            }
+        }
+        ZOBRIST_SIDE = random.nextLong();
+    }
+
+    private final int maxDepth;
+    private final long timeBudgetMillis;
+
+    // transposition table (always-replace scheme, indexed by the low bits of the Zobrist key)
+    private final int tableMask;
+    private final long[] tableKeys;
+    private final int[] tableScores;
+    private final byte[] tableDepths;
+    private final byte[] tableFlags;
+    private final byte[] tableMoves;
+
+    private long deadline;
+    private boolean aborted;
+    private long nodeCount;
+    private int completedDepth;
+
+    /**
+     * @param maxDepth         maximum search depth in plies (iterative deepening stops there)
+     * @param timeBudgetMillis time budget per move in milliseconds; 0 disables the time limit
+     */
+    public NegamaxSearch(int maxDepth, long timeBudgetMillis) {
+        this(maxDepth, timeBudgetMillis, 20);
+    }
+
+    /**
+     * @param maxDepth         maximum search depth in plies (iterative deepening stops there)
+     * @param timeBudgetMillis time budget per move in milliseconds; 0 disables the time limit
+     * @param tableBits        log2 of the number of transposition table entries
+     */
+    public NegamaxSearch(int maxDepth, long timeBudgetMillis, int tableBits) {
+        this.maxDepth = Math.max(1, Math.min(maxDepth, WIDTH * HEIGHT));
+        this.timeBudgetMillis = timeBudgetMillis;
+        int size = 1 << tableBits;
+        this.tableMask = size - 1;
+        this.tableKeys = new long[size];
+        this.tableScores = new int[size];
+        this.tableDepths = new byte[size];
+        this.tableFlags = new byte[size];
+        this.tableMoves = new byte[size];
+    }
+
+    /**
+     * Returns the best column for the given player on the given board.
+     *
+     * @param board    board as used by ConnectFour (row 0 is the top row, 0 = empty, 1/2 = player tokens)
+     * @param playerID player to move (1 or 2)
+     * @return the chosen column or -1 if the board is full
+     */
+    public int bestMove(int[][] board, int playerID) {
+        long current = 0L;
+        long mask = 0L;
+        for (int r = 0; r < HEIGHT; r++) {
+            for (int c = 0; c < WIDTH; c++) {
+                if (board[r][c] != 0) {
+                    long bit = 1L << (c * H1 + (HEIGHT - 1 - r));
+                    mask |= bit;
+                    if (board[r][c] == playerID) {
+                        current |= bit;
+                    }
+                }
+            }
+        }
+        return bestMove(current, mask, playerID - 1);
+    }
+
+    /**
+     * @return number of nodes visited during the last call of bestMove
+     */
+    public long getNodeCount() {
+        return this.nodeCount;
+    }
+
+    /**
+     * @return deepest fully searched iteration of the last call of bestMove
+     */
+    public int getCompletedDepth() {
+        return this.completedDepth;
+    }
+
+    private int bestMove(long current, long mask, int side) {
+        this.nodeCount = 0;
+        this.completedDepth = 0;
+        this.aborted = false;
+        this.deadline = this.timeBudgetMillis > 0
+                ? System.nanoTime() + this.timeBudgetMillis * 1000000L
+                : Long.MAX_VALUE;
+
+        int moves = Long.bitCount(mask);
+        if (moves >= WIDTH * HEIGHT) {
+            return -1;
+        }
+
+        // take an immediate win, there is nothing to search
+        int fallback = -1;
+        for (int col : COLUMN_ORDER) {
+            if (canPlay(mask, col)) {
+                if (fallback == -1) {
+                    fallback = col;
+                }
+                if (isWinningMove(current, mask, col)) {
+                    return col;
+                }
+            }
+        }
+
+        long hash = hash(current, mask, side);
+        int bestMove = fallback;
+        int remaining = WIDTH * HEIGHT - moves;
+
+        for (int depth = 1; depth <= Math.min(this.maxDepth, remaining); depth++) {
+            int alpha = -WIN_SCORE - 1;
+            int beta = WIN_SCORE + 1;
+            int iterationBest = -1;
+            for (int col : orderedMoves(hash, mask)) {
+                long newMask = mask | (mask + bottomMask(col));
+                long placed = newMask ^ mask;
+                long newHash = hash ^ ZOBRIST[side][Long.numberOfTrailingZeros(placed)] ^ ZOBRIST_SIDE;
+                int score = -negamax(current ^ mask, newMask, newHash, 1 - side, depth - 1, -beta, -alpha, 1);
+                if (this.aborted) {
+                    break;
+                }
+                if (score > alpha) {
+                    alpha = score;
+                    iterationBest = col;
+                }
+            }
+            if (this.aborted) {
+                break;
+            }
+            bestMove = iterationBest;
+            this.completedDepth = depth;
+            store(hash, alpha, depth, EXACT, bestMove, 0);
+            // a proven result does not change with a deeper search
+            if (Math.abs(alpha) >= MATE_BOUND) {
+                break;
+            }
+        }
+        return bestMove;
+    }
+
+    private int negamax(long current, long mask, long hash, int side, int depth, int alpha, int beta, int ply) {
+        this.nodeCount++;
+        if ((this.nodeCount & 1023) == 0 && System.nanoTime() > this.deadline) {
+            this.aborted = true;
+        }
+        if (this.aborted) {
+            return 0;
+        }
+
+        int moves = Long.bitCount(mask);
+        if (moves >= WIDTH * HEIGHT) {
+            return 0;
+        }
+
+        for (int col = 0; col < WIDTH; col++) {
+            if (canPlay(mask, col) && isWinningMove(current, mask, col)) {
+                return WIN_SCORE - ply;
+            }
+        }
+
+        if (depth == 0) {
+            return evaluate(current, mask);
+        }
+
+        int alphaOriginal = alpha;
+        int index = (int) hash & this.tableMask;
+        if (this.tableKeys[index] == hash && this.tableDepths[index] >= depth) {
+            int score = fromTable(this.tableScores[index], ply);
+            byte flag = this.tableFlags[index];
+            if (flag == EXACT) {
+                return score;
+            } else if (flag == LOWER_BOUND) {
+                alpha = Math.max(alpha, score);
+            } else {
+                beta = Math.min(beta, score);
+            }
+            if (alpha >= beta) {
+                return score;
+            }
+        }
+
+        int best = -WIN_SCORE - 1;
+        int bestMove = -1;
+        for (int col : orderedMoves(hash, mask)) {
+            long newMask = mask | (mask + bottomMask(col));
+            long placed = newMask ^ mask;
+            long newHash = hash ^ ZOBRIST[side][Long.numberOfTrailingZeros(placed)] ^ ZOBRIST_SIDE;
+            int score = -negamax(current ^ mask, newMask, newHash, 1 - side, depth - 1, -beta, -alpha, ply + 1);
+            if (this.aborted) {
+                return 0;
+            }
+            if (score > best) {
+                best = score;
+                bestMove = col;
+            }
+            if (score > alpha) {
+                alpha = score;
+            }
+            if (alpha >= beta) {
+                break;
+            }
+        }
+
+        byte flag = best <= alphaOriginal ? UPPER_BOUND : (best >= beta ? LOWER_BOUND : EXACT);
+        store(hash, best, depth, flag, bestMove, ply);
+        return best;
+    }
+
+    private int[] orderedMoves(long hash, long mask) {
+        int[] ordered = new int[WIDTH];
+        int n = 0;
+        int index = (int) hash & this.tableMask;
+        int tableMove = this.tableKeys[index] == hash ? this.tableMoves[index] : -1;
+        if (tableMove >= 0 && canPlay(mask, tableMove)) {
+            ordered[n++] = tableMove;
+        }
+        for (int col : COLUMN_ORDER) {
+            if (col != tableMove && canPlay(mask, col)) {
+                ordered[n++] = col;
+            }
+        }
+        int[] result = new int[n];
+        System.arraycopy(ordered, 0, result, 0, n);
+        return result;
+    }
+
+    private void store(long hash, int score, int depth, byte flag, int move, int ply) {
+        int index = (int) hash & this.tableMask;
+        this.tableKeys[index] = hash;
+        this.tableScores[index] = toTable(score, ply);
+        this.tableDepths[index] = (byte) depth;
+        this.tableFlags[index] = flag;
+        this.tableMoves[index] = (byte) move;
+    }
+
+    // win scores depend on the distance to the root; the table stores them relative to the stored node
+    private static int toTable(int score, int ply) {
+        if (score >= MATE_BOUND) {
+            return score + ply;
+        } else if (score <= -MATE_BOUND) {
+            return score - ply;
+        }
+        return score;
+    }
+
+    private static int fromTable(int score, int ply) {
+        if (score >= MATE_BOUND) {
+            return score - ply;
+        } else if (score <= -MATE_BOUND) {
+            return score + ply;
+        }
+        return score;
+    }
+
+    /**
+     * Static evaluation from the point of view of the player to move: every window of four cells that is not
+     * blocked by the other player counts for the player owning stones in it.
+     */
+    private static int evaluate(long current, long mask) {
+        long opponent = current ^ mask;
+        int score = 0;
+        for (long window : WINDOWS) {
+            int own = Long.bitCount(current & window);
+            int other = Long.bitCount(opponent & window);
+            if (other == 0) {
+                score += WINDOW_WEIGHTS[own];
+            } else if (own == 0) {
+                score -= WINDOW_WEIGHTS[other];
+            }
+        }
+        return score;
+    }
+
+    private static long hash(long current, long mask, int side) {
+        long opponent = current ^ mask;
+        long hash = 0L;
+        for (int bit = 0; bit < WIDTH * H1; bit++) {
+            if (((current >> bit) & 1L) != 0) {
+                hash ^= ZOBRIST[side][bit];
+            } else if (((opponent >> bit) & 1L) != 0) {
+                hash ^= ZOBRIST[1 - side][bit];
+            }
+        }
+        return hash;
+    }
+
+    private static boolean canPlay(long mask, int col) {
+        return (mask & topMask(col)) == 0;
+    }
+
+    private static boolean isWinningMove(long current, long mask, int col) {
+        long position = current | ((mask + bottomMask(col)) & columnMask(col));
+        return alignment(position);
+    }
+
+    private static boolean alignment(long position) {
+        // horizontal
+        long m = position & (position >> H1);
+        if ((m & (m >> (2 * H1))) != 0) {
+            return true;
+        }
+        // diagonal 1
+        m = position & (position >> (H1 - 1));
+        if ((m & (m >> (2 * (H1 - 1)))) != 0) {
+            return true;
+        }
+        // diagonal 2
+        m = position & (position >> (H1 + 1));
+        if ((m & (m >> (2 * (H1 + 1)))) != 0) {
+            return true;
+        }
+        // vertical
+        m = position & (position >> 1);
+        return (m & (m >> 2)) != 0;
+    }
+
+    private static long bottomMask(int col) {
+        return 1L << (col * H1);
+    }
+
+    private static long topMask(int col) {
+        return 1L << (HEIGHT - 1 + col * H1);
+    }
+
+    private static long columnMask(int col) {
+        return ((1L << HEIGHT) - 1) << (col * H1);
+    }
+
+    private static long[] buildWindows() {
+        long[] windows = new long[69];
+        int n = 0;
+        int[][] directions = {{0, 1}, {1, 0}, {1, 1}, {1, -1}};
+        for (int[] direction : directions) {
+            for (int row = 0; row < HEIGHT; row++) {
+                for (int col = 0; col < WIDTH; col++) {
+                    int endRow = row + 3 * direction[0];
+                    int endCol = col + 3 * direction[1];
+                    if (endRow < 0 || endRow >= HEIGHT || endCol < 0 || endCol >= WIDTH) {
+                        continue;
+                    }
+                    long window = 0L;
+                    for (int i = 0; i < 4; i++) {
+                        window |= 1L << ((col + i * direction[1]) * H1 + row + i * direction[0]);
+                    }
+                    windows[n++] = window;
+                }
+            }
+        }
+        return windows;
+    }
+}
@@ -4,6 +4,8 @@ import de.bugplus.development.*;
 import de.bugplus.specification.BugplusLibrary;
 import de.bugplus.specification.BugplusProgramSpecification;
 
+import java.nio.IntBuffer;
+
 public class CF_Translated {
     private static int[] execTimes;
 
@@ -51,6 +53,36 @@ public class CF_Translated {
         return internalStates;
     }
 
+    /**
+     * Executes a program for a batch of inputs with one call. For callers that share memory with the JVM
+     * (cf. jvm_bridge.py): all buffers are row-major and accessed with absolute indices, i.e. their positions are
+     * ignored.
+     *
+     * @param num_bugs  number of bugs of the program
+     * @param cf        control flow matrix of the program (num_bugs x 2 * num_bugs)
+     * @param inputs    initial internal states (numInputs x num_bugs)
+     * @param numInputs number of inputs
+     * @param outputs   buffer the final internal states are written to (numInputs x num_bugs)
+     */
+    public static void executeFlat(int num_bugs, IntBuffer cf, IntBuffer inputs, int numInputs, IntBuffer outputs) {
+        int[][] cfMatrix = new int[num_bugs][2 * num_bugs];
+        for (int i = 0; i < num_bugs; i++) {
+            for (int j = 0; j < 2 * num_bugs; j++) {
+                cfMatrix[i][j] = cf.get(i * 2 * num_bugs + j);
+            }
+        }
+        int[] positions = new int[num_bugs];
+        for (int k = 0; k < numInputs; k++) {
+            for (int i = 0; i < num_bugs; i++) {
+                positions[i] = inputs.get(k * num_bugs + i);
+            }
+            int[] internalStates = execute(num_bugs, cfMatrix, positions);
+            for (int i = 0; i < num_bugs; i++) {
+                outputs.put(k * num_bugs + i, internalStates[i]);
+            }
+        }
+    }
+
     public static int[] execute(int num_bugs, int[][] cfMatrix) {
         BugplusLibrary myFunctionLibrary = BugplusLibrary.getInstance();
         BugplusNEGImplementation negImpl = BugplusNEGImplementation.getInstance();